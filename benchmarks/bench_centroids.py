@@ -0,0 +1,95 @@
+"""
+Benchmark centroid extraction: the old iterrows loop against the vectorised stage
+
+Run from the repository root:
+    python -m benchmarks.bench_centroids --rows 100000
+"""
+import argparse
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from functions.h3_processing import extract_centroid_coords
+
+
+def make_works(rows: int, seed: int = 42) -> gpd.GeoDataFrame:
+    """
+    Build a GeoDataFrame of random points and two-vertex lines around Tyne and Wear
+    """
+    rng = np.random.default_rng(seed)
+    lng = rng.uniform(-1.8, -1.3, rows)
+    lat = rng.uniform(54.8, 55.1, rows)
+    is_line = rng.random(rows) < 0.5
+
+    points = shapely.points(lng, lat)
+    ends = np.column_stack([lng + rng.normal(0, 0.002, rows), lat + rng.normal(0, 0.002, rows)])
+    starts = np.column_stack([lng, lat])
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1))
+    geometries = np.where(is_line, lines, points)
+
+    return gpd.GeoDataFrame({
+        'permit_reference_number': [f"PERMIT-{i}" for i in range(rows)],
+        'activity_type': rng.choice(["Excavation", "Reinstatement", "Inspection"], rows),
+        'normalized_work_category': rng.choice(["Major", "Standard", "Emergency", "Minor"], rows),
+    }, geometry=geometries, crs="EPSG:4326")
+
+
+def extract_with_iterrows(geodf_points: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    The per-row extraction loop that extract_centroid_coords replaced
+    """
+    coords_data = []
+    for _, row in geodf_points.iterrows():
+        geom = row.geometry
+        if geom is not None and not geom.is_empty:
+            point = geom.centroid
+            coords_data.append({
+                'permit_reference_number': row.get('permit_reference_number'),
+                'activity_type': row.get('activity_type'),
+                'work_category': row.get('normalized_work_category', 'Unknown'),
+                'latitude': point.y,
+                'longitude': point.x
+            })
+    return pd.DataFrame(coords_data)
+
+
+def time_call(func, *args, repeat: int = 3) -> float:
+    """
+    Best wall-clock time in seconds over several runs
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    geodf = make_works(args.rows)
+
+    # Both stages must agree before timing them
+    expected = extract_with_iterrows(geodf)
+    actual = extract_centroid_coords(geodf)
+    np.testing.assert_allclose(actual['latitude'], expected['latitude'])
+    np.testing.assert_allclose(actual['longitude'], expected['longitude'])
+
+    iterrows_time = time_call(extract_with_iterrows, geodf, repeat=args.repeat)
+    vectorised_time = time_call(extract_centroid_coords, geodf, repeat=args.repeat)
+
+    print(f"rows:        {args.rows:,}")
+    print(f"iterrows:    {iterrows_time:.3f}s")
+    print(f"vectorised:  {vectorised_time:.3f}s")
+    print(f"speedup:     {iterrows_time / vectorised_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
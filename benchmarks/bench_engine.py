@@ -0,0 +1,95 @@
+"""
+Benchmark local DuckDB setup: a new connection per call against the shared engine
+
+Reports one-off engine startup and the per-call overhead of each approach for a
+small aggregation. Run from the repository root:
+    python -m benchmarks.bench_engine --calls 50
+
+Use --extensions "" to measure connection overhead alone when community
+extensions cannot be downloaded.
+"""
+import argparse
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from functions.duckdb_engine import start_engine
+
+QUERY = """
+SELECT ROUND(latitude, 2) as lat_bin, ROUND(longitude, 2) as lng_bin, COUNT(*) as work_count
+FROM coords_data
+GROUP BY lat_bin, lng_bin
+"""
+
+
+def make_coords(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Random coordinates around Tyne and Wear
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'latitude': rng.uniform(54.8, 55.1, rows),
+        'longitude': rng.uniform(-1.8, -1.3, rows)
+    })
+
+
+def per_call_connection(coords_df: pd.DataFrame, extensions: list) -> None:
+    """
+    The old pattern: connect, install and load extensions, query, close
+    """
+    con = duckdb.connect(':memory:')
+    for extension in extensions:
+        con.execute(f"INSTALL {extension};")
+        con.execute(f"LOAD {extension.split()[0]};")
+    con.register('coords_data', coords_df)
+    con.execute(QUERY).fetchdf()
+    con.close()
+
+
+def shared_engine_call(engine: duckdb.DuckDBPyConnection, coords_df: pd.DataFrame) -> None:
+    """
+    The new pattern: a cursor on the already-started engine
+    """
+    cursor = engine.cursor()
+    cursor.register('coords_data', coords_df)
+    cursor.execute(QUERY).fetchdf()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--extensions", default="h3 FROM community,spatial",
+                        help="Comma separated extensions to load")
+    args = parser.parse_args()
+
+    extensions = [e.strip() for e in args.extensions.split(",") if e.strip()]
+    coords_df = make_coords(args.rows)
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        per_call_connection(coords_df, extensions)
+    per_call_total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = start_engine(extensions)
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        shared_engine_call(engine, coords_df)
+    shared_total = time.perf_counter() - start
+    engine.close()
+
+    print(f"extensions:              {', '.join(extensions) or 'none'}")
+    print(f"calls:                   {args.calls}")
+    print(f"before, per call:        {per_call_total / args.calls * 1000:.2f}ms")
+    print(f"after, engine startup:   {startup * 1000:.2f}ms (once per process)")
+    print(f"after, per call:         {shared_total / args.calls * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
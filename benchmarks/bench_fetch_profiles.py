@@ -0,0 +1,139 @@
+"""
+Benchmark the all-authorities fetch: SELECT * through fetchdf against view profiles through Arrow
+
+Each variant runs in its own subprocess so peak RSS is measured independently.
+For every variant the Arrow size of the result stands in for bytes
+transferred, and the peak Python heap (tracemalloc) and peak RSS of the fetch
+are reported. Run from the repository root against a DuckDB file holding the
+month tables:
+    python -m benchmarks.bench_fetch_profiles --database street_works.duckdb --schema raw_data_2025
+
+Geometry is decoded with the spatial extension as in the app. Without it,
+pass --geometry wkt to carry the raw WKT in place of the decoded geometry,
+which still compares the columns each profile transfers.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import duckdb
+
+from functions.fetch_data import VIEW_PROFILES, arrow_table_to_frame, build_batch_query
+from functions.geo_prep import GEOMETRY_WKB_COLUMN, WKT_COLUMN
+
+AUTHORITIES = [
+    "NEWCASTLE CITY COUNCIL",
+    "SUNDERLAND CITY COUNCIL",
+    "DARLINGTON BOROUGH COUNCIL",
+    "DURHAM COUNTY COUNCIL",
+    "SOUTH TYNESIDE COUNCIL",
+    "NORTH TYNESIDE COUNCIL",
+]
+
+
+def month_tables(con: duckdb.DuckDBPyConnection, schema: str) -> list:
+    """
+    Month tables (MM_YYYY) present in the schema
+    """
+    rows = con.execute("""
+    SELECT table_name FROM information_schema.tables
+    WHERE table_schema = ? AND regexp_matches(table_name, '^[0-9]{2}_[0-9]{4}$')
+    """, [schema]).fetchall()
+    return [row[0] for row in rows]
+
+
+def wkt_sources(schema: str, tables: list) -> dict:
+    """
+    Table sources carrying the raw WKT as the geometry column, for runs without the spatial extension
+    """
+    return {
+        table_name: f'(SELECT *, {WKT_COLUMN} as {GEOMETRY_WKB_COLUMN} FROM {schema}."{table_name}")'
+        for table_name in tables
+    }
+
+
+def run_variant(database: str, schema: str, variant: str, geometry: str) -> dict:
+    """
+    Fetch all authorities and months with one variant and report its cost
+    """
+    con = duckdb.connect(database, read_only=True)
+    tables = month_tables(con, schema)
+    if geometry == "decoded":
+        con.execute("LOAD spatial;")
+        table_sources = None
+    else:
+        table_sources = wkt_sources(schema, tables)
+
+    profile = "table" if variant == "fetchdf" else variant
+    query, params = build_batch_query(schema, AUTHORITIES, tables, table_sources=table_sources, view_profile=profile)
+
+    def fetch():
+        if variant == "fetchdf":
+            return None, con.execute(query, params).fetchdf()
+        table = con.execute(query, params).fetch_arrow_table()
+        return table, arrow_table_to_frame(table)
+
+    start = time.perf_counter()
+    table, df = fetch()
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Traced separately, as tracemalloc slows down building Python objects
+    del table, df
+    tracemalloc.start()
+    table, df = fetch()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if table is None:
+        # Fetched again after the measurements, only to size the result in Arrow
+        table = con.execute(query, params).fetch_arrow_table()
+
+    return {
+        "variant": variant,
+        "rows": len(df),
+        "columns": len(df.columns),
+        "arrow_mb": table.nbytes / 1024 ** 2,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1024 ** 2,
+        "python_peak_mb": python_peak / 1024 ** 2,
+        "peak_rss_mb": peak_rss / 1024,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--schema", default="raw_data_2025")
+    parser.add_argument("--geometry", choices=["decoded", "wkt"], default="decoded", help="Decode geometry with the spatial extension, or carry the raw WKT")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_variant(args.database, args.schema, args.worker, args.geometry)))
+        return
+
+    results = []
+    print(f"{'variant':10s} {'rows':>9s} {'cols':>5s} {'Arrow MB':>9s} {'frame MB':>9s} {'heap MB':>8s} {'peak RSS MB':>12s} {'seconds':>8s}")
+    for variant in ["fetchdf", *VIEW_PROFILES]:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_fetch_profiles", "--database", args.database,
+             "--schema", args.schema, "--geometry", args.geometry, "--worker", variant],
+            check=True, capture_output=True, text=True
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        results.append(r)
+        print(f"{r['variant']:10s} {r['rows']:9,d} {r['columns']:5d} {r['arrow_mb']:9.1f} {r['frame_mb']:9.1f} {r['python_peak_mb']:8.1f} {r['peak_rss_mb']:12.1f} {r['seconds']:8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
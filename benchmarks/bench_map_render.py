@@ -0,0 +1,100 @@
+"""
+Benchmark H3 map rendering: one folium layer per hexagon against one FeatureCollection
+
+Reports build time, HTML render time and HTML payload size. Run from the
+repository root:
+    python -m benchmarks.bench_map_render --hexes 5000
+"""
+import argparse
+import time
+
+import folium
+import geopandas as gpd
+import numpy as np
+import shapely
+from branca.colormap import LinearColormap
+
+from functions.map_layers import HEX_COLORS
+from functions.map_prep_h3 import build_h3_map
+
+
+def make_hex_grid(hexes: int, seed: int = 42) -> gpd.GeoDataFrame:
+    """
+    Build a grid of hexagon-shaped polygons around Tyne and Wear with random counts
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(hexes)))
+    col, row = np.divmod(np.arange(hexes), side)
+    size = 0.004
+    lng = -1.8 + col * size * 1.5
+    lat = 54.8 + row * size * np.sqrt(3) + (col % 2) * size * np.sqrt(3) / 2
+
+    angles = np.deg2rad(np.arange(0, 360, 60))
+    ring_x = lng[:, None] + size * np.cos(angles)[None, :]
+    ring_y = lat[:, None] + size * np.sin(angles)[None, :]
+    polygons = shapely.polygons(np.stack([ring_x, ring_y], axis=-1))
+
+    work_count = rng.integers(1, 200, hexes)
+    return gpd.GeoDataFrame({
+        'h3_cell': [f"88{i:013x}" for i in range(hexes)],
+        'work_count': work_count,
+        'unique_permits': np.maximum(work_count - rng.integers(0, 5, hexes), 1),
+    }, geometry=polygons, crs="EPSG:4326")
+
+
+def build_per_row_map(geodf: gpd.GeoDataFrame, color_by: str = 'work_count') -> folium.Map:
+    """
+    The per-row layer construction that build_h3_map replaced
+    """
+    total_bounds = geodf.total_bounds
+    m = folium.Map(tiles="cartodbpositron")
+    m.fit_bounds([[total_bounds[1], total_bounds[0]], [total_bounds[3], total_bounds[2]]])
+    values = np.array(geodf[color_by].values, dtype=float)
+    colormap = LinearColormap(colors=HEX_COLORS, vmin=float(values.min()), vmax=float(values.max()))
+    for _, row in geodf.iterrows():
+        fill_color = colormap(row[color_by])
+        tooltip_content = f"""
+        <b>H3 Cell:</b> {row.get('h3_cell', 'N/A')}<br>
+        <b>Total Works:</b> {row.get('work_count', 0)}<br>
+        <b>Unique Permits:</b> {row.get('unique_permits', 0)}<br>
+        """
+        folium.GeoJson(
+            row.geometry.__geo_interface__,
+            style_function=lambda x, color=fill_color: {
+                'fillColor': color, 'color': 'black', 'weight': 1, 'fillOpacity': 0.7, 'opacity': 0.8
+            },
+            tooltip=folium.Tooltip(tooltip_content, max_width=300)
+        ).add_to(m)
+    colormap.add_to(m)
+    return m
+
+
+def measure(build, geodf: gpd.GeoDataFrame) -> tuple:
+    """
+    Build and render a map, returning build seconds, render seconds and HTML bytes
+    """
+    start = time.perf_counter()
+    m = build(geodf)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    html = m.get_root().render()
+    rendered = time.perf_counter() - start
+    return built, rendered, len(html.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hexes", type=int, default=5_000)
+    args = parser.parse_args()
+
+    geodf = make_hex_grid(args.hexes)
+
+    print(f"hexagons: {args.hexes:,}")
+    for name, build in [("per-row layers", build_per_row_map), ("feature collection", build_h3_map)]:
+        built, rendered, size = measure(build, geodf)
+        print(f"{name:20s} build {built:7.2f}s  render {rendered:7.2f}s  html {size / 1024 ** 2:8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Baseline benchmarks for the main pipeline stages against synthetic local data
+
+For each size a synthetic database is generated (see benchmarks.synthetic) and
+the app is pointed at it through NWG_LOCAL_DATABASE, so no MotherDuck secrets
+are needed. Each stage reports its best wall-clock time and the peak Python
+heap allocation (tracemalloc) of one extra run:
+
+- geodf:      convert_to_geodf on one month of completed works
+- hex_grid:   create_h3_hex_grid for every authority in one month
+- multi_month: create_h3_hex_grid_batch across all months, the multi-month
+  re-aggregation the app runs for a selection
+- line_grid:  create_h3_line_grid_batch across all months, counting lines in
+  every hexagon they pass through, to compare against multi_month
+- map_html:   build_h3_map and its HTML render, as done by plot_h3_map
+
+Stages that need the spatial or h3 DuckDB extensions report the error if the
+extensions cannot be loaded. Run from the repository root:
+    python -m benchmarks.bench_suite --rows 10000 100000 1000000 --months 3
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+import duckdb
+import pandas as pd
+
+from benchmarks.bench_map_render import make_hex_grid
+from benchmarks.synthetic import AUTHORITY_EXTENTS, DEFAULT_SCHEMA, write_database
+
+
+def measure(func: Callable, setup: Optional[Callable] = None, repeat: int = 3) -> dict:
+    """
+    Best wall-clock time over several runs, then peak traced memory of one more run
+
+    setup is called before every run and its result passed to func, outside the
+    timed section.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "peak_mb": peak / 1024 ** 2}
+
+
+def load_completed_works(database: str, schema: str, table_name: str) -> pd.DataFrame:
+    """
+    Completed WORK_STOP rows of a month table with the normalized category, as fetched by the app
+    """
+    con = duckdb.connect(database, read_only=True)
+    try:
+        return con.execute(f"""
+        SELECT *,
+               CASE
+                   WHEN work_category IN ('Major', 'Major (PAA)') THEN 'Major'
+                   WHEN work_category IN ('Immediate - emergency', 'Immediate - urgent') THEN 'Emergency'
+                   WHEN work_category = 'Standard' THEN 'Standard'
+                   WHEN work_category = 'Minor' THEN 'Minor'
+                   ELSE 'Other'
+               END as normalized_work_category
+        FROM {schema}."{table_name}"
+        WHERE work_status_ref = 'completed'
+        AND event_type = 'WORK_STOP'
+        """).fetchdf()
+    finally:
+        con.close()
+
+
+def run_size(rows: int, months: int, workdir: Path, resolution: int, repeat: int) -> list:
+    """
+    Benchmark every stage against one synthetic database size
+    """
+    database = workdir / f"synthetic_{rows}_{months}.duckdb"
+    if not database.exists():
+        write_database(str(database), rows, months)
+    with duckdb.connect(str(database), read_only=True) as con:
+        tables = sorted(name for (name,) in con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = ?", [DEFAULT_SCHEMA]
+        ).fetchall())
+
+    # Point the app at the synthetic database, bypassing the parquet mirror and hex summary
+    os.environ["NWG_LOCAL_DATABASE"] = str(database)
+    os.environ["NWG_SCHEMA"] = DEFAULT_SCHEMA
+    os.environ["NWG_PARQUET_CACHE"] = "false"
+    os.environ["NWG_HEX_SUMMARY_DATABASE"] = str(workdir / "no_hex_summary.duckdb")
+
+    import streamlit as st
+    from functions.connection_pool import close_connection_pool
+    from functions.frame_cache import get_frame_cache
+    from functions.geo_prep import convert_to_geodf
+    from functions.hex_boundaries import get_boundary_store
+    from functions.h3_processing import create_h3_hex_grid, create_h3_hex_grid_batch, create_h3_line_grid_batch
+    from functions.map_prep_h3 import build_h3_map
+
+    close_connection_pool()
+    authorities = list(AUTHORITY_EXTENTS)
+    results = []
+
+    def record(stage: str, stage_rows: int, run: Callable[[], dict]) -> None:
+        try:
+            result = run()
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}".splitlines()[0]}
+        results.append({"stage": stage, "rows": stage_rows, **result})
+
+    works = load_completed_works(str(database), DEFAULT_SCHEMA, tables[0])
+    record("geodf", len(works), lambda: measure(convert_to_geodf, lambda: (works.copy(),), repeat))
+
+    def clear_caches():
+        # Every run starts cold, as on a new selection
+        st.cache_data.clear()
+        get_frame_cache().clear()
+        get_boundary_store().clear()
+        return ()
+
+    def hex_grid_all_authorities():
+        return [create_h3_hex_grid(authority, tables[0], resolution) for authority in authorities]
+
+    record("hex_grid", rows, lambda: measure(hex_grid_all_authorities, clear_caches, repeat))
+
+    grid_holder = {}
+
+    def multi_month():
+        grid_holder["grid"] = create_h3_hex_grid_batch(authorities, tables, resolution)
+
+    record("multi_month", rows * months, lambda: measure(multi_month, clear_caches, repeat))
+    record("line_grid", rows * months, lambda: measure(lambda: create_h3_line_grid_batch(authorities, tables, resolution), clear_caches, repeat))
+
+    # Render the grid from the multi-month stage, or a synthetic grid of similar size without h3
+    grid = grid_holder.get("grid")
+    if grid is None or grid.empty:
+        grid = make_hex_grid(max(rows // 10, 1))
+    record("map_html", len(grid), lambda: measure(lambda: build_h3_map(grid).get_root().render(), repeat=repeat))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Rows per month table")
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--resolution", type=int, default=9)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default=".cache/benchmarks", help="Where synthetic databases are kept between runs")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    print(f"{'stage':12s} {'rows':>10s} {'seconds':>9s} {'peak MB':>9s}")
+    for rows in args.rows:
+        for r in run_size(rows, args.months, workdir, args.resolution, args.repeat):
+            results.append(r)
+            if "error" in r:
+                print(f"{r['stage']:12s} {r['rows']:10,d}  {r['error']}")
+            else:
+                print(f"{r['stage']:12s} {r['rows']:10,d} {r['seconds']:9.3f} {r['peak_mb']:9.1f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Generate synthetic street works month tables with the real schema
+
+Geometries are WKT in EPSG:27700 with Z values, a mix of points and lines,
+spread over boxes around each highway authority. Some permits repeat across
+months and some rows are not completed WORK_STOP events, so deduplication and
+filters have work to do. Write a stand-in database from the repository root:
+    python -m benchmarks.synthetic --database street_works.duckdb --rows 100000 --months 6
+
+Then point the app at it with NWG_LOCAL_DATABASE=street_works.duckdb and
+NWG_SCHEMA=raw_data_2025.
+"""
+import argparse
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+DEFAULT_SCHEMA = "raw_data_2025"
+
+# Approximate easting/northing boxes (EPSG:27700) for each authority
+AUTHORITY_EXTENTS = {
+    "NEWCASTLE CITY COUNCIL": (415000, 566000, 428000, 572000),
+    "SUNDERLAND CITY COUNCIL": (432000, 548000, 442000, 562000),
+    "DARLINGTON BOROUGH COUNCIL": (420000, 510000, 435000, 520000),
+    "DURHAM COUNTY COUNCIL": (400000, 520000, 440000, 560000),
+    "SOUTH TYNESIDE COUNCIL": (432000, 562000, 440000, 568000),
+    "NORTH TYNESIDE COUNCIL": (427000, 568000, 438000, 576000),
+}
+
+# Raw work_category values as they appear in the source tables
+WORK_CATEGORIES = ["Major", "Major (PAA)", "Standard", "Minor", "Immediate - emergency", "Immediate - urgent"]
+WORK_CATEGORY_WEIGHTS = [0.05, 0.02, 0.25, 0.5, 0.08, 0.10]
+
+ACTIVITY_TYPES = [
+    "Utility repair and maintenance works", "Highway repair and maintenance works",
+    "New service connection", "Utility asset works", "Diversionary works",
+    "Permanent reinstatement", "Remedial works", "Works for rail purposes",
+]
+
+PROMOTERS = ["Northumbrian Water", "Northern Powergrid", "Northern Gas Networks", "Openreach", "Virgin Media", "Council Highways"]
+
+
+def month_table_names(months: int, year: int = 2025) -> list:
+    """
+    Month table names (MM_YYYY) for the first months of a year
+    """
+    return [f"{month:02d}_{year}" for month in range(1, months + 1)]
+
+
+def points_wkt(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> list:
+    """
+    POINT Z WKT strings
+    """
+    return [f"POINT Z ({xi:.2f} {yi:.2f} {zi:.1f})" for xi, yi, zi in zip(x, y, z)]
+
+
+def lines_wkt(x: np.ndarray, y: np.ndarray, vertices: np.ndarray, rng: np.random.Generator) -> list:
+    """
+    LINESTRING Z WKT strings wandering away from each start point
+    """
+    wkt = []
+    for xi, yi, n in zip(x, y, vertices):
+        steps = rng.normal(0, 25, (n - 1, 2)).cumsum(axis=0)
+        coords = [(xi, yi)] + [(xi + dx, yi + dy) for dx, dy in steps]
+        wkt.append("LINESTRING Z (" + ", ".join(f"{cx:.2f} {cy:.2f} 0.0" for cx, cy in coords) + ")")
+    return wkt
+
+
+def make_month_table(rows: int, month_index: int, seed: int = 42, line_share: float = 0.4, repeat_share: float = 0.1) -> pd.DataFrame:
+    """
+    Build one synthetic month table
+
+    Args:
+        rows: Number of rows
+        month_index: Position of the month, used for permit numbering and the seed
+        seed: Base random seed
+        line_share: Fraction of works located by a line rather than a point
+        repeat_share: Fraction of permits reused from the previous month
+
+    Returns:
+        DataFrame with the columns of a source month table
+    """
+    rng = np.random.default_rng(seed + month_index)
+    authorities = np.array(list(AUTHORITY_EXTENTS))
+    authority = rng.choice(authorities, rows)
+    extents = np.array([AUTHORITY_EXTENTS[name] for name in authorities], dtype=float)
+    box = extents[pd.Index(authorities).get_indexer(authority)]
+
+    x = rng.uniform(box[:, 0], box[:, 2])
+    y = rng.uniform(box[:, 1], box[:, 3])
+    is_line = rng.random(rows) < line_share
+
+    location = np.empty(rows, dtype=object)
+    location[~is_line] = points_wkt(x[~is_line], y[~is_line], np.zeros(int((~is_line).sum())))
+    location[is_line] = lines_wkt(x[is_line], y[is_line], rng.integers(2, 6, int(is_line.sum())), rng)
+
+    # Reuse some permit numbers from the previous month so they must be deduplicated
+    permit_numbers = np.arange(rows) + month_index * rows
+    if month_index > 0:
+        repeats = rng.random(rows) < repeat_share
+        permit_numbers[repeats] -= rows
+
+    return pd.DataFrame({
+        'permit_reference_number': [f"SYN{number:09d}" for number in permit_numbers],
+        'highway_authority': authority,
+        'promoter_organisation': rng.choice(PROMOTERS, rows),
+        'activity_type': rng.choice(ACTIVITY_TYPES, rows),
+        'work_category': rng.choice(WORK_CATEGORIES, rows, p=WORK_CATEGORY_WEIGHTS),
+        'work_status_ref': rng.choice(["completed", "in_progress", "cancelled"], rows, p=[0.85, 0.1, 0.05]),
+        'event_type': rng.choice(["WORK_STOP", "WORK_START"], rows, p=[0.9, 0.1]),
+        'event_time': pd.Timestamp(2025, month_index + 1, 1) + pd.to_timedelta(rng.integers(0, 27 * 86400, rows), unit="s"),
+        'works_location_coordinates': location,
+    })
+
+
+def write_database(database: str, rows: int, months: int, schema: str = DEFAULT_SCHEMA, seed: int = 42) -> list:
+    """
+    Write synthetic month tables into a DuckDB file, replacing any existing ones
+
+    Returns:
+        Names of the month tables written
+    """
+    con = duckdb.connect(database)
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    tables = month_table_names(months)
+    for month_index, table_name in enumerate(tables):
+        month_df = make_month_table(rows, month_index, seed)
+        con.register('month_df', month_df)
+        con.execute(f'CREATE OR REPLACE TABLE {schema}."{table_name}" AS SELECT * FROM month_df')
+        con.unregister('month_df')
+    con.close()
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA)
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows per month table")
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = write_database(args.database, args.rows, args.months, args.schema, args.seed)
+    print(f"Wrote {len(tables)} month tables of {args.rows:,} rows to {args.database} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import re
+import time
+import multiprocessing
+import duckdb
+import geopandas as gpd
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from .fetch_data import concat_frames, open_connection
+from .h3_processing import PYRAMID_COARSEST_RESOLUTION, PYRAMID_FINEST_RESOLUTION, fetch_h3_pyramid, h3_grid_from_pyramid
+from .h3_state import MAX_ACTIVITY_CODES, activity_code_bits, activity_type_names, remap_activity_masks
+from .ingest_months import discover_month_tables
+from .parquet_cache import get_table_sources
+from .settings import get_required_setting
+
+# Output formats and their file extensions
+EXPORT_FORMATS = {"parquet": "parquet", "flatgeobuf": "fgb"}
+
+# Columns written for each hexagon
+EXPORT_COLUMNS = [
+    "h3_cell", "work_count", "unique_permits", "activity_types",
+    "work_categories", "center_lat", "center_lng", "geometry"
+]
+
+MANIFEST_NAME = "manifest.json"
+
+# How work_count is counted in the combined grids. Partitions are aggregated
+# per month, so a permit in several months counts once in each; the app's
+# multi-month grid counts it once, for its latest month.
+COMBINED_WORK_COUNT_BASIS = "sum over months"
+
+# Connection reused by every task in a worker process
+_worker_con: Optional[duckdb.DuckDBPyConnection] = None
+
+def slugify(name: str) -> str:
+    """
+    File-name friendly version of an authority name
+    """
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def output_path(output_dir: Path, resolution: int, table_name: str, authority: str, export_format: str) -> Path:
+    """
+    Where the grid for one authority, month and resolution is written
+    """
+    return output_dir / f"resolution={resolution}" / f"month={table_name}" / f"{slugify(authority)}.{EXPORT_FORMATS[export_format]}"
+
+def export_frame(grid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Hexagon grid reduced to the exported columns
+
+    List columns are joined into strings, as FlatGeobuf has no list type.
+    """
+    frame = grid[EXPORT_COLUMNS].copy()
+    for column in ("activity_types", "work_categories"):
+        frame[column] = frame[column].map(", ".join)
+    return frame
+
+def write_grid(grid: gpd.GeoDataFrame, path: Path, export_format: str) -> int:
+    """
+    Write a hexagon grid in one format
+
+    Returns:
+        Size of the written file in bytes
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    frame = export_frame(grid)
+    if export_format == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_file(path, driver="FlatGeobuf")
+    return path.stat().st_size
+
+def init_worker(threads_per_worker: int) -> None:
+    """
+    Open the worker's connection and size its local DuckDB engine
+    """
+    global _worker_con
+    # Workers share the machine, so each engine gets a slice of the cores
+    os.environ.setdefault("NWG_LOCAL_ENGINE_THREADS", str(threads_per_worker))
+    _worker_con = open_connection(read_only=True)
+
+def export_partition(authority: str, table_name: str, table_source: str, resolutions: List[int], categories: Optional[List[str]], output_dir: str, formats: List[str], keep_pyramid: bool) -> Tuple[List[Dict], Optional[pd.DataFrame], List[str]]:
+    """
+    Build one authority and month's pyramid and write its grid at every resolution
+
+    Runs in a worker process. The month is read from the table_source
+    resolved by prepare_selection, so workers never write to the parquet
+    cache or its manifest.
+
+    Returns:
+        Manifest entries for the written files, the pyramid when it is needed
+        for the combined grids, and the worker's activity type for each mask bit
+    """
+    assert _worker_con is not None
+    schema = get_required_setting("schema")
+    start = time.perf_counter()
+    pyramid = fetch_h3_pyramid(_worker_con, schema, [authority], [table_name], categories, {table_name: table_source})
+
+    entries = []
+    for resolution in resolutions:
+        label = f"{authority} {table_name}"
+        grid = h3_grid_from_pyramid(pyramid, resolution, label) if not pyramid.empty else gpd.GeoDataFrame()
+        if grid.empty:
+            continue
+        for export_format in formats:
+            path = output_path(Path(output_dir), resolution, table_name, authority, export_format)
+            entries.append({
+                "highway_authority": authority,
+                "month_table": table_name,
+                "resolution": resolution,
+                "format": export_format,
+                "path": path.relative_to(output_dir).as_posix(),
+                "hexagons": len(grid),
+                "work_count": int(grid['work_count'].sum()),
+                "bytes": write_grid(grid, path, export_format),
+            })
+
+    logger.info(f"Exported {authority} {table_name} in {time.perf_counter() - start:.1f}s")
+    return entries, (pyramid if keep_pyramid and not pyramid.empty else None), activity_type_names()
+
+def export_combined(pyramids: List[pd.DataFrame], resolutions: List[int], output_dir: Path, formats: List[str]) -> List[Dict]:
+    """
+    Merge the partition pyramids into one grid per resolution covering the whole selection
+
+    work_count is summed over the months (see COMBINED_WORK_COUNT_BASIS);
+    unique_permits counts each permit once.
+    """
+    pyramid = concat_frames(pyramids)
+    entries = []
+    for resolution in resolutions:
+        grid = h3_grid_from_pyramid(pyramid, resolution, "combined selection")
+        if grid.empty:
+            continue
+        for export_format in formats:
+            path = output_dir / f"resolution={resolution}" / f"combined.{EXPORT_FORMATS[export_format]}"
+            entries.append({
+                "highway_authority": None,
+                "month_table": None,
+                "resolution": resolution,
+                "format": export_format,
+                "path": path.relative_to(output_dir).as_posix(),
+                "hexagons": len(grid),
+                "work_count": int(grid['work_count'].sum()),
+                "work_count_basis": COMBINED_WORK_COUNT_BASIS,
+                "bytes": write_grid(grid, path, export_format),
+            })
+    return entries
+
+def prepare_selection(authorities: Optional[List[str]], table_names: Optional[List[str]]) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """
+    Resolve the authorities and months to export, mirroring each month once up front
+
+    Returns:
+        Authorities, month tables and the SQL relation to read each month from,
+        which workers use as-is, only reading the local copies
+    """
+    schema = get_required_setting("schema")
+    con = open_connection(read_only=True)
+    try:
+        table_names = table_names or discover_month_tables(con, schema)
+        sources = get_table_sources(con, schema, table_names)
+        if not authorities:
+            union = " UNION ".join(f"SELECT DISTINCT highway_authority FROM {source}" for source in sources.values())
+            authorities = sorted(name for (name,) in con.execute(union).fetchall() if name)
+    finally:
+        con.close()
+    return authorities, table_names, sources
+
+def run_export(authorities: Optional[List[str]], table_names: Optional[List[str]], resolutions: List[int], categories: Optional[List[str]], output_dir: Path, formats: List[str], workers: Optional[int] = None, combined: bool = False) -> Dict:
+    """
+    Export hexagon grids for every authority and month on a process pool
+
+    Each (authority, month) partition is fetched and aggregated once in a
+    worker, and its grid is written at every requested resolution. A failed
+    partition is recorded in the manifest without stopping the others.
+
+    Args:
+        authorities: Highway authorities, defaults to all in the selected months
+        table_names: Month tables, defaults to every month table in the schema
+        resolutions: H3 resolutions to write
+        categories: Normalized work categories to include, defaults to all
+        output_dir: Directory for the grids and the manifest
+        formats: Output formats, keys of EXPORT_FORMATS
+        workers: Number of worker processes, defaults to the number of cores
+        combined: Also write one merged grid per resolution for the whole selection
+
+    Returns:
+        The manifest that was written
+    """
+    authorities, table_names, table_sources = prepare_selection(authorities, table_names)
+    partitions = [(authority, table_name) for table_name in table_names for authority in authorities]
+    workers = workers or os.cpu_count() or 1
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    started = datetime.now(timezone.utc)
+    entries, failures, pyramids = [], [], []
+    logger.info(f"Exporting {len(partitions)} partitions at resolutions {resolutions} with {workers} workers")
+
+    # Spawn rather than fork, so workers do not inherit DuckDB's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker, initargs=(threads_per_worker,)) as executor:
+        futures = {
+            executor.submit(export_partition, authority, table_name, table_sources[table_name], resolutions, categories, str(output_dir), formats, combined): (authority, table_name)
+            for authority, table_name in partitions
+        }
+        for future in as_completed(futures):
+            authority, table_name = futures[future]
+            try:
+                partition_entries, pyramid, activity_names = future.result()
+                entries.extend(partition_entries)
+                if pyramid is not None:
+                    # Activity codes are assigned per process, so re-encode masks with this process's codes
+                    process_bits = activity_code_bits([name for name in activity_names[:MAX_ACTIVITY_CODES] if name])
+                    pyramid['activity_mask'] = remap_activity_masks(pyramid['activity_mask'], activity_names, process_bits)
+                    pyramids.append(pyramid)
+            except Exception as e:
+                logger.error(f"Export of {authority} {table_name} failed: {e}")
+                failures.append({"highway_authority": authority, "month_table": table_name, "error": str(e)})
+
+    if combined and pyramids:
+        entries.extend(export_combined(pyramids, resolutions, output_dir, formats))
+
+    manifest = {
+        "created_at": started.isoformat(),
+        "seconds": round((datetime.now(timezone.utc) - started).total_seconds(), 3),
+        "highway_authorities": authorities,
+        "month_tables": table_names,
+        "resolutions": resolutions,
+        "categories": categories,
+        "outputs": entries,
+        "failures": failures,
+    }
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    logger.info(f"Wrote {len(entries)} files to {output_dir} ({len(failures)} partitions failed)")
+    return manifest
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute H3 hexagon grids and export them without Streamlit")
+    parser.add_argument("--authorities", nargs="+", help="Highway authorities, defaults to all")
+    parser.add_argument("--months", nargs="+", help="Month tables (e.g. 06_2025), defaults to all")
+    parser.add_argument("--resolutions", nargs="+", type=int, default=[8], help="H3 resolutions between 6 and 11")
+    parser.add_argument("--categories", nargs="+", choices=["Major", "Standard", "Emergency", "Minor"], help="Work categories, defaults to all")
+    parser.add_argument("--formats", nargs="+", choices=list(EXPORT_FORMATS), default=["parquet"])
+    parser.add_argument("--output", default="exports", help="Output directory")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to the number of cores")
+    parser.add_argument("--combined", action="store_true", help=(
+        "Also write one grid per resolution merging the whole selection. Its work_count is summed over months, "
+        "so a permit in several months counts once per month, unlike the app's multi-month grid"
+    ))
+    args = parser.parse_args()
+    if not all(PYRAMID_COARSEST_RESOLUTION <= resolution <= PYRAMID_FINEST_RESOLUTION for resolution in args.resolutions):
+        parser.error(f"resolutions must be between {PYRAMID_COARSEST_RESOLUTION} and {PYRAMID_FINEST_RESOLUTION}")
+
+    manifest = run_export(args.authorities, args.months, args.resolutions, args.categories, Path(args.output), args.formats, args.workers, args.combined)
+    if manifest["failures"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
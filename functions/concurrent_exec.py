@@ -0,0 +1,73 @@
+import contextvars
+import threading
+import time
+import duckdb
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Hashable, Iterator, NamedTuple, Optional
+
+from loguru import logger
+from .settings import get_setting
+
+DEFAULT_MAX_CONCURRENCY = 6
+
+class TaskResult(NamedTuple):
+    """
+    Outcome of one concurrent task: its value, or the error it raised
+    """
+    key: Hashable
+    value: Any
+    error: Optional[BaseException]
+    seconds: float
+
+def get_max_concurrency() -> int:
+    """
+    Number of tasks allowed to run at once
+    """
+    return int(get_setting("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+
+def run_concurrently(tasks: Dict[Hashable, Callable[[duckdb.DuckDBPyConnection], Any]], con: duckdb.DuckDBPyConnection, max_workers: Optional[int] = None) -> Iterator[TaskResult]:
+    """
+    Run tasks on a thread pool, yielding each result as soon as it completes
+
+    Every worker thread gets its own cursor on the connection, and each task is
+    called with that cursor. A task that raises is
+    reported through TaskResult.error without affecting the others. Results are
+    yielded on the calling thread, so it can update the UI as they arrive.
+
+    Args:
+        tasks: Mapping of task key to a callable taking a cursor
+        con: Shared connection the per-thread cursors are created from
+        max_workers: Concurrency limit, defaults to the max_concurrency setting
+    """
+    if not tasks:
+        return
+
+    thread_state = threading.local()
+    cursors = []
+    cursors_lock = threading.Lock()
+
+    def thread_cursor() -> duckdb.DuckDBPyConnection:
+        if not hasattr(thread_state, "cursor"):
+            thread_state.cursor = con.cursor()
+            with cursors_lock:
+                cursors.append(thread_state.cursor)
+        return thread_state.cursor
+
+    def run(key: Hashable, task: Callable[[duckdb.DuckDBPyConnection], Any]) -> TaskResult:
+        start = time.perf_counter()
+        try:
+            return TaskResult(key, task(thread_cursor()), None, time.perf_counter() - start)
+        except Exception as e:
+            logger.error(f"Task {key} failed: {e}")
+            return TaskResult(key, None, e, time.perf_counter() - start)
+
+    workers = max(1, min(max_workers or get_max_concurrency(), len(tasks)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nwg-task") as executor:
+            # Each task runs in a copy of the caller's context so its spans join the request trace
+            futures = [executor.submit(contextvars.copy_context().run, run, key, task) for key, task in tasks.items()]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        for cursor in cursors:
+            cursor.close()
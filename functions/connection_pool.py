@@ -0,0 +1,287 @@
+import re
+import threading
+import time
+import duckdb
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from loguru import logger
+from .settings import get_setting
+
+T = TypeVar("T")
+
+# Connections kept open to MotherDuck, shared by every session
+DEFAULT_POOL_SIZE = 8
+
+# Seconds a caller waits for a free connection before giving up
+DEFAULT_POOL_TIMEOUT_SECONDS = 30.0
+
+# Connections idle for longer than this are checked with a trivial query before use
+DEFAULT_HEALTH_CHECK_SECONDS = 60.0
+
+# Attempts for an operation failing with a transient error, and the first backoff delay
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+
+# Errors raised by a dropped connection, which are worth retrying
+TRANSIENT_ERRORS = (duckdb.ConnectionException,)
+
+# DuckDB also raises IOException for deterministic failures such as a missing
+# file or a bad glob, so only those reporting a network failure are retried
+NETWORK_ERROR_PATTERN = re.compile(
+    r"HTTP|connection (reset|refused|closed)|timed out|timeout|could not resolve|network|SSL|socket|broken pipe",
+    re.IGNORECASE,
+)
+
+class PoolTimeout(TimeoutError):
+    """
+    No pooled connection became free within the pool timeout
+    """
+
+def get_pool_size() -> int:
+    """
+    Number of pooled connections, from the pool_size setting
+    """
+    return int(get_setting("pool_size", DEFAULT_POOL_SIZE))
+
+def get_pool_timeout() -> float:
+    """
+    Seconds to wait for a free connection, from the pool_timeout setting
+    """
+    return float(get_setting("pool_timeout", DEFAULT_POOL_TIMEOUT_SECONDS))
+
+def get_pool_retries() -> int:
+    """
+    Attempts for an operation failing with a transient error, from the pool_retries setting
+    """
+    return int(get_setting("pool_retries", DEFAULT_RETRIES))
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether an error comes from a dropped connection or network failure rather than the query itself
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, duckdb.IOException) and NETWORK_ERROR_PATTERN.search(str(error)) is not None
+
+def is_alive(con: duckdb.DuckDBPyConnection) -> bool:
+    """
+    Whether a connection still answers a trivial query
+    """
+    try:
+        con.execute("SELECT 1").fetchone()
+        return True
+    except duckdb.Error:
+        return False
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections
+
+    Connections are opened on demand up to the pool size and handed to one
+    caller at a time, so concurrent sessions run their queries in parallel
+    rather than queueing on a single connection. A connection that has been
+    idle for a while is checked before it is handed out, and one that failed
+    with a transient error is closed and replaced.
+    """
+
+    def __init__(self, connect: Callable[[], duckdb.DuckDBPyConnection], size: int, timeout: float = DEFAULT_POOL_TIMEOUT_SECONDS, health_check_seconds: float = DEFAULT_HEALTH_CHECK_SECONDS):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_seconds = health_check_seconds
+        self._condition = threading.Condition()
+        # Idle connections and when each was last returned, most recent last
+        self._idle: List[Tuple[duckdb.DuckDBPyConnection, float]] = []
+        self._open = 0
+        self._closed = False
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.opened = 0
+        self.discarded = 0
+        self.retries = 0
+
+    def acquire(self) -> duckdb.DuckDBPyConnection:
+        """
+        Take a connection, opening one if the pool is not full or waiting for one to be released
+
+        Raises:
+            PoolTimeout: If no connection is free within the pool timeout
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(f"No database connection free after {self.timeout:g}s ({self.size} in use)")
+            if self._idle:
+                con, returned_at = self._idle.pop()
+            else:
+                con, returned_at = None, None
+                # Reserve the slot before connecting outside the lock
+                self._open += 1
+            self.in_use += 1
+
+        try:
+            if con is not None and time.monotonic() - returned_at > self.health_check_seconds and not is_alive(con):
+                logger.info("Replacing a pooled connection that failed its health check")
+                self._close(con)
+                con = None
+                with self._condition:
+                    self.discarded += 1
+            if con is None:
+                con = self.connect()
+                with self._condition:
+                    self.opened += 1
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self.in_use -= 1
+                self._condition.notify()
+            raise
+
+        waited = time.perf_counter() - start
+        with self._condition:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return con
+
+    def release(self, con: duckdb.DuckDBPyConnection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool, or close it when discard is set
+        """
+        discard = discard or self._closed
+        if discard:
+            self._close(con)
+        with self._condition:
+            self.in_use -= 1
+            if discard:
+                self._open -= 1
+                self.discarded += 1
+            else:
+                self._idle.append((con, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """
+        Hold a pooled connection for the duration of a block
+
+        A connection that raises a transient error is discarded rather than
+        returned to the pool.
+        """
+        con = self.acquire()
+        discard = False
+        try:
+            yield con
+        except BaseException as e:
+            discard = is_transient(e)
+            raise
+        finally:
+            self.release(con, discard)
+
+    def run(self, operation: Callable[[duckdb.DuckDBPyConnection], T], retries: Optional[int] = None, backoff_seconds: float = DEFAULT_BACKOFF_SECONDS) -> T:
+        """
+        Run an operation on a pooled connection, retrying transient errors on a fresh one
+
+        Operations should only read, as a failed attempt is run again in full.
+
+        Args:
+            operation: Callable taking a connection
+            retries: Attempts in total, defaults to the pool_retries setting
+            backoff_seconds: Delay before the first retry, doubled for each one after
+        """
+        attempts = max(1, get_pool_retries() if retries is None else retries)
+        for attempt in range(attempts):
+            try:
+                with self.connection() as con:
+                    return operation(con)
+            except duckdb.Error as e:
+                if not is_transient(e) or attempt == attempts - 1:
+                    raise
+                delay = backoff_seconds * 2 ** attempt
+                with self._condition:
+                    self.retries += 1
+                logger.warning(f"Transient database error, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        """
+        Close every idle connection; connections in use are closed when released
+        """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for con, _ in idle:
+            self._close(con)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Current size and wait metrics
+        """
+        with self._condition:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "mean_wait_seconds": self.wait_seconds / self.checkouts if self.checkouts else None,
+                "max_wait_seconds": self.max_wait_seconds,
+                "opened": self.opened,
+                "discarded": self.discarded,
+                "retries": self.retries,
+            }
+
+    @staticmethod
+    def _close(con: duckdb.DuckDBPyConnection) -> None:
+        try:
+            con.close()
+        except duckdb.Error as e:
+            logger.debug(f"Ignoring error closing a pooled connection: {e}")
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def open_pooled_connection() -> duckdb.DuckDBPyConnection:
+    """
+    Open a connection for the pool, loading the h3 extension once for its lifetime
+
+    open_connection already loads spatial. h3 is only needed by queries
+    aggregated remotely, so a failure to load it is logged rather than raised.
+    """
+    # Imported here, as fetch_data uses the pool
+    from .fetch_data import open_connection
+    con = open_connection()
+    try:
+        con.execute("INSTALL h3 FROM community; LOAD h3;")
+    except duckdb.Error as e:
+        logger.warning(f"Could not load the h3 extension on a pooled connection: {e}")
+    return con
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Process-wide pool of MotherDuck connections, shared by every session
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(open_pooled_connection, get_pool_size(), get_pool_timeout())
+            logger.info(f"Created a pool of up to {_pool.size} database connections")
+        return _pool
+
+def close_connection_pool() -> None:
+    """
+    Close the pool's idle connections; the next call to get_connection_pool creates a new pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,80 @@
+import threading
+import duckdb
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from loguru import logger
+from .settings import get_setting
+from .tracing import span
+
+# Extensions loaded once when the engine starts
+DEFAULT_EXTENSIONS = ["h3 FROM community", "spatial"]
+
+_engine: Optional[duckdb.DuckDBPyConnection] = None
+_engine_lock = threading.Lock()
+
+def engine_config() -> dict:
+    """
+    DuckDB configuration for the local engine from the local_engine_* settings
+    """
+    config = {}
+    threads = get_setting("local_engine_threads")
+    if threads:
+        config["threads"] = int(threads)
+    memory_limit = get_setting("local_engine_memory_limit")
+    if memory_limit:
+        config["memory_limit"] = str(memory_limit)
+    return config
+
+def start_engine(extensions: Optional[List[str]] = None) -> duckdb.DuckDBPyConnection:
+    """
+    Create an in-memory DuckDB database and load the extensions it needs
+
+    Args:
+        extensions: Extensions to install and load, as accepted by INSTALL
+            (e.g. "h3 FROM community"). Defaults to h3 and spatial.
+    """
+    with span("engine.start"):
+        con = duckdb.connect(':memory:', config=engine_config())
+        for extension in DEFAULT_EXTENSIONS if extensions is None else extensions:
+            con.execute(f"INSTALL {extension};")
+            con.execute(f"LOAD {extension.split()[0]};")
+        return con
+
+def get_local_engine() -> duckdb.DuckDBPyConnection:
+    """
+    Return the process-wide local DuckDB engine, starting it on first use
+
+    Extensions are resolved once per process rather than on every aggregation.
+    Use local_cursor() to run queries rather than the returned connection itself.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = start_engine()
+            logger.info(f"Started local DuckDB engine with {engine_config() or 'default'} configuration")
+        return _engine
+
+@contextmanager
+def local_cursor() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Yield a cursor on the local engine for one request
+
+    Each cursor is its own connection to the shared database, so registered
+    frames and temporary tables do not leak between threads.
+    """
+    cursor = get_local_engine().cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+def shutdown_engine() -> None:
+    """
+    Close the local engine; the next call to get_local_engine starts a new one
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
@@ -1,19 +1,159 @@
 import duckdb
-import streamlit as st
 import geopandas as gpd
-from typing import Optional, List
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import union_categoricals
+from typing import Optional, List, Tuple, Dict, Iterator
 
 from loguru import logger
-from .geo_prep import convert_to_geodf
+from .geo_prep import convert_to_geodf, GEOMETRY_WKB_COLUMN
+from .concurrent_exec import TaskResult, run_concurrently
+from .connection_pool import get_connection_pool
+from .frame_cache import get_frame_cache
+from .parquet_cache import get_table_source, remote_source
+from .settings import get_setting, get_required_setting
+from .single_flight import single_flight
+from .tracing import span
 
-@st.cache_resource
-def connect_to_motherduck() -> duckdb.DuckDBPyConnection:
+# Raw columns each view needs besides the decoded geometry and normalized
+# work category. None selects every column.
+VIEW_PROFILES: Dict[str, Optional[List[str]]] = {
+    "h3": ["permit_reference_number", "highway_authority", "activity_type", "work_category"],
+    "map": ["permit_reference_number", "highway_authority", "activity_type", "work_category", "work_status_ref", "event_type"],
+    "table": None,
+    "remote_h3": ["permit_reference_number", "activity_type", "work_category", "works_location_coordinates"],
+}
+
+# Profiles whose rows are consumed in SQL, reading the raw WKT of the remote
+# tables without decoding geometry
+RAW_GEOMETRY_PROFILES = {"remote_h3"}
+
+# Low-cardinality text columns fetched as dictionary-encoded categoricals
+CATEGORICAL_COLUMNS = [
+    "highway_authority",
+    "work_category",
+    "normalized_work_category",
+    "activity_type",
+    "promoter_organisation",
+    "work_status_ref",
+    "event_type",
+    "month_table",
+]
+
+# Every highway authority in the data
+ALL_HIGHWAY_AUTHORITIES = [
+    "NEWCASTLE CITY COUNCIL",
+    "SUNDERLAND CITY COUNCIL",
+    "DARLINGTON BOROUGH COUNCIL",
+    "DURHAM COUNTY COUNCIL",
+    "SOUTH TYNESIDE COUNCIL",
+    "NORTH TYNESIDE COUNCIL",
+]
+
+# Normalized work categories that can be selected, see get_work_category_filter
+SELECTABLE_CATEGORIES = ["Major", "Standard", "Emergency", "Minor"]
+
+# Bounds for the st.cache_data caches, so they do not grow without limit across sessions
+CACHE_MAX_ENTRIES = 32
+CACHE_TTL_SECONDS = 3600
+
+def profile_columns_sql(view_profile: str, exclude: Optional[List[str]] = None) -> str:
+    """
+    Select list for the raw columns of a view profile
+
+    Args:
+        view_profile: Key of VIEW_PROFILES
+        exclude: Helper columns to drop when every column is selected
+    """
+    if view_profile not in VIEW_PROFILES:
+        raise ValueError(f"Unknown view profile '{view_profile}', expected one of {list(VIEW_PROFILES)}")
+    columns = VIEW_PROFILES[view_profile]
+    if columns is None:
+        return f"* EXCLUDE ({', '.join(exclude)})" if exclude else "*"
+    return ", ".join(columns)
+
+def fetch_arrow_frame(result: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """
+    Fetch a query result through Arrow into a compact pandas DataFrame
+    """
+    with span("fetch.arrow") as record:
+        table = result.fetch_arrow_table()
+        record["rows"] = table.num_rows
+        record["bytes"] = table.nbytes
+        return arrow_table_to_frame(table)
+
+def is_text_type(arrow_type: pa.DataType) -> bool:
+    """
+    Whether an Arrow type holds plain (not dictionary-encoded) strings
+    """
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+def arrow_table_to_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert an Arrow table into a compact pandas DataFrame
+
+    Low-cardinality text columns become categoricals, other text columns are
+    Arrow-backed strings, and binary geometry stays as bytes for decoding.
+    """
+    for name in CATEGORICAL_COLUMNS:
+        index = table.schema.get_field_index(name)
+        if index != -1 and is_text_type(table.schema.field(index).type):
+            table = table.set_column(index, name, pc.dictionary_encode(table.column(index)))
+
+    def types_mapper(arrow_type: pa.DataType):
+        if is_text_type(arrow_type):
+            return pd.ArrowDtype(arrow_type)
+        return None
+
+    return table.to_pandas(types_mapper=types_mapper)
+
+def categorize_columns(df: pd.DataFrame, columns: List[str] = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """
+    Convert the given low-cardinality text columns of a frame to categoricals, in place
     """
-    Create a database connection object to MotherDuck
+    for name in columns:
+        if name in df.columns and not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype('category')
+    return df
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate frames, keeping categorical columns categorical
+
+    pandas falls back to object when the categories differ between frames, so
+    those columns are rebuilt from the union of the categories.
+    """
+    df = pd.concat(frames, ignore_index=True)
+    for name in CATEGORICAL_COLUMNS:
+        if name not in df.columns or isinstance(df[name].dtype, pd.CategoricalDtype):
+            continue
+        if all(isinstance(frame[name].dtype, pd.CategoricalDtype) for frame in frames):
+            df[name] = union_categoricals([frame[name] for frame in frames])
+    return df
+
+def open_connection(read_only: bool = False) -> duckdb.DuckDBPyConnection:
+    """
+    Open a new database connection to MotherDuck
+
+    If the local_database setting is present, connect to that DuckDB file
+    instead so the app can run offline against a stand-in copy of the schema
+
+    Args:
+        read_only: Open a local database file read-only, so several processes
+            can read it at once
     """
+    local_database = get_setting("local_database")
+    if local_database:
+        logger.info(f"Using local DuckDB database {local_database}")
+        con = duckdb.connect(local_database, read_only=read_only)
+        con.execute("INSTALL spatial; LOAD spatial;")
+        return con
+
     # Define secrets
-    database = st.secrets["db"]
-    token = st.secrets["token"]
+    database = get_required_setting("db")
+    token = get_required_setting("token")
 
     # Check if token exists
     if token is None:
@@ -25,6 +165,8 @@ def connect_to_motherduck() -> duckdb.DuckDBPyConnection:
     # Attempt connection
     try:
         con = duckdb.connect(connection_string)
+        # Spatial is used to decode geometries server-side
+        con.execute("INSTALL spatial; LOAD spatial;")
         return con
     except Exception as e:
         logger.warning(f"An error occured: {e}")
@@ -58,44 +200,315 @@ def get_work_category_filter(selected_categories: Optional[List[str]]) -> str:
     else:
         return "1=1"  # No filter
 
-@st.cache_data
-def fetch_data(highway_authority: str, table_name: str, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+def fetch_data(highway_authority: str, table_name: str, selected_categories: Optional[List[str]] = None, view_profile: str = "table") -> gpd.GeoDataFrame:
     """
     Fetch DataFrame containing data for specified highway authority and convert to GeoDataFrame
+
+    view_profile selects the columns returned (see VIEW_PROFILES)
+    """
+    return fetch_batch_data([highway_authority], [table_name], selected_categories, view_profile)
+
+def fetch_all_authorities_data(table_name: str, selected_categories: Optional[List[str]] = None, view_profile: str = "table") -> gpd.GeoDataFrame:
+    """
+    Fetch DataFrame containing data for all highway authorities and convert to GeoDataFrame
+
+    view_profile selects the columns returned (see VIEW_PROFILES)
+    """
+    return fetch_batch_data(ALL_HIGHWAY_AUTHORITIES, [table_name], selected_categories, view_profile)
+
+def month_table_sort_key(table_name: str) -> Tuple[int, int]:
+    """
+    Sort key for month tables named MM_YYYY so that later months sort last
+    """
+    month, year = table_name.split("_")
+    return int(year), int(month)
+
+def build_batch_query(schema: str, highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None, table_sources: Optional[Dict[str, str]] = None, view_profile: str = "table", per_month: bool = False) -> Tuple[str, List[str]]:
+    """
+    Build a single query covering every authority and month table
+
+    Each month table is filtered on its own and tagged with its table name in a
+    month_table column, then the branches are combined with UNION ALL BY NAME.
+    Permits that appear in more than one month are deduplicated, keeping the
+    record from the latest month. table_sources can map a table name to another
+    relation to read it from, such as its local GeoParquet mirror; every
+    source provides the decoded geometry as WKB (see parquet_cache). view_profile
+    selects the columns returned (see VIEW_PROFILES); month_table is always kept.
+    Profiles in RAW_GEOMETRY_PROFILES always read the remote tables.
+
+    With per_month, permits are instead deduplicated within each month and
+    normalized work category, so the rows can be cached per month and
+    category selections and the cross-month deduplication applied locally
+    (see select_works).
+
+    Returns:
+        Tuple of query string and positional parameters
+    """
+    if not highway_authorities:
+        raise ValueError("At least one highway authority is required")
+    if not table_names:
+        raise ValueError("At least one month table is required")
+
+    category_filter = get_work_category_filter(selected_categories)
+    authority_placeholders = ", ".join("?" for _ in highway_authorities)
+
+    # Order the month tables so the latest month has the highest rank
+    ordered_tables = sorted(set(table_names), key=month_table_sort_key)
+
+    raw_geometry = view_profile in RAW_GEOMETRY_PROFILES
+
+    branches = []
+    params: List[str] = []
+    for month_rank, table_name in enumerate(ordered_tables):
+        if raw_geometry:
+            table_source = f'{schema}."{table_name}"'
+        else:
+            table_source = (table_sources or {}).get(table_name) or remote_source(schema, table_name)
+        branches.append(f"""
+            SELECT *, '{table_name}' AS month_table, {month_rank} AS month_rank
+            FROM {table_source}
+            WHERE highway_authority IN ({authority_placeholders})
+            AND work_status_ref = 'completed'
+            AND event_type = 'WORK_STOP'
+            AND ({category_filter})
+        """)
+        params.extend(highway_authorities)
+
+    union_query = "\n            UNION ALL BY NAME\n".join(branches)
+    
+    select_columns = profile_columns_sql(view_profile, exclude=["month_rank"])
+    if VIEW_PROFILES[view_profile] is not None:
+        select_columns += ", month_table"
+
+    # Every column, the decoded geometry included, is already selected for profiles without a column list
+    geometry_sql = "" if raw_geometry or VIEW_PROFILES[view_profile] is None else f", {GEOMETRY_WKB_COLUMN}"
+
+    if per_month:
+        distinct_on = "permit_reference_number, month_table, normalized_work_category"
+        order_by = distinct_on
+    else:
+        distinct_on = "permit_reference_number"
+        order_by = "permit_reference_number, month_rank DESC"
+
+    query = f"""
+    WITH works AS (
+        {union_query}
+    )
+    SELECT DISTINCT ON ({distinct_on}) {select_columns},
+           CASE 
+               WHEN work_category IN ('Major', 'Major (PAA)') THEN 'Major'
+               WHEN work_category IN ('Immediate - emergency', 'Immediate - urgent') THEN 'Emergency'
+               WHEN work_category = 'Standard' THEN 'Standard'
+               WHEN work_category = 'Minor' THEN 'Minor'
+               ELSE 'Other'
+           END as normalized_work_category{geometry_sql}
+    FROM works
+    ORDER BY {order_by}
+    """
+    return query, params
+
+def prepare_table_sources(table_names: List[str], max_workers: Optional[int] = None) -> Iterator[TaskResult]:
+    """
+    Check and mirror month tables concurrently, yielding each one as it is ready
+
+    Each month is checked for freshness (and copied to the local parquet cache
+    if needed) on its own cursor, so slow months do not hold up the rest. Once
+    a month has been prepared, its fetch reads it without further round trips.
+    A month that fails is reported in its TaskResult and is read remotely
+    instead.
+
+    Args:
+        table_names: Month tables to prepare (e.g. "06_2025")
+        max_workers: Concurrency limit, defaults to the max_concurrency setting
+
+    Returns:
+        Iterator of TaskResult keyed by table name, in completion order
+    """
+    schema = get_required_setting("schema")
+    tasks = {
+        table_name: (lambda cursor, table_name=table_name: get_table_source(cursor, schema, table_name))
+        for table_name in table_names
+    }
+    # The pooled connection is held until every month has been prepared
+    with get_connection_pool().connection() as con:
+        yield from run_concurrently(tasks, con, max_workers)
+
+def fetch_month_frames(month_authorities: Dict[str, List[str]], view_profile: str = "table", max_workers: Optional[int] = None) -> Iterator[TaskResult]:
+    """
+    Fetch every work category of several authorities per month, one month per task
+
+    Each month is queried and its geometries decoded on its own cursor, so
+    months are fetched concurrently and a slow month does not hold up the rest.
+
+    Args:
+        month_authorities: Highway authorities to fetch for each month table
+        view_profile: Columns to return (see VIEW_PROFILES)
+        max_workers: Concurrency limit, defaults to the max_concurrency setting
+
+    Returns:
+        Iterator of TaskResult keyed by table name, in completion order. Each
+        value maps highway authority to a GeoDataFrame of its works, deduplicated
+        within the month and with normalized work category. Authorities without
+        works are left out.
+    """
+    schema = get_required_setting("schema")
+
+    def fetch(cursor: duckdb.DuckDBPyConnection, table_name: str, highway_authorities: List[str]) -> Dict[str, gpd.GeoDataFrame]:
+        table_source = get_table_source(cursor, schema, table_name)
+        query, params = build_batch_query(schema, highway_authorities, [table_name], None, {table_name: table_source}, view_profile, per_month=True)
+        with span("fetch.query", month=table_name):
+            df = fetch_arrow_frame(cursor.execute(query, params))
+        if df.empty:
+            return {}
+        geodf = convert_to_geodf(df)
+        return {
+            str(authority): group.reset_index(drop=True)
+            for authority, group in geodf.groupby('highway_authority', observed=True, sort=False)
+        }
+
+    tasks = {
+        table_name: (lambda cursor, table_name=table_name, authorities=authorities: fetch(cursor, table_name, authorities))
+        for table_name, authorities in month_authorities.items()
+    }
+    # The pooled connection is held until every month has been fetched
+    with get_connection_pool().connection() as con:
+        yield from run_concurrently(tasks, con, max_workers)
+
+def frame_keys(highway_authorities: List[str], table_names: List[str], view_profile: str) -> List[Tuple[str, str, str]]:
+    """
+    Frame cache keys of every (authority, month) pair of a selection
+    """
+    return [(authority, table_name, view_profile) for table_name in dict.fromkeys(table_names) for authority in dict.fromkeys(highway_authorities)]
+
+def fetch_frames(keys: List[Tuple[str, str, str]], view_profile: str = "table", max_workers: Optional[int] = None) -> Iterator[TaskResult]:
+    """
+    Fetch frame cache keys one month at a time, caching each month as it arrives
+
+    A month that fails is reported in its TaskResult and left out of the
+    cache, so the next fetch tries it again.
+
+    Args:
+        keys: (highway authority, month table, view profile) keys to fetch
+        view_profile: Columns to return (see VIEW_PROFILES)
+        max_workers: Concurrency limit, defaults to the max_concurrency setting
+
+    Returns:
+        Iterator of TaskResult keyed by table name, in completion order, whose
+        value maps each key of the month to its frame
+    """
+    cache = get_frame_cache()
+    month_authorities: Dict[str, List[str]] = {}
+    for authority, table_name, _ in keys:
+        month_authorities.setdefault(table_name, []).append(authority)
+
+    for task in fetch_month_frames(month_authorities, view_profile, max_workers):
+        if task.error is not None:
+            yield task
+            continue
+        frames = {}
+        for authority in month_authorities[task.key]:
+            key = (authority, task.key, view_profile)
+            # Authorities without works are cached empty, so they are not fetched again
+            frames[key] = task.value.get(authority, gpd.GeoDataFrame())
+            cache.put(key, frames[key])
+        yield task._replace(value=frames)
+
+def fetch_missing_frames(highway_authorities: List[str], table_names: List[str], view_profile: str = "table", max_workers: Optional[int] = None) -> Iterator[TaskResult]:
+    """
+    Fetch the (authority, month) pairs of a selection missing from the frame cache
+
+    Lets the caller update the UI as each month completes, after which
+    fetch_batch_data answers the selection from the cache.
+
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include (e.g. "06_2025")
+        view_profile: Columns to return (see VIEW_PROFILES)
+        max_workers: Concurrency limit, defaults to the max_concurrency setting
+
+    Returns:
+        Iterator of TaskResult keyed by table name, one per month with missing pairs
+    """
+    missing = get_frame_cache().missing(frame_keys(highway_authorities, table_names, view_profile))
+    yield from fetch_frames(missing, view_profile, max_workers)
+
+def select_works(frames: List[gpd.GeoDataFrame], table_names: List[str], selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Combine cached month frames into one selection
+
+    Rows are masked on normalized_work_category first, then permits that
+    appear in more than one month keep the record from the latest month,
+    matching the filtering and deduplication of build_batch_query.
+
+    Args:
+        frames: Cached frame of each authority and month, see fetch_frames
+        table_names: Month tables of the selection
+        selected_categories: Normalized work categories to include, all when empty
+
+    Returns:
+        New GeoDataFrame with one row per permit
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return gpd.GeoDataFrame()
+
+    df = concat_frames(frames)
+
+    categories = [category for category in selected_categories or [] if category in SELECTABLE_CATEGORIES]
+    if categories:
+        df = df[df['normalized_work_category'].isin(categories).to_numpy()]
+
+    # Latest month last, so it is the record kept for each permit
+    ordered_tables = sorted(set(table_names), key=month_table_sort_key)
+    month_rank = pd.Categorical(df['month_table'], categories=ordered_tables).codes
+    order = np.lexsort((month_rank, df['permit_reference_number'].to_numpy()))
+    df = df.iloc[order].drop_duplicates('permit_reference_number', keep='last')
+    return df.reset_index(drop=True)
+
+@single_flight
+def fetch_batch_data(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None, view_profile: str = "table") -> gpd.GeoDataFrame:
+    """
+    Fetch data for several highway authorities and month tables
+
+    Every work category of each (authority, month) is held once in the frame
+    cache, so changing the category selection is answered in memory. Only the
+    pairs missing from the cache are fetched, one concurrent query per month.
+    Concurrent calls for the same selection share one fetch.
+
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include (e.g. "06_2025")
+        selected_categories: List of normalized work categories to include
+        view_profile: Columns to return (see VIEW_PROFILES)
+
+    Returns:
+        GeoDataFrame with one row per permit, tagged with its month_table
     """
-    # Attempt connection and processing logic
     try:
-        con = connect_to_motherduck()
-        # Define table and schema
-        schema = st.secrets["schema"]
-        
-        # Build work category filter
-        category_filter = get_work_category_filter(selected_categories)
-        
-        # Execute query for specified highway authority with specific filters
-        query = f"""
-        SELECT DISTINCT ON (permit_reference_number) *,
-               CASE 
-                   WHEN work_category IN ('Major', 'Major (PAA)') THEN 'Major'
-                   WHEN work_category IN ('Immediate - emergency', 'Immediate - urgent') THEN 'Emergency'
-                   WHEN work_category = 'Standard' THEN 'Standard'
-                   WHEN work_category = 'Minor' THEN 'Minor'
-                   ELSE 'Other'
-               END as normalized_work_category
-        FROM {schema}."{table_name}"
-        WHERE highway_authority = ?
-        AND work_status_ref = 'completed'
-        AND event_type = 'WORK_STOP'
-        AND ({category_filter})
-        """
-        result = con.execute(query, [highway_authority])
-        df = result.fetchdf()
-        df = convert_to_geodf(df)
+        cache = get_frame_cache()
+        keys = frame_keys(highway_authorities, table_names, view_profile)
+
+        with span("fetch.frame_cache", entries=len(keys)) as record:
+            frames, missing = cache.get_many(keys)
+            record["cache"] = "hit" if not missing else "partial" if frames else "miss"
+
+        if missing:
+            for task in fetch_frames(missing, view_profile):
+                if task.error is not None:
+                    raise task.error
+                frames.update(task.value)
+
+        with span("fetch.select") as record:
+            df = select_works([frames[key] for key in keys], table_names, selected_categories)
+            record["rows"] = len(df)
+
         if df.empty:
-            logger.warning(f"The Dataframe is empty for {highway_authority} with the specified filters")
+            logger.warning(f"The Dataframe is empty for {len(highway_authorities)} authorities across {len(table_names)} months")
+            return gpd.GeoDataFrame()
+        logger.info(f"Selected {len(df)} permits for {len(highway_authorities)} authorities across {len(table_names)} months")
         return df
     except KeyError as ke:
-        error_msg = f"Missing key in st.secrets: {ke}"
+        error_msg = f"Missing setting (st.secrets or NWG_ environment variable): {ke}"
         logger.error(error_msg)
         raise ke
     except duckdb.Error as quack:
@@ -104,41 +517,3 @@ def fetch_data(highway_authority: str, table_name: str, selected_categories: Opt
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         raise e
-
-@st.cache_data
-def fetch_all_authorities_data(table_name: str, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
-    """
-    Fetch DataFrame containing data for all highway authorities and convert to GeoDataFrame
-    """
-    try:
-        con = connect_to_motherduck()
-        schema = st.secrets["schema"]
-        
-        # Build work category filter
-        category_filter = get_work_category_filter(selected_categories)
-        
-        query = f"""
-        SELECT DISTINCT ON (permit_reference_number) *,
-               CASE 
-                   WHEN work_category IN ('Major', 'Major (PAA)') THEN 'Major'
-                   WHEN work_category IN ('Immediate - emergency', 'Immediate - urgent') THEN 'Emergency'
-                   WHEN work_category = 'Standard' THEN 'Standard'
-                   WHEN work_category = 'Minor' THEN 'Minor'
-                   ELSE 'Other'
-               END as normalized_work_category
-        FROM {schema}."{table_name}"
-        WHERE highway_authority IN ('NEWCASTLE CITY COUNCIL', 'SUNDERLAND CITY COUNCIL', 'DARLINGTON BOROUGH COUNCIL', 'DURHAM COUNTY COUNCIL', 'SOUTH TYNESIDE COUNCIL', 'NORTH TYNESIDE COUNCIL')
-        AND work_status_ref = 'completed'
-        AND event_type = 'WORK_STOP'
-        AND ({category_filter})
-        """
-        result = con.execute(query)
-        df = result.fetchdf()
-        df = convert_to_geodf(df)
-        if df.empty:
-            logger.warning(f"The Dataframe is empty for all authorities")
-        return df
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        raise e
-
@@ -0,0 +1,158 @@
+import threading
+import numpy as np
+import pandas as pd
+import shapely
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from loguru import logger
+from .settings import get_setting
+
+# Default memory budget for cached permit frames
+DEFAULT_FRAME_CACHE_BYTES = 1024 ** 3
+
+# Rough size of one shapely geometry: the object header plus 16 bytes per 2D coordinate
+GEOMETRY_OVERHEAD_BYTES = 64
+COORDINATE_BYTES = 16
+
+def frame_nbytes(frame: pd.DataFrame) -> int:
+    """
+    Approximate memory held by a frame, including its shapely geometries
+
+    pandas only counts the pointers of a geometry column, so the coordinates
+    are estimated from shapely's coordinate counts.
+    """
+    nbytes = int(frame.memory_usage(deep=True, index=True).sum())
+    if "geometry" in frame.columns and len(frame):
+        geometries = np.asarray(frame["geometry"].values)
+        nbytes += len(geometries) * GEOMETRY_OVERHEAD_BYTES
+        nbytes += int(shapely.get_num_coordinates(geometries).sum()) * COORDINATE_BYTES
+    return nbytes
+
+def get_frame_cache_budget() -> int:
+    """
+    Byte budget of the frame cache, from the frame_cache_max_bytes setting
+    """
+    return int(get_setting("frame_cache_max_bytes", DEFAULT_FRAME_CACHE_BYTES))
+
+class FrameCache:
+    """
+    Thread-safe LRU cache of DataFrames bounded by their total size in bytes
+
+    The least recently used frames are evicted once the budget is exceeded.
+    A frame larger than the whole budget is not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[Hashable, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """
+        Cached frame for a key, or None on a miss
+        """
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, pd.DataFrame], list]:
+        """
+        Look up several keys
+
+        Returns:
+            Tuple of the frames found by key, and the keys that were missing
+        """
+        found, missing = {}, []
+        for key in keys:
+            frame = self.get(key)
+            if frame is None:
+                missing.append(key)
+            else:
+                found[key] = frame
+        return found, missing
+
+    def missing(self, keys: Iterable[Hashable]) -> list:
+        """
+        Keys not in the cache, without counting them as lookups
+        """
+        with self._lock:
+            return [key for key in keys if key not in self._frames]
+
+    def put(self, key: Hashable, frame: pd.DataFrame) -> None:
+        """
+        Store a frame, evicting the least recently used frames to stay within budget
+        """
+        nbytes = frame_nbytes(frame)
+        if nbytes > self.max_bytes:
+            logger.warning(f"Frame {key} ({nbytes / 1024 ** 2:.1f}MB) exceeds the frame cache budget, not caching it")
+            return
+
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._frames[key] = (frame, nbytes)
+            self.bytes += nbytes
+            logger.debug(f"Cached {key}: {len(frame)} rows, {nbytes / 1024 ** 2:.1f}MB")
+            while self.bytes > self.max_bytes:
+                evicted_key, (_, evicted_bytes) = self._frames.popitem(last=False)
+                self.bytes -= evicted_bytes
+                self.evictions += 1
+                logger.info(f"Evicted {evicted_key} ({evicted_bytes / 1024 ** 2:.1f}MB) from the frame cache")
+
+    def frame_sizes(self) -> pd.DataFrame:
+        """
+        Rows and approximate bytes of each cached frame, most recently used last
+        """
+        with self._lock:
+            return pd.DataFrame(
+                [{"key": key, "rows": len(frame), "bytes": nbytes} for key, (frame, nbytes) in self._frames.items()],
+                columns=["key", "rows", "bytes"],
+            )
+
+    def clear(self) -> None:
+        """
+        Drop every cached frame, keeping the metrics
+        """
+        with self._lock:
+            self._frames.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Current size and hit/miss metrics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._frames),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+_frame_cache: Optional[FrameCache] = None
+_frame_cache_lock = threading.Lock()
+
+def get_frame_cache() -> FrameCache:
+    """
+    Process-wide frame cache, shared by every session
+    """
+    global _frame_cache
+    with _frame_cache_lock:
+        if _frame_cache is None:
+            _frame_cache = FrameCache(get_frame_cache_budget())
+        return _frame_cache
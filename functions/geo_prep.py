@@ -1,40 +1,75 @@
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import LineString, MultiLineString, Point, MultiPoint
-from typing import Union, List, cast
+import numpy as np
+import shapely
+from functools import lru_cache
+from pyproj import Transformer
+from .tracing import span
+
+# Raw geometry column of the source tables: WKT in EPSG:27700, possibly with Z
+WKT_COLUMN = "works_location_coordinates"
+
+# Column holding server-decoded geometries: 2D, EPSG:4326, WKB
+GEOMETRY_WKB_COLUMN = "geometry_wkb"
+
+# DuckDB spatial expression decoding the raw WKT column into a 2D EPSG:4326 geometry
+GEOMETRY_SQL = f"""ST_Transform(
+               ST_Force2D(ST_GeomFromText({WKT_COLUMN})),
+               'EPSG:27700', 'EPSG:4326', always_xy := true
+           )"""
+
+# DuckDB spatial expression producing GEOMETRY_WKB_COLUMN from the raw WKT column
+GEOMETRY_WKB_SQL = f"ST_AsWKB({GEOMETRY_SQL}) as {GEOMETRY_WKB_COLUMN}"
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs: str, target_crs: str) -> Transformer:
+    """
+    Return a cached pyproj transformer using x/y (lng/lat) axis order
+    """
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+def decode_wkt_geometries(wkt: pd.Series, source_crs: str = "EPSG:27700", target_crs: str = "EPSG:4326") -> np.ndarray:
+    """
+    Python fallback for frames without server-decoded WKB
+
+    Parses WKT, drops Z coordinates and reprojects, all as vectorised shapely operations
+    """
+    geometries = shapely.force_2d(np.asarray(gpd.GeoSeries.from_wkt(wkt).values))
+    transformer = get_transformer(source_crs, target_crs)
+
+    def reproject(coords: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geometries, reproject)
 
 def convert_to_geodf(df: pd.DataFrame) -> gpd.GeoDataFrame:
     """
     Takes in a pandas dataframe and returns a geodataframe
     Ensure that the crs is set to EPSG:4326 and removes Z coordinates if present
+
+    Uses the WKB column produced by GEOMETRY_WKB_SQL when the query returned one,
+    otherwise decodes the works_location_coordinates WKT in Python. The WKT
+    column is dropped once decoded, as the geometry holds the same shape.
     """
     # Check that DataFrame is not empty
     if df is None or df.empty:
         raise ValueError("Input DataFrame is None or empty")
     else:
-        # Convert WKT to geometry and remove the Z coordinates if present
-        def remove_z(geom: Union[LineString, MultiLineString, Point, MultiPoint]) -> Union[LineString, MultiLineString, Point, MultiPoint]:
-            if isinstance(geom, LineString):
-                return LineString([(x, y) for x, y, *_ in geom.coords])
-            elif isinstance(geom, MultiLineString):
-                lines = [remove_z(line) for line in geom.geoms]
-                return MultiLineString(cast(List[LineString], lines))
-            elif isinstance(geom, Point):
-                x, y, *_ = geom.coords[0]
-                return Point(x, y)
-            elif isinstance(geom, MultiPoint):
-                points = [remove_z(point) for point in geom.geoms]
-                return MultiPoint(cast(List[Point], points))
-            return geom
-
-        # Isolate geometry column and apply the Z coordinate removal
-        df['geometry'] = gpd.GeoSeries.from_wkt(df['works_location_coordinates']).apply(remove_z)
-
-        # Create GeoDataFrame and ensure correct crs
-        geodf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:27700") # type: ignore
-
-        # Convert to EPSG:4326
-        geodf = geodf.to_crs(epsg=4326)
+        with span("geo.decode", rows=len(df)) as record:
+            if GEOMETRY_WKB_COLUMN in df.columns:
+                # Geometry is already 2D and in EPSG:4326
+                record["format"] = "wkb"
+                wkb = df[GEOMETRY_WKB_COLUMN].map(bytes, na_action='ignore')
+                df = df.drop(columns=[GEOMETRY_WKB_COLUMN])
+                df['geometry'] = gpd.GeoSeries.from_wkb(wkb)
+            else:
+                record["format"] = "wkt"
+                df['geometry'] = decode_wkt_geometries(df[WKT_COLUMN])
+            df = df.drop(columns=[WKT_COLUMN], errors='ignore')
+
+        # Create GeoDataFrame in EPSG:4326
+        geodf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326") # type: ignore
 
         # Assert that data is a GeoDataFrame and that CRS is correct
         assert isinstance(geodf, gpd.GeoDataFrame)
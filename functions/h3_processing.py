@@ -2,11 +2,31 @@ import duckdb
 import streamlit as st
 import geopandas as gpd
 import pandas as pd
-from typing import Optional, List
+import numpy as np
+import shapely
+from typing import Dict, Optional, List
 
-from .fetch_data import fetch_data, fetch_all_authorities_data
+from .connection_pool import get_connection_pool
+from .duckdb_engine import local_cursor
+from .h3_state import MERGE_STATE_AGGREGATES, PERMIT_ID_SQL, add_state_columns, decode_activity_mask, decode_category_mask
+from .fetch_data import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, categorize_columns, fetch_data, fetch_all_authorities_data, fetch_batch_data, build_batch_query, fetch_arrow_frame
+from .geo_prep import convert_to_geodf
+from .hex_boundaries import attach_boundaries
+from .line_coverage import line_coverage_samples
+from .parquet_cache import get_table_sources
+from .hex_summary import read_summary_pyramid
+from .settings import get_required_setting
+from .single_flight import single_flight
+from .tracing import span, traced
 from loguru import logger
 
+# Label columns of pyramid rows, held as categoricals
+PYRAMID_LABEL_COLUMNS = ["highway_authority", "month_table", "work_category"]
+
+# Resolutions held in an H3 pyramid, finest first
+PYRAMID_FINEST_RESOLUTION = 11
+PYRAMID_COARSEST_RESOLUTION = 6
+
 
 @st.cache_data
 def get_h3_resolution_info():
@@ -22,238 +42,630 @@ def get_h3_resolution_info():
         11: {"avg_edge_km": 0.025, "description": "Street (~25m) - Maximum detail"}
     }
 
-@st.cache_data
-def create_h3_hex_grid(highway_authority: str, table_name: str, resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+def build_h3_aggregation_query(source: str, resolution: int) -> str:
     """
-    Create H3 hexagonal grid from street works data using Python processing
-    
+    Build the H3 aggregation query over a relation of works coordinates
+
     Args:
-        highway_authority: The highway authority to filter data for
-        table_name: The table name to query
+        source: Table or CTE name exposing permit_reference_number, activity_type,
+            work_category, latitude and longitude columns
         resolution: H3 resolution level (0-15, higher = smaller hexes)
-        selected_categories: List of normalized work categories to include
-    
+
+    Returns:
+        Query string returning one row per H3 cell with its integer id in cell
+    """
+    return f"""
+    WITH h3_cells AS (
+        SELECT 
+            h3_latlng_to_cell_string(latitude, longitude, {int(resolution)}) as h3_cell,
+            permit_reference_number,
+            activity_type,
+            work_category,
+            latitude,
+            longitude
+        FROM {source}
+        WHERE latitude IS NOT NULL 
+        AND longitude IS NOT NULL
+        AND latitude BETWEEN -90 AND 90
+        AND longitude BETWEEN -180 AND 180
+    ),
+    aggregated AS (
+        SELECT 
+            h3_cell,
+            COUNT(*) as work_count,
+            COUNT(DISTINCT permit_reference_number) as unique_permits,
+            LIST(DISTINCT activity_type) as activity_types,
+            LIST(DISTINCT work_category) as work_categories,
+            AVG(latitude) as center_lat,
+            AVG(longitude) as center_lng
+        FROM h3_cells
+        GROUP BY h3_cell
+    )
+    SELECT 
+        h3_cell,
+        work_count,
+        unique_permits,
+        activity_types,
+        work_categories,
+        center_lat,
+        center_lng,
+        h3_string_to_h3(h3_cell) as cell
+    FROM aggregated
+    ORDER BY work_count DESC
+    """
+
+def build_h3_coverage_query(source: str, resolution: int) -> str:
+    """
+    Build the H3 aggregation query over line coverage samples
+
+    Samples are indexed in bulk and collapsed to one row per (permit, cell)
+    before aggregating, so a work is counted once in every cell it passes
+    through however many samples fall there.
+
+    Args:
+        source: Table or CTE name with the columns of line_coverage_samples
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+
+    Returns:
+        Query string returning one row per H3 cell with its integer id in cell,
+        with weighted_work_count summing each work's share of its length
+    """
+    return f"""
+    WITH samples AS (
+        SELECT 
+            h3_latlng_to_cell_string(latitude, longitude, {int(resolution)}) as h3_cell,
+            permit_reference_number,
+            activity_type,
+            work_category,
+            weight,
+            latitude,
+            longitude
+        FROM {source}
+        WHERE latitude IS NOT NULL 
+        AND longitude IS NOT NULL
+        AND latitude BETWEEN -90 AND 90
+        AND longitude BETWEEN -180 AND 180
+    ),
+    work_cells AS (
+        SELECT 
+            h3_cell,
+            permit_reference_number,
+            ANY_VALUE(activity_type) as activity_type,
+            ANY_VALUE(work_category) as work_category,
+            SUM(weight) as weight,
+            AVG(latitude) as latitude,
+            AVG(longitude) as longitude
+        FROM samples
+        GROUP BY h3_cell, permit_reference_number
+    ),
+    aggregated AS (
+        SELECT 
+            h3_cell,
+            COUNT(*) as work_count,
+            COUNT(DISTINCT permit_reference_number) as unique_permits,
+            LIST(DISTINCT activity_type) as activity_types,
+            LIST(DISTINCT work_category) as work_categories,
+            SUM(weight) as weighted_work_count,
+            AVG(latitude) as center_lat,
+            AVG(longitude) as center_lng
+        FROM work_cells
+        GROUP BY h3_cell
+    )
+    SELECT 
+        h3_cell,
+        work_count,
+        unique_permits,
+        activity_types,
+        work_categories,
+        weighted_work_count,
+        center_lat,
+        center_lng,
+        h3_string_to_h3(h3_cell) as cell
+    FROM aggregated
+    ORDER BY work_count DESC
+    """
+
+@traced("h3.centroids")
+def extract_centroid_coords(geodf_points: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Extract one centroid coordinate per street work using vectorised shapely operations
+
+    Lines are reduced to their centroid and points are used directly. Missing and
+    empty geometries are dropped.
+
+    Args:
+        geodf_points: GeoDataFrame of street works in EPSG:4326
+
+    Returns:
+        DataFrame with permit_reference_number, highway_authority, month_table,
+        activity_type, work_category, latitude and longitude columns backed by
+        NumPy arrays
+    """
+    geometries = np.asarray(geodf_points.geometry.values)
+    valid = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+
+    centroids = shapely.centroid(geometries[valid])
+
+    def column_values(column: str, default: Optional[str] = None) -> np.ndarray:
+        if column in geodf_points.columns:
+            return geodf_points[column].to_numpy()[valid]
+        return np.full(int(valid.sum()), default, dtype=object)
+
+    return pd.DataFrame({
+        'permit_reference_number': column_values('permit_reference_number'),
+        'highway_authority': column_values('highway_authority'),
+        'month_table': column_values('month_table'),
+        'activity_type': column_values('activity_type'),
+        'work_category': column_values('normalized_work_category', 'Unknown'),
+        'latitude': shapely.get_y(centroids),
+        'longitude': shapely.get_x(centroids)
+    })
+
+@traced("h3.aggregate")
+def aggregate_points_to_h3(geodf_points: gpd.GeoDataFrame, resolution: int, label: str) -> gpd.GeoDataFrame:
+    """
+    Aggregate street works geometries into H3 hexagons
+
+    Args:
+        geodf_points: GeoDataFrame of street works in EPSG:4326
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        label: Description of the data used in log messages
+
     Returns:
         GeoDataFrame with H3 hexagons and aggregated data
     """
-    try:
-        geodf_points = fetch_data(highway_authority, table_name, selected_categories)
-        
-        if geodf_points.empty:
-            logger.warning(f"No point data found for {highway_authority}")
-            return gpd.GeoDataFrame()
-        
-        # Extract coordinates from geometries in Python
-        coords_data = []
-        for _, row in geodf_points.iterrows():
-            geom = row.geometry
-            if geom is not None and not geom.is_empty:
-                if hasattr(geom, 'centroid'):
-                    # For lines, use centroid
-                    point = geom.centroid
-                else:
-                    # For points, use directly
-                    point = geom
-                
-                lat, lon = point.y, point.x
-                coords_data.append({
-                    'permit_reference_number': row.get('permit_reference_number'),
-                    'activity_type': row.get('activity_type'),
-                    'work_category': row.get('normalized_work_category', 'Unknown'),
-                    'latitude': lat,
-                    'longitude': lon
-                })
-        
-        if not coords_data:
-            logger.warning(f"No valid coordinates extracted for {highway_authority}")
-            return gpd.GeoDataFrame()
-        
-        # Create DataFrame with coordinates
-        coords_df = pd.DataFrame(coords_data)
-        
-        # Create a new DuckDB connection for H3 processing
-        con = duckdb.connect(':memory:')
-        
-        # Install and load H3 extension
-        con.execute("INSTALL h3 FROM community;")
-        con.execute("LOAD h3;")
-        
-        # Register the pandas DataFrame as a table
+    # Extract centroid coordinates for all geometries at once
+    coords_df = extract_centroid_coords(geodf_points)
+    
+    if coords_df.empty:
+        logger.warning(f"No valid coordinates extracted for {label}")
+        return gpd.GeoDataFrame()
+    
+    # Aggregate on the shared local engine, which already has H3 loaded
+    with local_cursor() as con:
         con.register('coords_data', coords_df)
-        
-        # Create H3 cells and aggregate using the correct function names
-        h3_query = f"""
-        WITH h3_cells AS (
+        h3_query = build_h3_aggregation_query('coords_data', resolution)
+        df = con.execute(h3_query).fetchdf()
+    
+    if df.empty:
+        logger.warning(f"No H3 data generated for {label}")
+        return gpd.GeoDataFrame()
+    
+    # Join the hexagon boundaries from the boundary store
+    geodf = attach_boundaries(df)
+    
+    logger.info(f"Generated {len(geodf)} H3 hexagons for {label}")
+    return geodf
+
+@traced("h3.aggregate_lines")
+def aggregate_lines_to_h3(geodf_points: gpd.GeoDataFrame, resolution: int, label: str) -> gpd.GeoDataFrame:
+    """
+    Aggregate street works into every H3 hexagon their geometry passes through
+
+    Args:
+        geodf_points: GeoDataFrame of street works in EPSG:4326
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        label: Description of the data used in log messages
+
+    Returns:
+        GeoDataFrame with the columns of aggregate_points_to_h3 plus
+        weighted_work_count
+    """
+    samples = line_coverage_samples(geodf_points, resolution)
+    
+    if samples.empty:
+        logger.warning(f"No valid coordinates extracted for {label}")
+        return gpd.GeoDataFrame()
+    
+    with local_cursor() as con:
+        con.register('line_samples', samples)
+        df = con.execute(build_h3_coverage_query('line_samples', resolution)).fetchdf()
+    
+    if df.empty:
+        logger.warning(f"No H3 data generated for {label}")
+        return gpd.GeoDataFrame()
+    
+    geodf = attach_boundaries(df)
+    
+    logger.info(f"Generated {len(geodf)} H3 hexagons from {len(samples)} line coverage samples for {label}")
+    return geodf
+
+@traced("h3.pyramid")
+def build_h3_pyramid(coords_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate works coordinates into H3 cells at every pyramid resolution
+
+    Cells are computed once at the finest resolution and the coarser levels are
+    rolled up from that aggregate table with h3_cell_to_parent. Rows are kept
+    per highway authority, month table and work category so any selection can
+    be answered from the pyramid. Every row carries mergeable state (see
+    h3_state), so rows can be combined with exact distinct permit counts.
+
+    Args:
+        coords_df: Output of extract_centroid_coords
+
+    Returns:
+        DataFrame with resolution, cell (H3 index), highway_authority, month_table,
+        work_category, work_count, permit_ids, activity_mask, category_mask,
+        lat_sum and lng_sum
+    """
+    with local_cursor() as con:
+        con.register('coords_data', add_state_columns(coords_df))
+        pyramid_query = f"""
+        WITH finest AS (
             SELECT 
-                h3_latlng_to_cell_string(latitude, longitude, {resolution}) as h3_cell,
-                permit_reference_number,
-                activity_type,
+                h3_latlng_to_cell(latitude, longitude, {PYRAMID_FINEST_RESOLUTION}) as cell,
+                highway_authority,
+                month_table,
                 work_category,
-                latitude,
-                longitude
+                COUNT(*) as work_count,
+                LIST_SORT(LIST(DISTINCT {PERMIT_ID_SQL})) as permit_ids,
+                BIT_OR(activity_bit) as activity_mask,
+                BIT_OR(category_bit) as category_mask,
+                SUM(latitude) as lat_sum,
+                SUM(longitude) as lng_sum
             FROM coords_data
             WHERE latitude IS NOT NULL 
             AND longitude IS NOT NULL
             AND latitude BETWEEN -90 AND 90
             AND longitude BETWEEN -180 AND 180
-        ),
-        aggregated AS (
-            SELECT 
-                h3_cell,
-                COUNT(*) as work_count,
-                COUNT(DISTINCT permit_reference_number) as unique_permits,
-                LIST(DISTINCT activity_type) as activity_types,
-                LIST(DISTINCT work_category) as work_categories,
-                AVG(latitude) as center_lat,
-                AVG(longitude) as center_lng
-            FROM h3_cells
-            GROUP BY h3_cell
+            GROUP BY ALL
         )
+        SELECT {PYRAMID_FINEST_RESOLUTION} as resolution, * FROM finest
+        UNION ALL BY NAME
         SELECT 
-            h3_cell,
-            work_count,
-            unique_permits,
-            activity_types,
-            work_categories,
-            center_lat,
-            center_lng,
-            h3_cell_to_boundary_wkt(h3_string_to_h3(h3_cell)) as hex_geometry
-        FROM aggregated
+            parent_resolution::INTEGER as resolution,
+            h3_cell_to_parent(cell, parent_resolution::INTEGER) as cell,
+            highway_authority,
+            month_table,
+            work_category,{MERGE_STATE_AGGREGATES}
+        -- RANGE yields BIGINT, and the h3 extension takes an INTEGER resolution
+        FROM finest, RANGE({PYRAMID_COARSEST_RESOLUTION}, {PYRAMID_FINEST_RESOLUTION}) levels(parent_resolution)
+        GROUP BY ALL
+        """
+        return categorize_columns(con.execute(pyramid_query).fetchdf(), PYRAMID_LABEL_COLUMNS)
+
+@traced("h3.merge")
+def merge_h3_partials(partials: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge partial hexagon states that share a cell
+
+    Partials may come from different authorities, months, categories or
+    separately built grids. Counts are summed, permit id arrays are unioned so
+    unique_permits stays exact, and the activity and category bitsets are OR-ed.
+
+    Args:
+        partials: Rows with cell, work_count, permit_ids, activity_mask,
+            category_mask, lat_sum and lng_sum columns
+
+    Returns:
+        DataFrame with one row per cell, its merged state and the derived
+        unique_permits, activity_types, work_categories, center_lat and center_lng
+    """
+    with local_cursor() as con:
+        con.register('partials', partials)
+        merge_query = f"""
+        SELECT 
+            cell,{MERGE_STATE_AGGREGATES}
+        FROM partials
+        GROUP BY cell
         ORDER BY work_count DESC
         """
+        df = con.execute(merge_query).fetchdf()
+    
+    df['unique_permits'] = df['permit_ids'].map(len).astype('int64')
+    df['activity_types'] = decode_activity_mask(df['activity_mask'])
+    df['work_categories'] = decode_category_mask(df['category_mask'])
+    df['center_lat'] = df['lat_sum'] / df['work_count']
+    df['center_lng'] = df['lng_sum'] / df['work_count']
+    return df
+
+@traced("h3.grid_from_pyramid")
+def h3_grid_from_pyramid(pyramid: pd.DataFrame, resolution: int, label: str) -> gpd.GeoDataFrame:
+    """
+    Look up one resolution of an H3 pyramid as a hexagon grid
+
+    Args:
+        pyramid: Output of build_h3_pyramid
+        resolution: H3 resolution level within the pyramid
+        label: Description of the data used in log messages
+
+    Returns:
+        GeoDataFrame with H3 hexagons and aggregated data, with the same columns
+        as aggregate_points_to_h3 plus the mergeable state columns
+    """
+    level = pyramid[pyramid['resolution'] == resolution]
+    
+    if level.empty:
+        logger.warning(f"No H3 data generated for {label}")
+        return gpd.GeoDataFrame()
+    
+    df = merge_h3_partials(level)
+    
+    with local_cursor() as con:
+        con.register('cells', df[['cell']])
+        df['h3_cell'] = con.execute("SELECT h3_h3_to_string(cell) as h3_cell FROM cells").fetchdf()['h3_cell'].to_numpy()
+    
+    # Join the hexagon boundaries from the boundary store
+    geodf = attach_boundaries(df)
+    
+    logger.info(f"Looked up {len(geodf)} H3 hexagons at resolution {resolution} for {label}")
+    return geodf
+
+def fetch_h3_pyramid(con: duckdb.DuckDBPyConnection, schema: str, highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None, table_sources: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Fetch a selection on the given connection and build its H3 pyramid, without caching
+
+    For jobs that run outside Streamlit and manage their own connections.
+    table_sources are resolved with the parquet cache when not given.
+    """
+    if table_sources is None:
+        table_sources = get_table_sources(con, schema, table_names)
+    query, params = build_batch_query(schema, highway_authorities, table_names, selected_categories, table_sources, view_profile="h3")
+    with span("fetch.query"):
+        result = con.execute(query, params)
+    df = fetch_arrow_frame(result)
+    if df.empty:
+        return pd.DataFrame()
+    
+    coords_df = extract_centroid_coords(convert_to_geodf(df))
+    if coords_df.empty:
+        return pd.DataFrame()
+    return build_h3_pyramid(coords_df)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_pyramid_batch(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Build the H3 pyramid for several authorities and months from one batched fetch
+    
+    The pyramid does not depend on the resolution, so it is computed once per
+    selection and every resolution is then a lookup. When every selected
+    month has been ingested into the hex summary, the precomputed rows are
+    read instead.
+    """
+    pyramid = read_summary_pyramid(highway_authorities, table_names, selected_categories)
+    if pyramid is not None:
+        return pyramid
+    
+    geodf_points = fetch_batch_data(highway_authorities, table_names, selected_categories, view_profile="h3")
+    
+    if geodf_points.empty:
+        return pd.DataFrame()
+    
+    coords_df = extract_centroid_coords(geodf_points)
+    if coords_df.empty:
+        return pd.DataFrame()
+    
+    pyramid = build_h3_pyramid(coords_df)
+    logger.info(f"Built H3 pyramid with {len(pyramid)} rows for {len(highway_authorities)} authorities across {len(table_names)} months")
+    return pyramid
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_cell_values_batch(highway_authorities: List[str], table_names: List[str], resolution: int = 9, selected_categories: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Look up H3 cell ids and their aggregates without hexagon boundaries
+    
+    For renderers that draw hexagons from their cell ids, so no boundary
+    geometry has to be generated or shipped.
+    
+    Returns:
+        DataFrame with h3_cell, work_count, unique_permits, activity_types,
+        work_categories, center_lat and center_lng
+    """
+    label = f"{len(highway_authorities)} authorities across {len(table_names)} months"
+    pyramid = create_h3_pyramid_batch(highway_authorities, table_names, selected_categories)
+    
+    if pyramid.empty or resolution not in set(pyramid['resolution']):
+        logger.warning(f"No H3 data generated for {label} at resolution {resolution}")
+        return pd.DataFrame()
+    
+    df = merge_h3_partials(pyramid[pyramid['resolution'] == resolution])
+    
+    with local_cursor() as con:
+        con.register('cells', df[['cell']])
+        df['h3_cell'] = con.execute("SELECT h3_h3_to_string(cell) as h3_cell FROM cells").fetchdf()['h3_cell'].to_numpy()
+    
+    return df[['h3_cell', 'work_count', 'unique_permits', 'activity_types', 'work_categories', 'center_lat', 'center_lng']]
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_hex_grid(highway_authority: str, table_name: str, resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Create H3 hexagonal grid from street works data using Python processing
+    
+    Args:
+        highway_authority: The highway authority to filter data for
+        table_name: The table name to query
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        selected_categories: List of normalized work categories to include
+    
+    Returns:
+        GeoDataFrame with H3 hexagons and aggregated data
+    """
+    try:
+        geodf_points = fetch_data(highway_authority, table_name, selected_categories, view_profile="h3")
         
-        result = con.execute(h3_query)
-        df = result.fetchdf()
-        
-        # Close the connection
-        con.close()
-        
-        if df.empty:
-            logger.warning(f"No H3 data generated for {highway_authority}")
+        if geodf_points.empty:
+            logger.warning(f"No point data found for {highway_authority}")
             return gpd.GeoDataFrame()
         
-        # Convert WKT hex boundaries to geometry
-        df['geometry'] = gpd.GeoSeries.from_wkt(df['hex_geometry'])
-        
-        # Create GeoDataFrame
-        geodf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326") # type: ignore
-        
-        logger.info(f"Generated {len(geodf)} H3 hexagons for {highway_authority}")
-        return geodf
+        return aggregate_points_to_h3(geodf_points, resolution, highway_authority)
         
     except Exception as e:
         logger.error(f"Error creating H3 hex grid: {e}")
         raise e
 
-@st.cache_data
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
 def create_h3_hex_grid_all_authorities(table_name: str, resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
     """
     Create H3 hexagonal grid from all highway authorities data
     """
     try:
-        geodf_points = fetch_all_authorities_data(table_name, selected_categories)
+        geodf_points = fetch_all_authorities_data(table_name, selected_categories, view_profile="h3")
         
         if geodf_points.empty:
             return gpd.GeoDataFrame()
         
-        # Extract coordinates from geometries in Python
-        coords_data = []
-        for _, row in geodf_points.iterrows():
-            geom = row.geometry
-            if geom is not None and not geom.is_empty:
-                if hasattr(geom, 'centroid'):
-                    # For lines, use centroid
-                    point = geom.centroid
-                else:
-                    # For points, use directly
-                    point = geom
-                
-                lat, lon = point.y, point.x
-                coords_data.append({
-                    'permit_reference_number': row.get('permit_reference_number'),
-                    'activity_type': row.get('activity_type'),
-                    'work_category': row.get('normalized_work_category', 'Unknown'),
-                    'latitude': lat,
-                    'longitude': lon
-                })
+        return aggregate_points_to_h3(geodf_points, resolution, "all authorities")
+        
+    except Exception as e:
+        logger.error(f"Error creating H3 hex grid for all authorities: {e}")
+        raise e
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_hex_grid_batch(highway_authorities: List[str], table_names: List[str], resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Create H3 hexagonal grid for several authorities and months from one batched fetch
+    
+    Resolutions covered by the H3 pyramid are looked up from the cached pyramid,
+    so changing resolution does not refetch or re-aggregate the works.
+    
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        selected_categories: List of normalized work categories to include
+    
+    Returns:
+        GeoDataFrame with H3 hexagons and aggregated data
+    """
+    try:
+        label = f"{len(highway_authorities)} authorities across {len(table_names)} months"
+        
+        if not PYRAMID_COARSEST_RESOLUTION <= resolution <= PYRAMID_FINEST_RESOLUTION:
+            # Outside the pyramid, aggregate directly at the requested resolution
+            geodf_points = fetch_batch_data(highway_authorities, table_names, selected_categories, view_profile="h3")
+            if geodf_points.empty:
+                logger.warning(f"No point data found for {label}")
+                return gpd.GeoDataFrame()
+            return aggregate_points_to_h3(geodf_points, resolution, label)
         
-        if not coords_data:
-            logger.warning(f"No valid coordinates extracted for all authorities")
+        pyramid = create_h3_pyramid_batch(highway_authorities, table_names, selected_categories)
+        
+        if pyramid.empty:
+            logger.warning(f"No point data found for {label}")
             return gpd.GeoDataFrame()
         
-        # Create DataFrame with coordinates
-        coords_df = pd.DataFrame(coords_data)
+        return h3_grid_from_pyramid(pyramid, resolution, label)
         
-        # Create a new DuckDB connection for H3 processing
-        con = duckdb.connect(':memory:')
+    except Exception as e:
+        logger.error(f"Error creating batched H3 hex grid: {e}")
+        raise e
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_line_grid_batch(highway_authorities: List[str], table_names: List[str], resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Create H3 hexagonal grid counting each work in every hexagon it passes through
+    
+    Unlike create_h3_hex_grid_batch, lines are not reduced to their centroid,
+    so a long closure shows along its whole route. Aggregated directly at the
+    requested resolution.
+    
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        selected_categories: List of normalized work categories to include
+    
+    Returns:
+        GeoDataFrame with H3 hexagons, aggregated data and weighted_work_count
+    """
+    try:
+        label = f"{len(highway_authorities)} authorities across {len(table_names)} months"
+        geodf_points = fetch_batch_data(highway_authorities, table_names, selected_categories, view_profile="h3")
         
-        # Install and load H3 extension
-        con.execute("INSTALL h3 FROM community;")
-        con.execute("LOAD h3;")
+        if geodf_points.empty:
+            logger.warning(f"No point data found for {label}")
+            return gpd.GeoDataFrame()
         
-        # Register the pandas DataFrame as a table
-        con.register('coords_data', coords_df)
+        return aggregate_lines_to_h3(geodf_points, resolution, label)
+        
+    except Exception as e:
+        logger.error(f"Error creating line coverage H3 hex grid: {e}")
+        raise e
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+@traced("h3.remote")
+def create_h3_hex_grid_remote(highway_authorities: List[str], table_names: List[str], resolution: int = 9, selected_categories: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    Create H3 hexagonal grid with the aggregation pushed down into MotherDuck
+    
+    Centroids, the EPSG:27700 to EPSG:4326 transform and the H3 cell assignment
+    all run remotely using the spatial and h3 extensions, so only the aggregated
+    hexagon rows are returned.
+    
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include
+        resolution: H3 resolution level (0-15, higher = smaller hexes)
+        selected_categories: List of normalized work categories to include
+    
+    Returns:
+        GeoDataFrame with H3 hexagons and aggregated data
+    """
+    label = f"{len(highway_authorities)} authorities across {len(table_names)} months"
+    try:
+        schema = get_required_setting("schema")
+        
+        permits_query, params = build_batch_query(schema, highway_authorities, table_names, selected_categories, view_profile="remote_h3")
+        aggregation_query = build_h3_aggregation_query('coords_data', resolution)
         
-        # Create H3 cells and aggregate using the correct function names
-        h3_query = f"""
-        WITH h3_cells AS (
+        # Compute the centroid in EPSG:27700, then transform it to lat/lng
+        query = f"""
+        WITH permits AS (
+            {permits_query}
+        ),
+        centroids AS (
             SELECT 
-                h3_latlng_to_cell_string(latitude, longitude, {resolution}) as h3_cell,
                 permit_reference_number,
                 activity_type,
-                work_category,
-                latitude,
-                longitude
-            FROM coords_data
-            WHERE latitude IS NOT NULL 
-            AND longitude IS NOT NULL
-            AND latitude BETWEEN -90 AND 90
-            AND longitude BETWEEN -180 AND 180
+                normalized_work_category as work_category,
+                ST_Transform(
+                    ST_Centroid(ST_Force2D(ST_GeomFromText(works_location_coordinates))),
+                    'EPSG:27700', 'EPSG:4326', always_xy := true
+                ) as point
+            FROM permits
+            WHERE works_location_coordinates IS NOT NULL
         ),
-        aggregated AS (
+        coords_data AS (
             SELECT 
-                h3_cell,
-                COUNT(*) as work_count,
-                COUNT(DISTINCT permit_reference_number) as unique_permits,
-                LIST(DISTINCT activity_type) as activity_types,
-                LIST(DISTINCT work_category) as work_categories,
-                AVG(latitude) as center_lat,
-                AVG(longitude) as center_lng
-            FROM h3_cells
-            GROUP BY h3_cell
+                permit_reference_number,
+                activity_type,
+                work_category,
+                ST_Y(point) as latitude,
+                ST_X(point) as longitude
+            FROM centroids
+            WHERE NOT ST_IsEmpty(point)
         )
-        SELECT 
-            h3_cell,
-            work_count,
-            unique_permits,
-            activity_types,
-            work_categories,
-            center_lat,
-            center_lng,
-            h3_cell_to_boundary_wkt(h3_string_to_h3(h3_cell)) as hex_geometry
-        FROM aggregated
+        SELECT * FROM ({aggregation_query})
         ORDER BY work_count DESC
         """
         
-        result = con.execute(h3_query)
-        df = result.fetchdf()
-        
-        # Close the connection
-        con.close()
+        # Pooled connections load the spatial and h3 extensions when they are opened
+        df = get_connection_pool().run(lambda con: con.execute(query, params).fetchdf())
         
         if df.empty:
-            logger.warning(f"No H3 data generated for all authorities")
+            logger.warning(f"No H3 data generated for {label}")
             return gpd.GeoDataFrame()
         
-        # Convert WKT hex boundaries to geometry
-        df['geometry'] = gpd.GeoSeries.from_wkt(df['hex_geometry'])
+        # Only cell ids come back from MotherDuck, boundaries are joined locally
+        geodf = attach_boundaries(df)
         
-        # Create GeoDataFrame
-        geodf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326") # type: ignore
-        
-        logger.info(f"Generated {len(geodf)} H3 hexagons for all authorities")
+        logger.info(f"Generated {len(geodf)} H3 hexagons server-side for {label}")
         return geodf
         
+    except KeyError as ke:
+        logger.error(f"Missing setting (st.secrets or NWG_ environment variable): {ke}")
+        raise ke
+    except duckdb.Error as quack:
+        logger.error(f"A duckdb error occurred: {quack}")
+        raise quack
     except Exception as e:
-        logger.error(f"Error creating H3 hex grid for all authorities: {e}")
-        raise e
\ No newline at end of file
+        logger.error(f"Error creating server-side H3 hex grid: {e}")
+        raise e
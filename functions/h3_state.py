@@ -0,0 +1,133 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# Bit per normalized work category
+CATEGORY_BITS = {
+    "Major": 1 << 0,
+    "Standard": 1 << 1,
+    "Emergency": 1 << 2,
+    "Minor": 1 << 3,
+    "Other": 1 << 4,
+}
+
+# Activity types are given codes as they are first seen; once the bitset is
+# full, further types share the overflow bit
+MAX_ACTIVITY_CODES = 62
+OVERFLOW_ACTIVITY_NAME = "Other activity"
+
+_activity_codes: Dict[str, int] = {}
+_activity_lock = threading.Lock()
+
+# Permit ids are the first 64 bits of the MD5 of the permit reference, so the
+# same permit gets the same id in every DuckDB version and stored ids stay
+# comparable (see hex_summary)
+PERMIT_ID_ALGORITHM = "md5_64"
+PERMIT_ID_SQL = "('0x' || left(md5(permit_reference_number), 16))::UBIGINT"
+
+# Aggregates that merge partial hexagon states exactly. Distinct permits are
+# kept as a sorted array of 64-bit permit id hashes, so a permit counted in
+# several partials (e.g. months or roll-up children) is only counted once.
+MERGE_STATE_AGGREGATES = """
+            SUM(work_count)::BIGINT as work_count,
+            LIST_SORT(LIST_DISTINCT(FLATTEN(LIST(permit_ids)))) as permit_ids,
+            BIT_OR(activity_mask) as activity_mask,
+            BIT_OR(category_mask) as category_mask,
+            SUM(lat_sum) as lat_sum,
+            SUM(lng_sum) as lng_sum"""
+
+def activity_type_bits(activity_types: pd.Series) -> np.ndarray:
+    """
+    Map activity types to single-bit masks, registering unseen types
+    """
+    names = pd.unique(activity_types.dropna())
+    with _activity_lock:
+        for name in names:
+            if name not in _activity_codes and len(_activity_codes) < MAX_ACTIVITY_CODES:
+                _activity_codes[name] = len(_activity_codes)
+        bit_lookup = {name: 1 << _activity_codes.get(name, MAX_ACTIVITY_CODES) for name in names}
+    return activity_types.map(bit_lookup).fillna(0).to_numpy(dtype=np.int64)
+
+def category_bits(work_categories: pd.Series) -> np.ndarray:
+    """
+    Map normalized work categories to single-bit masks
+    """
+    return work_categories.map(CATEGORY_BITS).fillna(CATEGORY_BITS["Other"]).to_numpy(dtype=np.int64)
+
+def activity_type_names() -> List[str]:
+    """
+    Activity type for each bit position, including the overflow bit
+    """
+    with _activity_lock:
+        names = [""] * (MAX_ACTIVITY_CODES + 1)
+        for name, code in _activity_codes.items():
+            names[code] = name
+    names[MAX_ACTIVITY_CODES] = OVERFLOW_ACTIVITY_NAME
+    return names
+
+def decode_mask(masks: pd.Series, names: List[str]) -> pd.Series:
+    """
+    Expand bitset masks into lists of names
+
+    Each distinct mask is decoded once and mapped back onto the series.
+    """
+    decoded = {
+        mask: [name for bit, name in enumerate(names) if name and int(mask) >> bit & 1]
+        for mask in pd.unique(masks)
+    }
+    return masks.map(decoded)
+
+def decode_activity_mask(masks: pd.Series) -> pd.Series:
+    """
+    Expand activity type masks into lists of activity types
+    """
+    return decode_mask(masks, activity_type_names())
+
+def decode_category_mask(masks: pd.Series) -> pd.Series:
+    """
+    Expand work category masks into lists of normalized categories
+    """
+    names = [""] * len(CATEGORY_BITS)
+    for name, bit in CATEGORY_BITS.items():
+        names[bit.bit_length() - 1] = name
+    return decode_mask(masks, names)
+
+def add_state_columns(coords_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the activity_bit and category_bit columns used to build mergeable state
+    """
+    return coords_df.assign(
+        activity_bit=activity_type_bits(coords_df['activity_type']),
+        category_bit=category_bits(coords_df['work_category'])
+    )
+
+def activity_code_bits(names: List[str]) -> Dict[str, int]:
+    """
+    Bit for each activity type in this process, registering unseen types
+    """
+    bits = activity_type_bits(pd.Series(names, dtype=object))
+    return dict(zip(names, bits.tolist()))
+
+def remap_activity_masks(masks: pd.Series, from_names: List[str], to_bits: Dict[str, int]) -> np.ndarray:
+    """
+    Re-encode activity masks from one assignment of bits to activity types to another
+
+    Used to move masks between this process and a persisted vocabulary, whose
+    codes may have been assigned in a different order. Types missing from
+    to_bits fall back to the overflow bit.
+
+    Args:
+        masks: Activity masks encoded with from_names
+        from_names: Activity type for each bit position of the input masks
+        to_bits: Bit for each activity type in the output masks
+    """
+    overflow_bit = 1 << MAX_ACTIVITY_CODES
+    remapped = {}
+    for mask in pd.unique(masks):
+        bits = 0
+        for bit, name in enumerate(from_names):
+            if name and int(mask) >> bit & 1:
+                bits |= to_bits.get(name, overflow_bit)
+        remapped[mask] = bits
+    return masks.map(remapped).to_numpy(dtype=np.int64)
@@ -0,0 +1,281 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from .duckdb_engine import local_cursor
+from .settings import get_setting
+from .tracing import span
+
+# Cells whose boundaries are kept in memory, about 300 bytes each
+DEFAULT_BOUNDARY_STORE_MAX_CELLS = 500_000
+
+# Where the boundaries for the region are saved between runs; empty disables it
+DEFAULT_BOUNDARY_STORE_PATH = ".cache/hex_boundaries.npz"
+
+def get_boundary_store_max_cells() -> int:
+    """
+    Cells kept in the boundary store, from the boundary_store_max_cells setting
+    """
+    return int(get_setting("boundary_store_max_cells", DEFAULT_BOUNDARY_STORE_MAX_CELLS))
+
+def get_boundary_store_path() -> Optional[Path]:
+    """
+    File the boundary store is saved to, from the boundary_store_path setting
+    """
+    path = get_setting("boundary_store_path", DEFAULT_BOUNDARY_STORE_PATH)
+    return Path(path) if path else None
+
+def polygons_from_rings(coordinates: np.ndarray, ring_sizes: np.ndarray) -> np.ndarray:
+    """
+    Build one polygon per ring from lng/lat coordinates stored ring after ring
+    """
+    rings = shapely.linearrings(coordinates, indices=np.repeat(np.arange(len(ring_sizes)), ring_sizes))
+    return shapely.polygons(rings)
+
+def polygons_by_cell(cells: np.ndarray, vertex_cells: np.ndarray, coordinates: np.ndarray) -> np.ndarray:
+    """
+    Assemble boundary polygons from vertices tagged with the cell they belong to
+
+    Vertices must be grouped by cell, in ring order. A cell is matched to its
+    ring by id, so a cell without a full ring of 5 (pentagon) or 6 vertices
+    gets no polygon instead of shifting the rings of the cells after it.
+
+    Args:
+        cells: Sorted unique H3 cell ids
+        vertex_cells: Cell id of each vertex
+        coordinates: lng/lat of each vertex
+
+    Returns:
+        Polygons aligned with cells, None where a cell has no complete ring
+    """
+    polygons = np.full(len(cells), None, dtype=object)
+    ring_cells, ring_sizes = np.unique(vertex_cells, return_counts=True)
+    complete = np.isin(ring_sizes, (5, 6)) & np.isin(ring_cells, cells)
+    if complete.any():
+        vertex_complete = np.repeat(complete, ring_sizes)
+        polygons[np.searchsorted(cells, ring_cells[complete])] = polygons_from_rings(coordinates[vertex_complete], ring_sizes[complete])
+
+    incomplete = len(cells) - int(complete.sum())
+    if incomplete:
+        logger.warning(f"{incomplete} of {len(cells)} H3 cells returned no complete boundary")
+    return polygons
+
+def compute_boundaries(cells: np.ndarray) -> np.ndarray:
+    """
+    Boundary polygons of H3 cells, computed in one query on the local engine
+
+    Vertex coordinates come back as numbers with the id of their cell and are
+    assembled into polygons with shapely, without going through WKT. Cells
+    crossing an icosahedron edge are drawn through their topological vertices
+    only.
+
+    Args:
+        cells: Sorted unique H3 cell ids
+
+    Returns:
+        Polygons in EPSG:4326, aligned with cells, None for a cell without a valid boundary
+    """
+    if len(cells) == 0:
+        return np.empty(0, dtype=object)
+
+    with local_cursor() as con:
+        con.register('boundary_cells', pd.DataFrame({'cell': cells}))
+        vertices = con.execute("""
+        WITH vertexes AS (
+            SELECT
+                cell,
+                UNNEST(h3_cell_to_vertexes(cell)) as vertex,
+                generate_subscripts(h3_cell_to_vertexes(cell), 1) as position
+            FROM boundary_cells
+        )
+        SELECT
+            cell,
+            h3_vertex_to_lng(vertex) as lng,
+            h3_vertex_to_lat(vertex) as lat
+        FROM vertexes
+        WHERE vertex IS NOT NULL
+        ORDER BY cell, position
+        """).fetchnumpy()
+
+    coordinates = np.column_stack([vertices['lng'], vertices['lat']])
+    return polygons_by_cell(np.asarray(cells, dtype=np.uint64), vertices['cell'].astype(np.uint64), coordinates)
+
+class BoundaryStore:
+    """
+    Thread-safe store of H3 cell boundary polygons keyed by integer cell id
+
+    A cell's boundary never changes, so each one is computed once and reused
+    by every grid. Cells are kept as sorted arrays, so a lookup is a
+    vectorised binary search. Once the store holds more than max_cells, the
+    least recently used cells are evicted.
+    """
+
+    def __init__(self, max_cells: int):
+        self.max_cells = max_cells
+        self._lock = threading.Lock()
+        self._cells = np.empty(0, dtype=np.uint64)
+        self._polygons = np.empty(0, dtype=object)
+        # Lookup number at which each cell was last used
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._lookups = 0
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def boundaries(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Boundary polygons of H3 cells, computing only those not already stored
+
+        Args:
+            cells: H3 cell ids, in any order and possibly repeated
+
+        Returns:
+            Polygons aligned with cells
+        """
+        unique, inverse = np.unique(np.asarray(cells, dtype=np.uint64), return_inverse=True)
+        with self._lock:
+            self._lookups += 1
+            positions = np.minimum(np.searchsorted(self._cells, unique), max(len(self._cells) - 1, 0))
+            found = (self._cells[positions] == unique) if len(self._cells) else np.zeros(len(unique), dtype=bool)
+            polygons = np.empty(len(unique), dtype=object)
+            polygons[found] = self._polygons[positions[found]]
+            self._last_used[positions[found]] = self._lookups
+            self.hits += int(found.sum())
+            self.misses += int((~found).sum())
+
+        if not found.all():
+            missing = unique[~found]
+            with span("h3.boundaries", rows=len(missing)):
+                computed = compute_boundaries(missing)
+            polygons[~found] = computed
+            # Cells without a valid boundary are not stored, so they are tried again
+            valid = ~shapely.is_missing(computed)
+            self.add(missing[valid], computed[valid])
+        return polygons[inverse]
+
+    def add(self, cells: np.ndarray, polygons: np.ndarray) -> None:
+        """
+        Store the boundaries of cells not held yet, evicting the least recently used cells if full
+        """
+        with self._lock:
+            new = ~np.isin(cells, self._cells)
+            if not new.any():
+                return
+            merged_cells = np.concatenate([self._cells, cells[new]])
+            order = np.argsort(merged_cells, kind="stable")
+            self._cells = merged_cells[order]
+            self._polygons = np.concatenate([self._polygons, polygons[new]])[order]
+            self._last_used = np.concatenate([self._last_used, np.full(int(new.sum()), self._lookups)])[order]
+            self._dirty = True
+
+            excess = len(self._cells) - self.max_cells
+            if excess > 0:
+                keep = np.sort(np.argsort(self._last_used, kind="stable")[excess:])
+                self._cells, self._polygons, self._last_used = self._cells[keep], self._polygons[keep], self._last_used[keep]
+                self.evictions += excess
+                logger.info(f"Evicted {excess} cells from the hex boundary store")
+
+    def save(self, path: Path) -> bool:
+        """
+        Write the stored boundaries to a .npz file if any were added since the last save or load
+
+        Returns:
+            Whether the file was written
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            cells, polygons = self._cells, self._polygons
+            self._dirty = False
+
+        rings = shapely.get_exterior_ring(polygons)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            cells=cells,
+            coordinates=shapely.get_coordinates(rings),
+            ring_sizes=shapely.get_num_coordinates(rings),
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(cells)} hex boundaries to {path}")
+        return True
+
+    def load(self, path: Path) -> None:
+        """
+        Add the boundaries saved in a .npz file
+        """
+        with np.load(path) as saved:
+            cells = saved['cells'].astype(np.uint64)
+            polygons = polygons_from_rings(saved['coordinates'], saved['ring_sizes'])
+        self.add(cells, polygons)
+        with self._lock:
+            self._dirty = False
+        logger.info(f"Loaded {len(cells)} hex boundaries from {path}")
+
+    def clear(self) -> None:
+        """
+        Drop every stored boundary, keeping the metrics
+        """
+        with self._lock:
+            self._cells = np.empty(0, dtype=np.uint64)
+            self._polygons = np.empty(0, dtype=object)
+            self._last_used = np.empty(0, dtype=np.int64)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Current size and hit/miss metrics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cells": len(self._cells),
+                "max_cells": self.max_cells,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+_boundary_store: Optional[BoundaryStore] = None
+_boundary_store_lock = threading.Lock()
+
+def get_boundary_store() -> BoundaryStore:
+    """
+    Process-wide boundary store, loaded from the boundary_store_path file when it exists
+    """
+    global _boundary_store
+    with _boundary_store_lock:
+        if _boundary_store is None:
+            _boundary_store = BoundaryStore(get_boundary_store_max_cells())
+            path = get_boundary_store_path()
+            if path is not None and path.exists():
+                try:
+                    _boundary_store.load(path)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable hex boundary file {path}: {e}")
+        return _boundary_store
+
+def save_boundary_store() -> bool:
+    """
+    Save the boundary store to the boundary_store_path file, if set
+
+    Returns:
+        Whether the file was written
+    """
+    path = get_boundary_store_path()
+    return path is not None and get_boundary_store().save(path)
+
+def attach_boundaries(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    Hexagon grid with a boundary polygon for each row's cell column
+    """
+    geometry = gpd.GeoSeries(get_boundary_store().boundaries(df['cell'].to_numpy()), index=df.index, crs="EPSG:4326")
+    return gpd.GeoDataFrame(df, geometry=geometry) # type: ignore
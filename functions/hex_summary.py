@@ -0,0 +1,296 @@
+import calendar
+import duckdb
+import pandas as pd
+import streamlit as st
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+from .fetch_data import categorize_columns, month_table_sort_key
+from .h3_state import (
+    MAX_ACTIVITY_CODES,
+    PERMIT_ID_ALGORITHM,
+    activity_code_bits,
+    activity_type_names,
+    remap_activity_masks,
+)
+from .settings import get_setting
+
+# Default location of the materialised hex summary
+DEFAULT_SUMMARY_DATABASE = ".cache/hex_summary.duckdb"
+
+# Pyramid columns stored per month, authority and work category
+SUMMARY_COLUMNS = [
+    "resolution", "cell", "highway_authority", "month_table", "work_category",
+    "work_count", "permit_ids", "activity_mask", "category_mask", "lat_sum", "lng_sum"
+]
+
+SUMMARY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS hex_summary (
+    month_table VARCHAR,
+    highway_authority VARCHAR,
+    work_category VARCHAR,
+    resolution INTEGER,
+    cell UBIGINT,
+    work_count BIGINT,
+    permit_ids UBIGINT[],
+    activity_mask BIGINT,
+    category_mask BIGINT,
+    lat_sum DOUBLE,
+    lng_sum DOUBLE
+);
+CREATE TABLE IF NOT EXISTS ingested_months (
+    month_table VARCHAR PRIMARY KEY,
+    row_count BIGINT,
+    ingested_at TIMESTAMP
+);
+ALTER TABLE ingested_months ADD COLUMN IF NOT EXISTS permit_id_algorithm VARCHAR;
+CREATE TABLE IF NOT EXISTS activity_codes (
+    code INTEGER PRIMARY KEY,
+    name VARCHAR
+);
+"""
+
+def get_summary_database() -> str:
+    """
+    Local DuckDB file or MotherDuck database (md:...) holding the hex summary
+    """
+    return str(get_setting("hex_summary_database", DEFAULT_SUMMARY_DATABASE))
+
+def connect_summary(read_only: bool = False) -> Optional[duckdb.DuckDBPyConnection]:
+    """
+    Connect to the hex summary database
+
+    Returns:
+        Connection, or None when opening read-only and no local summary exists yet
+    """
+    database = get_summary_database()
+    if database.startswith("md:"):
+        con = duckdb.connect(database, config={"motherduck_token": get_setting("token")})
+    else:
+        if read_only and not Path(database).exists():
+            return None
+        if not read_only:
+            Path(database).parent.mkdir(parents=True, exist_ok=True)
+        con = duckdb.connect(database, read_only=read_only)
+    if not read_only:
+        con.execute(SUMMARY_SCHEMA_SQL)
+    return con
+
+def month_display_name(table_name: str) -> str:
+    """
+    Display name for a month table (e.g. "01_2025" -> "January 2025")
+    """
+    year, month = month_table_sort_key(table_name)
+    return f"{calendar.month_name[month]} {year}"
+
+def ingested_months(con: duckdb.DuckDBPyConnection) -> Dict[str, int]:
+    """
+    Watermark of ingested month tables and the row count each was ingested at
+
+    Months stored with another permit id algorithm are left out, so they are
+    ingested again and never merged with months using the current one.
+    """
+    rows = con.execute("""
+    SELECT month_table, row_count
+    FROM ingested_months
+    WHERE permit_id_algorithm = ?
+    """, [PERMIT_ID_ALGORITHM]).fetchall()
+    return {month_table: row_count for month_table, row_count in rows}
+
+def stored_activity_names(con: duckdb.DuckDBPyConnection) -> List[str]:
+    """
+    Activity type for each bit position of the stored activity masks
+    """
+    names = [""] * (MAX_ACTIVITY_CODES + 1)
+    for code, name in con.execute("SELECT code, name FROM activity_codes").fetchall():
+        names[code] = name
+    names[MAX_ACTIVITY_CODES] = activity_type_names()[MAX_ACTIVITY_CODES]
+    return names
+
+def write_month_summary(con: duckdb.DuckDBPyConnection, table_name: str, pyramid: pd.DataFrame, row_count: int) -> None:
+    """
+    Replace the stored hex summary of one month table and advance the watermark
+
+    Activity masks are re-encoded from this process's codes to the stored
+    vocabulary, which is extended with any new activity types. The whole
+    update is one transaction, so an interrupted run leaves the month as it was.
+
+    Args:
+        con: Read-write connection from connect_summary
+        table_name: Month table the pyramid was built from
+        pyramid: Output of build_h3_pyramid for that month
+        row_count: Remote row count of the month table, stored with the watermark
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        stored_names = stored_activity_names(con)
+        stored_bits = {name: 1 << code for code, name in enumerate(stored_names[:MAX_ACTIVITY_CODES]) if name}
+        process_names = activity_type_names()
+
+        for name in process_names[:MAX_ACTIVITY_CODES]:
+            if name and name not in stored_bits and len(stored_bits) < MAX_ACTIVITY_CODES:
+                code = len(stored_bits)
+                con.execute("INSERT INTO activity_codes VALUES (?, ?)", [code, name])
+                stored_bits[name] = 1 << code
+
+        con.execute("DELETE FROM hex_summary WHERE month_table = ?", [table_name])
+        if not pyramid.empty:
+            month_rows = pyramid[SUMMARY_COLUMNS].assign(
+                activity_mask=remap_activity_masks(pyramid['activity_mask'], process_names, stored_bits)
+            )
+            con.register('month_rows', month_rows)
+            con.execute("""
+            INSERT INTO hex_summary BY NAME
+            SELECT * REPLACE (permit_ids::UBIGINT[] as permit_ids)
+            FROM month_rows
+            """)
+            con.unregister('month_rows')
+        con.execute("""
+        INSERT OR REPLACE INTO ingested_months (month_table, row_count, ingested_at, permit_id_algorithm)
+        VALUES (?, ?, current_timestamp::TIMESTAMP, ?)
+        """, [table_name, row_count, PERMIT_ID_ALGORITHM])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    logger.info(f"Stored {len(pyramid)} hex summary rows for {table_name}")
+
+@st.cache_data(ttl=600)
+def summary_month_tables() -> List[str]:
+    """
+    Month tables available in the hex summary, oldest first
+    """
+    try:
+        con = connect_summary(read_only=True)
+        if con is None:
+            return []
+        try:
+            return sorted(ingested_months(con), key=month_table_sort_key)
+        finally:
+            con.close()
+    except duckdb.Error as quack:
+        logger.warning(f"Could not read the hex summary months: {quack}")
+        return []
+
+def summary_covers(table_names: List[str]) -> bool:
+    """
+    Whether every month of a selection has been ingested into the hex summary
+    """
+    return bool(table_names) and set(table_names) <= set(summary_month_tables())
+
+def build_summary_query(authority_count: int, table_count: int, category_count: int) -> str:
+    """
+    Build the query reading a selection's pyramid rows from the hex summary
+
+    With several months, each permit is kept only in the rows of the latest
+    month it appears in, matching the raw path, which counts a permit once for
+    its latest month. Rows are matched through their stored permit ids, so
+    work_count and permit_ids are exact. The cell centre sums are scaled to the
+    permits kept, and the activity and category masks are those of the whole
+    month row.
+
+    Takes the ordered month tables as its first parameter, then the
+    authorities, month tables and categories.
+    """
+    category_filter = f"AND work_category IN ({', '.join('?' for _ in range(category_count))})" if category_count else ""
+    selected = f"""
+        SELECT {', '.join(SUMMARY_COLUMNS)}, list_position(?::VARCHAR[], month_table) as month_rank
+        FROM hex_summary
+        WHERE highway_authority IN ({', '.join('?' for _ in range(authority_count))})
+        AND month_table IN ({', '.join('?' for _ in range(table_count))})
+        {category_filter}
+    """
+    if table_count == 1:
+        return f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM ({selected})"
+
+    return f"""
+    WITH selected AS (
+        SELECT *, row_number() OVER () as row_id
+        FROM ({selected})
+    ),
+    latest AS (
+        -- Every permit appears at each resolution, so the finest is enough
+        SELECT permit_id, MAX(month_rank) as month_rank
+        FROM (
+            SELECT UNNEST(permit_ids) as permit_id, month_rank
+            FROM selected
+            WHERE resolution = (SELECT MAX(resolution) FROM selected)
+        )
+        GROUP BY permit_id
+    ),
+    kept AS (
+        SELECT row_id, LIST_SORT(LIST(permit_id)) as permit_ids
+        FROM (SELECT row_id, month_rank, UNNEST(permit_ids) as permit_id FROM selected)
+        JOIN latest USING (permit_id, month_rank)
+        GROUP BY row_id
+    )
+    SELECT
+        resolution, cell, highway_authority, month_table, work_category,
+        len(kept.permit_ids)::BIGINT as work_count,
+        kept.permit_ids,
+        activity_mask, category_mask,
+        lat_sum * len(kept.permit_ids) / work_count as lat_sum,
+        lng_sum * len(kept.permit_ids) / work_count as lng_sum
+    FROM selected
+    JOIN kept USING (row_id)
+    """
+
+def read_summary_pyramid(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Read the precomputed H3 pyramid rows for a selection from the hex summary
+
+    Rows of several months are reduced so each permit counts once, for its
+    latest month (see build_summary_query), and can then be merged like any
+    other partials. Activity masks are re-encoded to this process's codes.
+
+    Returns:
+        DataFrame shaped like build_h3_pyramid output, or None when the
+        selection is not covered by the summary (see summary_covers)
+    """
+    if not summary_covers(table_names):
+        return None
+
+    table_names = sorted(set(table_names), key=month_table_sort_key)
+    categories = selected_categories or []
+    query = build_summary_query(len(highway_authorities), len(table_names), len(categories))
+    params: List[object] = [table_names, *highway_authorities, *table_names, *categories]
+
+    try:
+        con = connect_summary(read_only=True)
+        if con is None:
+            return None
+        try:
+            pyramid = con.execute(query, params).fetchdf()
+            stored_names = stored_activity_names(con)
+        finally:
+            con.close()
+    except duckdb.Error as quack:
+        logger.warning(f"Could not read the hex summary, aggregating from raw rows: {quack}")
+        return None
+
+    process_bits = activity_code_bits([name for name in stored_names[:MAX_ACTIVITY_CODES] if name])
+    pyramid['activity_mask'] = remap_activity_masks(pyramid['activity_mask'], stored_names, process_bits)
+    categorize_columns(pyramid, ['highway_authority', 'month_table', 'work_category'])
+    logger.info(f"Read {len(pyramid)} precomputed hex summary rows for {len(highway_authorities)} authorities across {len(table_names)} months")
+    return pyramid
+
+@st.cache_data(ttl=600)
+def summary_record_counts(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Works per highway authority, month table and work category from the hex summary
+
+    Returns:
+        DataFrame with highway_authority, month_table, normalized_work_category
+        and record_count columns
+    """
+    pyramid = read_summary_pyramid(highway_authorities, table_names, selected_categories)
+    if pyramid is None or pyramid.empty:
+        return pd.DataFrame(columns=['highway_authority', 'month_table', 'normalized_work_category', 'record_count'])
+
+    finest = pyramid[pyramid['resolution'] == pyramid['resolution'].max()]
+    return (
+        finest.groupby(['highway_authority', 'month_table', 'work_category'], observed=True)['work_count'].sum()
+        .reset_index()
+        .rename(columns={'work_category': 'normalized_work_category', 'work_count': 'record_count'})
+    )
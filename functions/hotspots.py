@@ -0,0 +1,205 @@
+import threading
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import sparse
+from scipy.stats import norm
+from typing import Dict, Tuple
+
+from loguru import logger
+from .duckdb_engine import local_cursor
+from .tracing import span, traced
+
+# Neighbourhood pairs kept per (resolution, ring size) before the cache starts over
+MAX_CACHED_PAIRS = 5_000_000
+
+# Two-sided confidence levels and their critical z-scores, strongest first
+HOTSPOT_CONFIDENCE = [(99, 2.576), (95, 1.960), (90, 1.645)]
+
+NOT_SIGNIFICANT = "Not significant"
+
+class NeighbourhoodCache:
+    """
+    k-ring neighbours of H3 cells, kept per resolution and ring size
+
+    Rings are looked up with the h3 extension only for cells not seen before,
+    so a new selection at the same resolution reuses the rings of earlier ones.
+    """
+
+    def __init__(self, max_pairs: int = MAX_CACHED_PAIRS):
+        self.max_pairs = max_pairs
+        self._lock = threading.Lock()
+        # (resolution, k) -> (covered cells sorted, ring centre cells, ring member cells)
+        self._rings: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def pairs(self, cells: np.ndarray, resolution: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Neighbour pairs among the given cells, each cell paired with itself too
+
+        Args:
+            cells: Sorted unique H3 cell ids at the resolution
+            resolution: H3 resolution of the cells
+            k: Ring size
+
+        Returns:
+            Tuple of centre and neighbour cell id arrays
+        """
+        with self._lock:
+            covered, centres, members = self._rings.get(
+                (resolution, k), (np.empty(0, np.uint64), np.empty(0, np.uint64), np.empty(0, np.uint64))
+            )
+            missing = np.setdiff1d(cells, covered, assume_unique=True)
+            if len(missing):
+                new_centres, new_members = grid_disk_pairs(missing, k)
+                if len(centres) + len(new_centres) > self.max_pairs:
+                    logger.info(f"Neighbourhood cache for resolution {resolution} is full, starting over")
+                    covered, centres, members = np.empty(0, np.uint64), np.empty(0, np.uint64), np.empty(0, np.uint64)
+                    missing = cells
+                    new_centres, new_members = grid_disk_pairs(missing, k)
+                covered = np.union1d(covered, missing)
+                centres = np.concatenate([centres, new_centres])
+                members = np.concatenate([members, new_members])
+                self._rings[(resolution, k)] = (covered, centres, members)
+
+        # Keep the pairs whose centre and neighbour are both in the selection
+        keep = np.isin(centres, cells) & np.isin(members, cells)
+        return centres[keep], members[keep]
+
+    def clear(self) -> None:
+        """
+        Drop the rings of every resolution
+        """
+        with self._lock:
+            self._rings.clear()
+
+_neighbourhoods = NeighbourhoodCache()
+
+def grid_disk_pairs(cells: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Every cell within k steps of each cell, in one query on the local engine
+
+    Returns:
+        Tuple of centre and ring member cell id arrays
+    """
+    with local_cursor() as con:
+        con.register('ring_centres', pd.DataFrame({'cell': cells}))
+        rings = con.execute(f"""
+        SELECT cell as centre, UNNEST(h3_grid_disk(cell, {int(k)})) as member
+        FROM ring_centres
+        """).fetchnumpy()
+    return rings['centre'].astype(np.uint64), rings['member'].astype(np.uint64)
+
+def neighbourhood_matrix(cells: np.ndarray, resolution: int, k: int = 1) -> sparse.csr_matrix:
+    """
+    Binary k-ring adjacency matrix, including each cell itself as Gi* requires
+
+    Args:
+        cells: Sorted unique H3 cell ids; row and column i refer to cells[i]
+        resolution: H3 resolution of the cells
+        k: Ring size
+    """
+    centres, members = _neighbourhoods.pairs(cells, resolution, k)
+    rows = np.searchsorted(cells, centres)
+    columns = np.searchsorted(cells, members)
+    weights = np.ones(len(rows), dtype=float)
+    return sparse.csr_matrix((weights, (rows, columns)), shape=(len(cells), len(cells)))
+
+def getis_ord_gi_star(values: np.ndarray, weights: sparse.csr_matrix) -> np.ndarray:
+    """
+    Getis-Ord Gi* z-score of every cell
+
+    Args:
+        values: Value of each cell
+        weights: Spatial weights including the diagonal, e.g. neighbourhood_matrix
+
+    Returns:
+        z-scores; cells with no spread in their neighbourhood score 0
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    if n < 2:
+        return np.zeros(n)
+
+    mean = x.mean()
+    std = np.sqrt(max((x ** 2).mean() - mean ** 2, 0.0))
+    weight_sums = np.asarray(weights.sum(axis=1)).ravel()
+    squared_weight_sums = np.asarray(weights.multiply(weights).sum(axis=1)).ravel()
+
+    numerator = weights @ x - mean * weight_sums
+    denominator = std * np.sqrt(np.maximum(n * squared_weight_sums - weight_sums ** 2, 0.0) / (n - 1))
+    return np.divide(numerator, denominator, out=np.zeros(n), where=denominator > 0)
+
+def classify_hotspots(z_scores: np.ndarray) -> np.ndarray:
+    """
+    Label z-scores as hot or cold spots at the highest confidence they reach
+    """
+    labels = np.full(len(z_scores), NOT_SIGNIFICANT, dtype=object)
+    # Weakest first, so stronger levels overwrite
+    for confidence, critical in reversed(HOTSPOT_CONFIDENCE):
+        labels[z_scores >= critical] = f"Hot spot ({confidence}%)"
+        labels[z_scores <= -critical] = f"Cold spot ({confidence}%)"
+    return labels
+
+def hotspot_categories() -> list:
+    """
+    Hotspot labels ordered from hottest to coldest
+    """
+    hot = [f"Hot spot ({confidence}%)" for confidence, _ in HOTSPOT_CONFIDENCE]
+    cold = [f"Cold spot ({confidence}%)" for confidence, _ in reversed(HOTSPOT_CONFIDENCE)]
+    return hot + [NOT_SIGNIFICANT] + cold
+
+def grid_cell_ids(grid: pd.DataFrame) -> np.ndarray:
+    """
+    Integer H3 ids of a grid, from its cell column or its h3_cell strings
+    """
+    if 'cell' in grid.columns:
+        return grid['cell'].to_numpy(dtype=np.uint64)
+    with local_cursor() as con:
+        con.register('cell_strings', grid[['h3_cell']])
+        return con.execute("SELECT h3_string_to_h3(h3_cell) as cell FROM cell_strings").fetchnumpy()['cell'].astype(np.uint64)
+
+@traced("h3.hotspots")
+def add_hotspot_scores(grid: gpd.GeoDataFrame, resolution: int, value_column: str = 'work_count', k: int = 1) -> gpd.GeoDataFrame:
+    """
+    Score every hexagon of a grid with Getis-Ord Gi* over its k-ring neighbourhood
+
+    The study area is the hexagons of the grid; empty hexagons around them are
+    not counted. Neighbourhoods are cached per resolution, and the statistic is
+    computed with sparse matrix operations.
+
+    Args:
+        grid: H3 grid with a cell or h3_cell column
+        resolution: H3 resolution of the grid
+        value_column: Column to test for clustering
+        k: Ring size of the neighbourhood
+
+    Returns:
+        Copy of the grid with gi_zscore, gi_pvalue and hotspot columns
+    """
+    if grid.empty:
+        return grid
+
+    cell_ids = grid_cell_ids(grid)
+    cells, positions = np.unique(cell_ids, return_inverse=True)
+    if len(cells) != len(cell_ids):
+        raise ValueError("Hotspot analysis needs one row per H3 cell")
+
+    with span("h3.neighbourhoods", rows=len(cells)):
+        weights = neighbourhood_matrix(cells, resolution, k)
+
+    values = np.empty(len(cells))
+    values[positions] = grid[value_column].to_numpy(dtype=float)
+    z_scores = getis_ord_gi_star(values, weights)[positions]
+
+    scored = grid.copy()
+    scored['gi_zscore'] = z_scores
+    scored['gi_pvalue'] = 2 * norm.sf(np.abs(z_scores))
+    scored['hotspot'] = pd.Categorical(classify_hotspots(z_scores), categories=hotspot_categories())
+    logger.info(f"Scored {len(scored)} hexagons at resolution {resolution} with Gi* (k={k})")
+    return scored
+
+def clear_neighbourhood_cache() -> None:
+    """
+    Drop the cached neighbourhoods of every resolution
+    """
+    _neighbourhoods.clear()
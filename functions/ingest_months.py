@@ -0,0 +1,97 @@
+import argparse
+import re
+import duckdb
+import pandas as pd
+from typing import List, Optional
+
+from loguru import logger
+from .fetch_data import open_connection, month_table_sort_key
+from .h3_processing import fetch_h3_pyramid
+from .hex_boundaries import get_boundary_store, save_boundary_store
+from .hex_summary import connect_summary, ingested_months, write_month_summary
+from .parquet_cache import get_table_source, remote_row_count
+from .settings import get_required_setting
+
+# Month tables are named MM_YYYY (e.g. "06_2025")
+MONTH_TABLE_PATTERN = re.compile(r"^\d{2}_\d{4}$")
+
+def discover_month_tables(con: duckdb.DuckDBPyConnection, schema: str) -> List[str]:
+    """
+    Month tables present in the schema, oldest first
+    """
+    rows = con.execute("""
+    SELECT DISTINCT table_name
+    FROM information_schema.tables
+    WHERE table_schema = ?
+    """, [schema]).fetchall()
+    tables = [name for (name,) in rows if MONTH_TABLE_PATTERN.match(name)]
+    return sorted(tables, key=month_table_sort_key)
+
+def build_month_pyramid(con: duckdb.DuckDBPyConnection, schema: str, table_name: str) -> pd.DataFrame:
+    """
+    Build the H3 pyramid for every highway authority and work category in one month table
+    """
+    source = get_table_source(con, schema, table_name)
+    authorities = [name for (name,) in con.execute(f"SELECT DISTINCT highway_authority FROM {source}").fetchall() if name]
+    if not authorities:
+        return pd.DataFrame()
+    return fetch_h3_pyramid(con, schema, authorities, [table_name])
+
+def ingest_new_months(table_names: Optional[List[str]] = None, force: bool = False) -> List[str]:
+    """
+    Add the hex aggregates of month tables not yet in the summary
+
+    A month is skipped when the watermark records it at its current remote row
+    count, so reruns only do work for new or changed months.
+
+    Args:
+        table_names: Month tables to consider, defaults to every month table in the schema
+        force: Rebuild the months even if the watermark is current
+
+    Returns:
+        Month tables that were ingested
+    """
+    try:
+        con = open_connection()
+        schema = get_required_setting("schema")
+        summary_con = connect_summary()
+        assert summary_con is not None
+    except KeyError as ke:
+        logger.error(f"Missing setting (st.secrets or NWG_ environment variable): {ke}")
+        raise ke
+
+    ingested = []
+    try:
+        watermark = ingested_months(summary_con)
+        for table_name in table_names or discover_month_tables(con, schema):
+            row_count = remote_row_count(con, schema, table_name)
+            if not force and watermark.get(table_name) == row_count:
+                logger.info(f"{table_name} is already in the hex summary, skipping")
+                continue
+
+            logger.info(f"Ingesting {table_name} ({row_count} rows) into the hex summary")
+            pyramid = build_month_pyramid(con, schema, table_name)
+            if pyramid.empty:
+                logger.warning(f"No works found in {table_name}")
+            write_month_summary(summary_con, table_name, pyramid, row_count)
+            if not pyramid.empty:
+                # Warm the boundary store with the region's cells, saved below
+                get_boundary_store().boundaries(pyramid['cell'].to_numpy())
+            ingested.append(table_name)
+    except duckdb.Error as quack:
+        logger.error(f"A duckdb error occurred: {quack}")
+        raise quack
+    finally:
+        summary_con.close()
+        con.close()
+
+    save_boundary_store()
+    logger.info(f"Ingested {len(ingested)} months into the hex summary")
+    return ingested
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest new month tables into the materialised hex summary")
+    parser.add_argument("months", nargs="*", help="Month tables to ingest (e.g. 07_2025), defaults to all new months")
+    parser.add_argument("--force", action="store_true", help="Rebuild months that are already ingested")
+    args = parser.parse_args()
+    ingest_new_months(args.months or None, args.force)
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from .tracing import traced
+
+# Average H3 edge length at resolution 0; each finer resolution divides it by about sqrt(7)
+H3_RES0_EDGE_KM = 1281.256
+
+# Lines are sampled at this fraction of the cell edge, so a line rarely
+# crosses a cell without leaving a sample in it
+SAMPLES_PER_EDGE = 4
+
+# Metres per degree of latitude, and of longitude at the equator
+METRES_PER_DEGREE_LAT = 110_574.0
+METRES_PER_DEGREE_LNG = 111_320.0
+
+# Columns carried over from each work onto its samples
+SAMPLE_COLUMNS = ['permit_reference_number', 'highway_authority', 'month_table', 'activity_type']
+
+def sample_spacing_degrees(resolution: int) -> float:
+    """
+    Largest distance between line samples at an H3 resolution, in degrees
+
+    Degrees of latitude are the longest, so the spacing holds in any direction.
+    """
+    edge_km = H3_RES0_EDGE_KM / np.sqrt(7) ** resolution
+    return edge_km * 1000 / METRES_PER_DEGREE_LAT / SAMPLES_PER_EDGE
+
+def segment_lengths_metres(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Approximate lengths of lng/lat segments in metres, using an equirectangular projection
+    """
+    mid_lat = np.radians((start[:, 1] + end[:, 1]) / 2)
+    dx = (end[:, 0] - start[:, 0]) * METRES_PER_DEGREE_LNG * np.cos(mid_lat)
+    dy = (end[:, 1] - start[:, 1]) * METRES_PER_DEGREE_LAT
+    return np.hypot(dx, dy)
+
+@traced("h3.line_samples")
+def line_coverage_samples(geodf_points: gpd.GeoDataFrame, resolution: int) -> pd.DataFrame:
+    """
+    Sample points covering the full extent of every street work
+
+    Lines are densified with shapely.segmentize so no segment is longer than a
+    fraction of the cell edge, and each segment contributes its midpoint
+    weighted by its share of the line's length. Points, and lines of zero
+    length, contribute their centroid with weight 1. All steps are vectorised
+    over the whole frame.
+
+    Args:
+        geodf_points: GeoDataFrame of street works in EPSG:4326
+        resolution: H3 resolution the samples will be indexed at
+
+    Returns:
+        DataFrame with the columns of extract_centroid_coords plus weight; the
+        weights of each work sum to 1
+    """
+    geometries = np.asarray(geodf_points.geometry.values)
+    valid = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    work_index = np.flatnonzero(valid)
+    geometries = geometries[valid]
+
+    # Split multi-part geometries and sample the line parts along their length
+    parts, part_work = shapely.get_parts(geometries, return_index=True)
+    is_line = (shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING) & (shapely.length(parts) > 0)
+    lines = shapely.segmentize(parts[is_line], sample_spacing_degrees(resolution))
+    coords, coord_line = shapely.get_coordinates(lines, return_index=True)
+    same_line = coord_line[1:] == coord_line[:-1]
+    start, end = coords[:-1][same_line], coords[1:][same_line]
+    segment_work = part_work[is_line][coord_line[:-1][same_line]]
+    lengths = segment_lengths_metres(start, end)
+
+    work_lengths = np.bincount(segment_work, weights=lengths, minlength=len(geometries))
+    has_length = work_lengths > 0
+    keep = lengths > 0
+    segment_work, lengths = segment_work[keep], lengths[keep]
+    midpoints = (start[keep] + end[keep]) / 2
+
+    # Works without any line length fall back to their centroid
+    point_work = np.flatnonzero(~has_length)
+    centroids = shapely.centroid(geometries[point_work])
+
+    sample_work = np.concatenate([segment_work, point_work])
+    rows = work_index[sample_work]
+
+    def column_values(column: str, default=None):
+        # Take from the column's own array, keeping categoricals as codes
+        if column in geodf_points.columns:
+            return geodf_points[column].array.take(rows)
+        return np.full(len(rows), default, dtype=object)
+
+    samples = pd.DataFrame({column: column_values(column) for column in SAMPLE_COLUMNS})
+    samples['work_category'] = column_values('normalized_work_category', 'Unknown')
+    samples['latitude'] = np.concatenate([midpoints[:, 1], shapely.get_y(centroids)])
+    samples['longitude'] = np.concatenate([midpoints[:, 0], shapely.get_x(centroids)])
+    samples['weight'] = np.concatenate([lengths / work_lengths[segment_work], np.ones(len(point_work))])
+    return samples
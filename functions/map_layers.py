@@ -0,0 +1,101 @@
+import json
+import folium
+import geopandas as gpd
+import numpy as np
+import shapely
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Colour ramp shared by the hexagon map and its legend
+HEX_COLORS = ['#E6F3FF', '#B3D9FF', '#80BFFF', '#4D9FFF', '#1A7FFF', '#0066CC']
+
+# Diverging ramp for Gi* z-scores, from cold spots through white to hot spots
+HOTSPOT_COLORS = ['#2166AC', '#67A9CF', '#F7F7F7', '#EF8A62', '#B2182B']
+
+# Default number of decimal places kept for coordinates (~0.1m in EPSG:4326)
+DEFAULT_COORDINATE_PRECISION = 6
+
+def interpolate_rgb(values: np.ndarray, colors: Sequence[str], vmin: float, vmax: float, centre: Optional[float] = None) -> np.ndarray:
+    """
+    Map values onto a linear colour ramp in one pass
+
+    Matches branca's LinearColormap: the colours are evenly spaced between vmin
+    and vmax and each RGB channel is interpolated linearly. With a centre, the
+    middle colour sits at the centre and the colours either side are spread
+    over their own half of the range, as a diverging ramp needs; a degenerate
+    range is then drawn in the middle colour rather than the first.
+
+    Returns:
+        Integer array of shape (n, 3) with red, green and blue channels
+    """
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=float)
+    values = np.clip(np.asarray(values, dtype=float), vmin, vmax)
+
+    if centre is None:
+        stops = np.linspace(vmin, vmax, len(colors))
+        fallback = rgb[0]
+    else:
+        middle = len(colors) // 2
+        stops = np.concatenate([
+            np.linspace(vmin, centre, middle + 1)[:-1],
+            np.linspace(centre, vmax, len(colors) - middle),
+        ])
+        fallback = rgb[middle]
+
+    if vmax == vmin:
+        channels = np.tile(fallback, (len(values), 1))
+    else:
+        channels = np.column_stack([np.interp(values, stops, rgb[:, i]) for i in range(3)])
+
+    return np.round(channels).astype(int)
+
+def interpolate_colors(values: np.ndarray, colors: Sequence[str], vmin: float, vmax: float, centre: Optional[float] = None) -> np.ndarray:
+    """
+    Map values onto a linear colour ramp as hex colour strings
+    """
+    channels = interpolate_rgb(values, colors, vmin, vmax, centre)
+    return np.array([f"#{r:02x}{g:02x}{b:02x}" for r, g, b in channels])
+
+def round_coordinates(geometries: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Round every coordinate of an array of geometries to a number of decimal places
+    """
+    return shapely.transform(geometries, lambda coords: np.round(coords, precision))
+
+def build_feature_collection(geodf: gpd.GeoDataFrame, properties: List[str], precision: Optional[int] = DEFAULT_COORDINATE_PRECISION) -> dict:
+    """
+    Build one GeoJSON FeatureCollection carrying only the given properties
+
+    Missing and empty geometries are dropped. Missing property columns are
+    filled with "N/A" so tooltips always have a value.
+
+    Args:
+        geodf: GeoDataFrame in EPSG:4326
+        properties: Columns to carry into each feature's properties
+        precision: Decimal places to round coordinates to, or None to keep them
+
+    Returns:
+        GeoJSON FeatureCollection as a dict
+    """
+    geometries = np.asarray(geodf.geometry.values)
+    valid = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    geometries = geometries[valid]
+    if precision is not None:
+        geometries = round_coordinates(geometries, precision)
+
+    frame = geodf.loc[valid, [c for c in properties if c in geodf.columns]].copy()
+    for column in properties:
+        if column not in frame.columns:
+            frame[column] = "N/A"
+
+    layer = gpd.GeoDataFrame(frame[properties], geometry=geometries, crs=geodf.crs)
+    return json.loads(layer.to_json(drop_id=True))
+
+def feature_collection_layer(feature_collection: dict, style_function: Callable[[dict], Dict[str, object]], tooltip_fields: List[str], tooltip_aliases: List[str]) -> folium.GeoJson:
+    """
+    Wrap a FeatureCollection in a single folium layer with a property-driven tooltip
+    """
+    return folium.GeoJson(
+        feature_collection,
+        style_function=style_function,
+        tooltip=folium.GeoJsonTooltip(fields=tooltip_fields, aliases=tooltip_aliases, max_width=300)
+    )
@@ -0,0 +1,95 @@
+import pydeck as pdk
+import pandas as pd
+import numpy as np
+import streamlit as st
+from loguru import logger
+from .map_layers import HEX_COLORS, interpolate_rgb
+from .tracing import span, traced
+
+@traced("map.build_deck")
+def build_h3_deck(df: pd.DataFrame, color_by: str = 'work_count') -> pdk.Deck:
+    """
+    Build a GPU-rendered H3 hexagon map
+    
+    Only the cell ids, the tooltip values and a fill colour are sent to the
+    browser; deck.gl derives each hexagon's outline from its H3 id.
+    
+    Args:
+        df: DataFrame with h3_cell, work_count, unique_permits, center_lat and center_lng
+        color_by: Column to use for color coding ('work_count' or 'unique_permits')
+    """
+    values = np.array(df[color_by].values, dtype=float)
+    rgb = interpolate_rgb(values, HEX_COLORS, float(values.min()), float(values.max()))
+    
+    layer_df = pd.DataFrame({
+        'h3_cell': df['h3_cell'].to_numpy(),
+        'work_count': df['work_count'].to_numpy(),
+        'unique_permits': df['unique_permits'].to_numpy(),
+        'r': rgb[:, 0],
+        'g': rgb[:, 1],
+        'b': rgb[:, 2]
+    })
+    
+    layer = pdk.Layer(
+        "H3HexagonLayer",
+        layer_df,
+        get_hexagon="h3_cell",
+        get_fill_color="[r, g, b, 180]",
+        get_line_color=[0, 0, 0, 160],
+        line_width_min_pixels=1,
+        stroked=True,
+        filled=True,
+        extruded=False,
+        pickable=True
+    )
+    
+    view_state = pdk.data_utils.compute_view(df[['center_lng', 'center_lat']].to_numpy().tolist())
+    
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=view_state,
+        map_style="light",
+        tooltip={"html": "<b>H3 Cell:</b> {h3_cell}<br><b>Total Works:</b> {work_count}<br><b>Unique Permits:</b> {unique_permits}"}
+    )
+
+def plot_h3_deck(df: pd.DataFrame, color_by: str = 'work_count'):
+    """
+    Plot H3 cells with deck.gl's H3HexagonLayer
+    
+    Args:
+        df: DataFrame with h3_cell and aggregate columns
+        color_by: Column to use for color coding ('work_count' or 'unique_permits')
+    """
+    try:
+        if df.empty:
+            st.warning("No H3 data to display")
+            return
+        
+        deck = build_h3_deck(df, color_by)
+        
+        # Show summary statistics BEFORE the map
+        st.subheader("H3 Grid Summary")
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Total Hexagons", len(df))
+        with col2:
+            st.metric("Total Works", int(df['work_count'].sum())) # type: ignore
+        with col3:
+            avg_works = float(df['work_count'].mean()) # type: ignore
+            st.metric("Avg Works per Hex", f"{avg_works:.1f}")
+        with col4:
+            st.metric("Max Works in Hex", int(df['work_count'].max())) # type: ignore
+        
+        # Display map
+        with span("map.render"):
+            st.pydeck_chart(deck, height=600)
+        
+        # Show top hexagons by activity
+        st.subheader("Most Active Hexagons")
+        top_hexes = df.nlargest(10, 'work_count')[['h3_cell', 'work_count', 'unique_permits', 'activity_types']]
+        st.dataframe(top_hexes, use_container_width=True)
+        
+    except Exception as e:
+        logger.error(f"Error plotting H3 deck map: {e}")
+        raise
@@ -1,52 +1,142 @@
 import folium
 import geopandas as gpd
+import numpy as np
 import streamlit as st
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
 from loguru import logger
+from typing import List, Optional
+from .map_layers import build_feature_collection, feature_collection_layer
+from .raw_lod import RawMapLayers, contains_bounds, expand_bounds, prepare_raw_layers
+from .tracing import span, traced
+from .viewport_lod import Bounds, parse_folium_viewport, zoom_for_bounds
+
+# Session state key holding the last reported view of the Points/Lines map,
+# and the area and zoom its layers were prepared for
+RAW_VIEWPORT_STATE_KEY = "raw_viewport"
+
+def cluster_layer(layers: RawMapLayers) -> folium.GeoJson:
+    """
+    Clusters as one layer of circles sized by the number of works they hold
+    """
+    clusters = layers.clusters
+    radius = 6 + 4 * np.log10(clusters['count'].to_numpy(dtype=float))
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lng, layers.precision), round(lat, layers.precision)]},
+            "properties": {"count": int(count), "radius": round(float(r), 1)},
+        }
+        for lat, lng, count, r in zip(clusters['latitude'], clusters['longitude'], clusters['count'], radius)
+    ]
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        marker=folium.CircleMarker(),
+        style_function=lambda feature: {
+            'radius': feature['properties']['radius'],
+            'color': '#1f77b4',
+            'fillColor': '#1f77b4',
+            'fillOpacity': 0.5,
+            'weight': 1
+        },
+        tooltip=folium.GeoJsonTooltip(fields=['count'], aliases=['Works (zoom in to expand):'])
+    )
+
+@traced("map.build_england")
+def build_england_map(layers: RawMapLayers, bounds: Bounds, location: Optional[List[float]] = None, zoom_start: Optional[int] = None) -> folium.Map:
+    """
+    Build the folium map of raw works geometries and clusters
+
+    Works are drawn as a single GeoJSON layer and clusters as a second one.
+
+    Args:
+        layers: Output of prepare_raw_layers
+        bounds: Area to fit the map to when no location is given
+        location: Map centre as [lat, lng]
+        zoom_start: Zoom level used with location
+    """
+    if location is not None:
+        m = folium.Map(tiles="cartodbpositron", location=location, zoom_start=zoom_start)
+    else:
+        # Set bounds to the data area
+        m = folium.Map(tiles="cartodbpositron")
+        m.fit_bounds([list(bounds[0]), list(bounds[1])])
+
+    if not layers.features.empty:
+        # Add all features to the map as one layer - simple markers for points or lines
+        tooltip_fields = ['permit_reference_number', 'work_status_ref', 'event_type', 'activity_type']
+        feature_collection = build_feature_collection(layers.features, tooltip_fields, layers.precision)
+        feature_collection_layer(
+            feature_collection,
+            style_function=lambda feature: {
+                'color': '#1f77b4',
+                'weight': 3,
+                'opacity': 0.8
+            },
+            tooltip_fields=tooltip_fields,
+            tooltip_aliases=['Permit:', 'Work Status:', 'Event Type:', 'Activity Type:']
+        ).add_to(m)
+
+    if not layers.clusters.empty:
+        cluster_layer(layers).add_to(m)
+    return m
 
 def plot_map_england(geodf):
+    """
+    Plot raw works geometries on a map that follows the map view
+
+    Each view draws simplified works and clusters sized for its zoom level,
+    keeping the payload under the raw_map_max_bytes setting. The map reports
+    its bounds and zoom back through st_folium, and the app reruns when the
+    zoom changes or the view leaves the area already drawn.
+    """
     try:
         if not isinstance(geodf, gpd.GeoDataFrame):
             raise TypeError("Input must be a GeoDataFrame")
 
-        # Get the bounds of all geometries in the geodataframe
-        total_bounds = geodf.total_bounds
+        stored = st.session_state.get(RAW_VIEWPORT_STATE_KEY)
+        if stored is None:
+            # Until the map reports its view, show the whole extent
+            total_bounds = geodf.total_bounds
+            view_bounds = (total_bounds[1], total_bounds[0]), (total_bounds[3], total_bounds[2])
+            zoom, location = zoom_for_bounds(view_bounds), None
+            drawn_bounds = expand_bounds(view_bounds, 0.05)
+        else:
+            view_bounds, zoom, location, drawn_bounds = stored
 
-        # Create the map and set bounds to the data area
-        m = folium.Map(tiles="cartodbpositron")
-        m.fit_bounds([[total_bounds[1], total_bounds[0]], [total_bounds[3], total_bounds[2]]])
-
-        # Add features to map - simple markers for points or lines
-        for _, row in geodf.iterrows():
-            if row.geometry is not None and not row.geometry.is_empty:
-                folium.GeoJson(
-                    row.geometry.__geo_interface__,
-                    style_function=lambda x: {
-                        'color': '#1f77b4',
-                        'weight': 3,
-                        'opacity': 0.8
-                    },
-                    tooltip=folium.Tooltip(
-                        f"Permit: {row.get('permit_reference_number', 'N/A')}<br>"
-                        f"Work Status: {row.get('work_status_ref', 'N/A')}<br>"
-                        f"Event Type: {row.get('event_type', 'N/A')}<br>"
-                        f"Activity Type: {row.get('activity_type', 'N/A')}<br>"
-                    )
-                ).add_to(m)
-
-        # Display map using folium_static - responsive width
-        folium_static(m, width=None, height=600)
+        layers = prepare_raw_layers(geodf, drawn_bounds, zoom)
+        if layers.clusters.empty:
+            st.caption(f"Showing {len(layers.features)} works in this view.")
+        else:
+            st.caption(f"Showing {len(layers.features)} works and {len(layers.clusters)} clusters of {int(layers.clusters['count'].sum())} works. Zoom in to expand clusters.")
+
+        m = build_england_map(layers, view_bounds, location, zoom)
+
+        # Display the map and read back its view
+        with span("map.render"):
+            map_state = st_folium(m, key="raw_map", height=600, use_container_width=True, returned_objects=["bounds", "zoom", "center"])
 
         # Show basic data info
         st.subheader("Data Summary")
         st.write(f"Total records: {len(geodf)}")
-        
+
         # Show the dataframe without geometry column to avoid Arrow conversion issues
         # You wouldn't really need to display the geometry column anyway
         st.subheader("Raw Data")
         display_df = geodf.drop(columns=['geometry'])
         st.dataframe(display_df)
 
+        viewport = parse_folium_viewport(map_state)
+        if viewport is None:
+            return
+        new_bounds, new_zoom = viewport
+        center = map_state.get("center") or {}
+        new_location = [center.get("lat", (new_bounds[0][0] + new_bounds[1][0]) / 2), center.get("lng", (new_bounds[0][1] + new_bounds[1][1]) / 2)]
+
+        # Redraw only when the zoom changes or the view moves past the drawn area
+        if stored is None or new_zoom != zoom or not contains_bounds(drawn_bounds, new_bounds):
+            st.session_state[RAW_VIEWPORT_STATE_KEY] = (new_bounds, new_zoom, new_location, expand_bounds(new_bounds))
+            st.rerun()
+
     except Exception as e:
         logger.error(f"Error occurred: {e}")
         raise
@@ -5,6 +5,94 @@ import numpy as np
 from branca.colormap import LinearColormap
 from streamlit_folium import folium_static
 from loguru import logger
+from typing import List, Optional
+from .map_layers import HEX_COLORS, HOTSPOT_COLORS, DEFAULT_COORDINATE_PRECISION, interpolate_colors, build_feature_collection, feature_collection_layer
+from .tracing import span, traced
+
+@traced("map.build_h3")
+def build_h3_map(geodf: gpd.GeoDataFrame, color_by: str = 'work_count', precision: Optional[int] = DEFAULT_COORDINATE_PRECISION, location: Optional[List[float]] = None, zoom_start: Optional[int] = None) -> folium.Map:
+    """
+    Build the folium map for an H3 hexagonal grid
+    
+    All hexagons go into a single GeoJSON layer. Fill colours are computed for
+    every hexagon at once and stored as a feature property that one style
+    function reads.
+    
+    Args:
+        geodf: GeoDataFrame containing H3 hexagons
+        color_by: Column to use for color coding ('work_count', 'unique_permits'
+            or 'gi_zscore' from add_hotspot_scores)
+        precision: Decimal places to round coordinates to, or None to keep them
+        location: Map centre as [lat, lng]; the map fits the hexagons when omitted
+        zoom_start: Zoom level used with location
+    """
+    if location is not None:
+        # Keep the view the caller asked for
+        m = folium.Map(tiles="cartodbpositron", location=location, zoom_start=zoom_start)
+    else:
+        # Get the bounds of all geometries
+        total_bounds = geodf.total_bounds
+        
+        # Create the map
+        m = folium.Map(tiles="cartodbpositron")
+        m.fit_bounds([[total_bounds[1], total_bounds[0]], [total_bounds[3], total_bounds[2]]])
+    
+    # Prepare color mapping
+    values = np.array(geodf[color_by].values, dtype=float)
+    min_val, max_val = float(values.min()), float(values.max())
+    colors = HEX_COLORS
+    centre = None
+    if color_by == 'gi_zscore':
+        # Centre the diverging ramp on zero so white means no clustering
+        colors = HOTSPOT_COLORS
+        centre = 0.0
+        max_val = max(abs(min_val), abs(max_val))
+        min_val = -max_val
+    
+    # Create colormap for the legend; when every z-score is zero it keeps a
+    # unit range around the neutral colour every hexagon is drawn in
+    legend_max = max_val if centre is None or max_val > 0 else 1.0
+    colormap = LinearColormap(
+        colors=colors,
+        vmin=min_val if centre is None else -legend_max,
+        vmax=legend_max,
+        caption=f'{color_by.replace("_", " ").title()}'
+    )
+    
+    # Add all hexagons to the map as one layer
+    layer_df = geodf.assign(fill_color=interpolate_colors(values, colors, min_val, max_val, centre))
+    tooltip_fields = ['h3_cell', 'work_count', 'unique_permits']
+    tooltip_aliases = ['H3 Cell:', 'Total Works:', 'Unique Permits:']
+    if 'weighted_work_count' in geodf.columns:
+        layer_df['weighted_work_count'] = layer_df['weighted_work_count'].round(2)
+        tooltip_fields.append('weighted_work_count')
+        tooltip_aliases.append('Length-Weighted Works:')
+    if 'hotspot' in geodf.columns:
+        layer_df['gi_zscore'] = layer_df['gi_zscore'].round(2)
+        layer_df['hotspot'] = layer_df['hotspot'].astype(str)
+        tooltip_fields += ['gi_zscore', 'hotspot']
+        tooltip_aliases += ['Gi* z-score:', 'Hotspot:']
+    feature_collection = build_feature_collection(
+        layer_df,
+        tooltip_fields + ['fill_color'],
+        precision
+    )
+    feature_collection_layer(
+        feature_collection,
+        style_function=lambda feature: {
+            'fillColor': feature['properties']['fill_color'],
+            'color': 'black',
+            'weight': 1,
+            'fillOpacity': 0.7,
+            'opacity': 0.8
+        },
+        tooltip_fields=tooltip_fields,
+        tooltip_aliases=tooltip_aliases
+    ).add_to(m)
+    
+    # Add colormap to map
+    colormap.add_to(m)
+    return m
 
 def plot_h3_map(geodf: gpd.GeoDataFrame, color_by: str = 'work_count'):
     """
@@ -19,50 +107,7 @@ def plot_h3_map(geodf: gpd.GeoDataFrame, color_by: str = 'work_count'):
             st.warning("No H3 data to display")
             return
             
-        # Get the bounds of all geometries
-        total_bounds = geodf.total_bounds
-        
-        # Create the map
-        m = folium.Map(tiles="cartodbpositron")
-        m.fit_bounds([[total_bounds[1], total_bounds[0]], [total_bounds[3], total_bounds[2]]])
-        
-        # Prepare color mapping
-        values = np.array(geodf[color_by].values, dtype=float)
-        min_val, max_val = float(values.min()), float(values.max())
-        
-        # Create colormap
-        colormap = LinearColormap(
-            colors=['#E6F3FF', '#B3D9FF', '#80BFFF', '#4D9FFF', '#1A7FFF', '#0066CC'],
-            vmin=min_val,
-            vmax=max_val,
-            caption=f'{color_by.replace("_", " ").title()}'
-        )
-        
-        # Add hexagons to map
-        for _, row in geodf.iterrows():
-            if row.geometry is not None and not row.geometry.is_empty:
-                color_value = row[color_by]
-                fill_color = colormap(color_value)
-                
-                tooltip_content = f"""
-                <b>H3 Cell:</b> {row.get('h3_cell', 'N/A')}<br>
-                <b>Total Works:</b> {row.get('work_count', 0)}<br>
-                <b>Unique Permits:</b> {row.get('unique_permits', 0)}<br>
-                """
-                folium.GeoJson(
-                    row.geometry.__geo_interface__,
-                    style_function=lambda x, color=fill_color: {
-                        'fillColor': color,
-                        'color': 'black',
-                        'weight': 1,
-                        'fillOpacity': 0.7,
-                        'opacity': 0.8
-                    },
-                    tooltip=folium.Tooltip(tooltip_content, max_width=300)
-                ).add_to(m)
-        
-        # Add colormap to map
-        colormap.add_to(m)
+        m = build_h3_map(geodf, color_by)
         
         # Show summary statistics BEFORE the map
         st.subheader("H3 Grid Summary")
@@ -79,12 +124,23 @@ def plot_h3_map(geodf: gpd.GeoDataFrame, color_by: str = 'work_count'):
             st.metric("Max Works in Hex", int(geodf['work_count'].max())) # type: ignore
         
         # Display map
-        folium_static(m, width=None, height=600)
+        with span("map.render"):
+            folium_static(m, width=None, height=600)
         
-        # Show top hexagons by activity
-        st.subheader("Most Active Hexagons")
-        top_hexes = geodf.nlargest(10, 'work_count')[['h3_cell', 'work_count', 'unique_permits', 'activity_types']]
-        st.dataframe(top_hexes, use_container_width=True)
+        if 'hotspot' in geodf.columns:
+            # Show the strongest clusters rather than the busiest single hexagons
+            st.subheader("Hotspots (Getis-Ord Gi*)")
+            st.dataframe(
+                geodf['hotspot'].value_counts(sort=False).rename_axis('hotspot').reset_index(name='hexagons'),
+                use_container_width=True
+            )
+            top_hexes = geodf.nlargest(10, 'gi_zscore')[['h3_cell', 'gi_zscore', 'gi_pvalue', 'hotspot', 'work_count', 'unique_permits']]
+            st.dataframe(top_hexes, use_container_width=True)
+        else:
+            # Show top hexagons by activity
+            st.subheader("Most Active Hexagons")
+            top_hexes = geodf.nlargest(10, 'work_count')[['h3_cell', 'work_count', 'unique_permits', 'activity_types']]
+            st.dataframe(top_hexes, use_container_width=True)
         
     except Exception as e:
         logger.error(f"Error plotting H3 map: {e}")
@@ -0,0 +1,73 @@
+import folium
+import streamlit as st
+from streamlit_folium import st_folium
+from typing import List, Optional
+from loguru import logger
+from .map_prep_h3 import build_h3_map
+from .tracing import span
+from .viewport_lod import Bounds, zoom_for_bounds, choose_resolution, create_h3_viewport_grid, get_hex_budget, parse_folium_viewport, viewport_tiles
+
+# Session state key holding the last reported map view
+VIEWPORT_STATE_KEY = "lod_viewport"
+
+def viewport_key(bounds: Bounds, zoom: int) -> tuple:
+    """
+    Identify the data a viewport needs: its resolution and covering tiles
+    """
+    return choose_resolution(bounds, get_hex_budget()), tuple(viewport_tiles(bounds, zoom))
+
+def plot_h3_viewport_map(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]], color_by: str, initial_bounds: Bounds):
+    """
+    Plot an H3 map whose resolution and extent follow the map viewport
+    
+    The map reports its bounds and zoom back through st_folium. When the
+    viewport needs different tiles or a different resolution, the app reruns
+    and loads hexagons for the new view only.
+    
+    Args:
+        highway_authorities: Highway authorities to include
+        table_names: Month tables to include
+        selected_categories: List of normalized work categories to include
+        color_by: Column to use for color coding ('work_count' or 'unique_permits')
+        initial_bounds: Bounds to show before the map has reported a viewport
+    """
+    try:
+        stored = st.session_state.get(VIEWPORT_STATE_KEY)
+        
+        if stored is None:
+            # Until the map reports its view, show the whole extent
+            bounds, zoom = initial_bounds, zoom_for_bounds(initial_bounds)
+            location, zoom_start = None, None
+        else:
+            bounds, zoom, location = stored
+            zoom_start = zoom
+        
+        grid, resolution = create_h3_viewport_grid(highway_authorities, table_names, selected_categories, bounds, zoom)
+        st.caption(f"Showing {len(grid)} hexagons at resolution {resolution} for the current view. Pan or zoom to load more detail.")
+        
+        if grid.empty:
+            m = folium.Map(tiles="cartodbpositron", location=location, zoom_start=zoom_start)
+            if location is None:
+                m.fit_bounds([list(bounds[0]), list(bounds[1])])
+        else:
+            m = build_h3_map(grid, color_by, location=location, zoom_start=zoom_start)
+        
+        with span("map.render"):
+            map_state = st_folium(m, key="lod_map", height=600, use_container_width=True, returned_objects=["bounds", "zoom", "center"])
+        
+        viewport = parse_folium_viewport(map_state)
+        if viewport is None:
+            return
+        
+        new_bounds, new_zoom = viewport
+        center = map_state.get("center") or {}
+        new_location = [center.get("lat", (new_bounds[0][0] + new_bounds[1][0]) / 2), center.get("lng", (new_bounds[0][1] + new_bounds[1][1]) / 2)]
+        
+        # Only rerun when the view needs different hexagons
+        if stored is None or viewport_key(new_bounds, new_zoom) != viewport_key(bounds, zoom):
+            st.session_state[VIEWPORT_STATE_KEY] = (new_bounds, new_zoom, new_location)
+            st.rerun()
+        
+    except Exception as e:
+        logger.error(f"Error plotting viewport H3 map: {e}")
+        raise
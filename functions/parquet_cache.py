@@ -0,0 +1,336 @@
+import json
+import os
+import shutil
+import threading
+import time
+import duckdb
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from .geo_prep import GEOMETRY_SQL, GEOMETRY_WKB_COLUMN, GEOMETRY_WKB_SQL, WKT_COLUMN
+from .settings import get_setting, get_bool_setting
+from .tracing import span
+
+# Default location and size budget for the local mirror
+DEFAULT_CACHE_DIR = ".cache/parquet"
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Seconds a mirror is trusted before its remote row count is checked again
+DEFAULT_VERIFY_SECONDS = 600.0
+
+MANIFEST_NAME = "manifest.json"
+
+# GeoParquet column holding each work's geometry, 2D in EPSG:4326
+MIRROR_GEOMETRY_COLUMN = "geometry"
+
+# Access times of cache hits are written to the manifest at most this often
+ACCESS_FLUSH_SECONDS = 60.0
+
+# Guards the manifest, and the mirror directory of each table verified in
+# this process with when it was verified
+_lock = threading.Lock()
+_verified_tables: Dict[str, Tuple[float, Path]] = {}
+_table_locks: Dict[str, threading.Lock] = {}
+_pruned = False
+
+# Access times not yet written to the manifest, and when they were last written
+_pending_access: Dict[str, float] = {}
+_last_access_flush = 0.0
+
+def cache_enabled() -> bool:
+    """
+    Whether month tables should be mirrored to local parquet
+    """
+    return get_bool_setting("parquet_cache", True)
+
+def get_cache_dir() -> Path:
+    """
+    Root directory of the local mirror
+    """
+    return Path(get_setting("parquet_cache_dir", DEFAULT_CACHE_DIR))
+
+def get_cache_max_bytes() -> int:
+    """
+    Size budget for the local mirror, in bytes
+    """
+    return int(get_setting("parquet_cache_max_bytes", DEFAULT_CACHE_MAX_BYTES))
+
+def get_verify_seconds() -> float:
+    """
+    Seconds between freshness checks of a mirrored table, from the parquet_cache_verify_seconds setting
+    """
+    return float(get_setting("parquet_cache_verify_seconds", DEFAULT_VERIFY_SECONDS))
+
+def table_cache_dir(schema: str, table_name: str) -> Path:
+    """
+    Directory holding every mirrored version of one (schema, table)
+    """
+    return get_cache_dir() / schema / table_name
+
+def mirror_dir(entry: dict) -> Optional[Path]:
+    """
+    Directory of the GeoParquet files a manifest entry points to
+    """
+    return get_cache_dir() / entry["path"] if "path" in entry else None
+
+def read_manifest() -> Dict[str, dict]:
+    """
+    Load the manifest describing every cached table
+    """
+    manifest_path = get_cache_dir() / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable parquet cache manifest: {e}")
+        return {}
+
+def write_manifest(manifest: Dict[str, dict]) -> None:
+    """
+    Atomically replace the manifest
+    """
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_dir / f"{MANIFEST_NAME}.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, cache_dir / MANIFEST_NAME)
+
+def directory_size(path: Path) -> int:
+    """
+    Total size in bytes of all files under a directory
+    """
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+def parquet_source(path: Path) -> str:
+    """
+    SQL relation reading a mirrored table with partition pruning on highway_authority
+
+    The stored geometry is returned as WKB in the GEOMETRY_WKB_COLUMN the
+    batched query reads, so it is not decoded from WKT again.
+    """
+    glob = (path / "*" / "*.parquet").as_posix()
+    return f"""(
+            SELECT * EXCLUDE ({MIRROR_GEOMETRY_COLUMN}), ST_AsWKB({MIRROR_GEOMETRY_COLUMN}) as {GEOMETRY_WKB_COLUMN}
+            FROM read_parquet('{glob}', hive_partitioning = true, hive_types = {{'highway_authority': VARCHAR}})
+        )"""
+
+def remote_source(schema: str, table_name: str) -> str:
+    """
+    SQL relation reading a remote month table with the geometry columns of a mirror
+
+    The WKT is decoded server-side into GEOMETRY_WKB_COLUMN; queries that do
+    not select it skip the decoding.
+    """
+    return f"""(
+            SELECT *, {GEOMETRY_WKB_SQL}
+            FROM {schema}."{table_name}"
+        )"""
+
+def remote_row_count(con: duckdb.DuckDBPyConnection, schema: str, table_name: str) -> int:
+    """
+    Row count of the remote table, used as its freshness token
+    """
+    row = con.execute(f'SELECT COUNT(*) FROM {schema}."{table_name}"').fetchone()
+    return int(row[0]) if row else 0
+
+def write_table_cache(con: duckdb.DuckDBPyConnection, schema: str, table_name: str) -> Tuple[Path, int]:
+    """
+    Copy the completed WORK_STOP rows of a remote table to GeoParquet partitioned by highway_authority
+
+    The WKT is decoded once into a WKB geometry column with GeoParquet
+    metadata, which replaces it. Each copy goes to a new directory, so queries
+    still reading an older copy are not disturbed; older copies are removed by
+    prune_cache.
+
+    Returns:
+        Directory of the written files and their size in bytes
+    """
+    table_dir = table_cache_dir(schema, table_name)
+    target_dir = table_dir / f"v{time.time_ns()}"
+    tmp_dir = table_dir / f"{target_dir.name}.{os.getpid()}.tmp"
+    table_dir.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary directory first so readers never see a partial copy
+    con.execute(f"""
+    COPY (
+        SELECT * EXCLUDE ({WKT_COLUMN}), {GEOMETRY_SQL} as {MIRROR_GEOMETRY_COLUMN}
+        FROM {schema}."{table_name}"
+        WHERE work_status_ref = 'completed'
+        AND event_type = 'WORK_STOP'
+    ) TO '{tmp_dir.as_posix()}' (FORMAT parquet, PARTITION_BY (highway_authority), COMPRESSION zstd)
+    """)
+
+    os.replace(tmp_dir, target_dir)
+    return target_dir, directory_size(target_dir)
+
+def evict(manifest: Dict[str, dict]) -> None:
+    """
+    Drop least recently used tables from the manifest until the mirror fits its size budget
+
+    Their directories are removed by prune_cache along with the other
+    directories the manifest no longer points to.
+    """
+    max_bytes = get_cache_max_bytes()
+    total_bytes = sum(entry["bytes"] for entry in manifest.values())
+    by_last_access = sorted(manifest.items(), key=lambda item: item[1]["last_access"])
+
+    for key, entry in by_last_access:
+        if total_bytes <= max_bytes:
+            break
+        total_bytes -= entry["bytes"]
+        del manifest[key]
+        logger.info(f"Evicted {key} from parquet cache ({entry['bytes']} bytes)")
+
+def prune_cache() -> None:
+    """
+    Evict tables over the size budget and remove every directory the manifest does not point to
+
+    Runs once per process, before the first table source is handed out, so a
+    directory is never removed while a query of this process reads it. Copies
+    replaced or evicted later in the process are removed by the next process.
+
+    Must be called with _lock held.
+    """
+    global _pruned
+    if _pruned:
+        return
+    _pruned = True
+
+    manifest = read_manifest()
+    evict(manifest)
+    write_manifest(manifest)
+
+    referenced = {mirror_dir(entry) for entry in manifest.values()}
+    for table_dir in get_cache_dir().glob("*/*"):
+        if not table_dir.is_dir():
+            continue
+        for path in table_dir.iterdir():
+            if path not in referenced:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed unused parquet cache directory {path}")
+
+def record_access(key: str) -> None:
+    """
+    Note a cache hit, writing pending access times to the manifest at most every ACCESS_FLUSH_SECONDS
+
+    Must be called with _lock held.
+    """
+    _pending_access[key] = time.time()
+    if time.time() - _last_access_flush >= ACCESS_FLUSH_SECONDS:
+        manifest = read_manifest()
+        apply_pending_access(manifest)
+        write_manifest(manifest)
+
+def apply_pending_access(manifest: Dict[str, dict]) -> None:
+    """
+    Copy pending access times into a manifest about to be written
+
+    Must be called with _lock held.
+    """
+    global _last_access_flush
+    for key, accessed_at in _pending_access.items():
+        if key in manifest:
+            manifest[key]["last_access"] = max(manifest[key]["last_access"], accessed_at)
+    _pending_access.clear()
+    _last_access_flush = time.time()
+
+def table_lock(key: str) -> threading.Lock:
+    """
+    Lock serialising freshness checks and copies of one table
+    """
+    with _lock:
+        return _table_locks.setdefault(key, threading.Lock())
+
+def get_table_source(con: duckdb.DuckDBPyConnection, schema: str, table_name: str) -> str:
+    """
+    Return the SQL relation to read a month table from, mirroring it locally if needed
+
+    A mirror is trusted for parquet_cache_verify_seconds, then checked against
+    the remote row count again, so months appended remotely are picked up by
+    a long-running server. If the remote table cannot be reached, an existing
+    local copy is used as-is. Falls back to the remote table when caching is
+    disabled or fails. Different tables can be checked and copied concurrently
+    from separate cursors.
+    """
+    if not cache_enabled():
+        return remote_source(schema, table_name)
+
+    key = f"{schema}.{table_name}"
+    with span("parquet_cache.source", table=key) as record, table_lock(key):
+        with _lock:
+            prune_cache()
+            verified_at, path = _verified_tables.get(key, (0.0, None))
+            if path is not None and time.time() - verified_at < get_verify_seconds() and path.exists():
+                record["cache"] = "hit"
+                record_access(key)
+                return parquet_source(path)
+
+            manifest = read_manifest()
+            entry = manifest.get(key)
+            path = mirror_dir(entry) if entry is not None else None
+            cached = path is not None and path.exists()
+
+        try:
+            row_count = remote_row_count(con, schema, table_name)
+        except duckdb.Error as quack:
+            if cached:
+                logger.warning(f"Could not check freshness of {key}, using local copy: {quack}")
+                record["cache"] = "hit"
+                return parquet_source(path)
+            logger.warning(f"Could not reach {key} to cache it: {quack}")
+            record["cache"] = "bypass"
+            return remote_source(schema, table_name)
+
+        if cached and entry["row_count"] == row_count:
+            logger.info(f"Parquet cache hit for {key}")
+            record["cache"] = "hit"
+        else:
+            try:
+                logger.info(f"Parquet cache miss for {key}, mirroring {row_count} rows")
+                path, size = write_table_cache(con, schema, table_name)
+            except (duckdb.Error, OSError) as e:
+                logger.warning(f"Could not mirror {key} to parquet, reading remotely: {e}")
+                record["cache"] = "bypass"
+                return remote_source(schema, table_name)
+            entry = {
+                "schema": schema,
+                "table": table_name,
+                "path": path.relative_to(get_cache_dir()).as_posix(),
+                "row_count": row_count,
+                "bytes": size,
+            }
+            record.update(cache="miss", rows=row_count, bytes=size)
+
+        with _lock:
+            # Re-read the manifest, other tables may have been written meanwhile
+            manifest = read_manifest()
+            apply_pending_access(manifest)
+            entry["last_access"] = time.time()
+            manifest[key] = entry
+            write_manifest(manifest)
+            _verified_tables[key] = (time.time(), path)
+            total_bytes = sum(item["bytes"] for item in manifest.values())
+            if total_bytes > get_cache_max_bytes():
+                logger.info(f"Parquet cache holds {total_bytes} bytes, over budget until it is pruned at the next start")
+        return parquet_source(path)
+
+def get_table_sources(con: duckdb.DuckDBPyConnection, schema: str, table_names: List[str]) -> Dict[str, str]:
+    """
+    Map each month table to the SQL relation it should be read from
+    """
+    return {table_name: get_table_source(con, schema, table_name) for table_name in table_names}
+
+def clear_cache(schema: Optional[str] = None) -> None:
+    """
+    Remove cached tables, either for one schema or entirely
+    """
+    with _lock:
+        manifest = read_manifest()
+        for key, entry in list(manifest.items()):
+            if schema is None or entry["schema"] == schema:
+                shutil.rmtree(table_cache_dir(entry["schema"], entry["table"]), ignore_errors=True)
+                del manifest[key]
+                _verified_tables.pop(key, None)
+        write_manifest(manifest)
@@ -0,0 +1,165 @@
+import math
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from typing import NamedTuple, Optional
+
+from loguru import logger
+from .map_layers import DEFAULT_COORDINATE_PRECISION
+from .settings import get_setting
+from .viewport_lod import Bounds
+
+# Point works above this count in a view are drawn as clusters
+DEFAULT_CLUSTER_THRESHOLD = 5000
+
+# Upper bound for the GeoJSON sent to the browser for one view
+DEFAULT_RAW_MAP_MAX_BYTES = 5 * 1024 ** 2
+
+# Web mercator tile size, and the size of a cluster cell on screen, in pixels
+TILE_SIZE_PX = 256
+CLUSTER_CELL_PX = 64
+
+# Approximate GeoJSON size of a work's properties and framing, and of a cluster
+FEATURE_OVERHEAD_BYTES = 220
+CLUSTER_FEATURE_BYTES = 120
+
+class RawMapLayers(NamedTuple):
+    """
+    What the Points/Lines map draws for one view
+    """
+    features: gpd.GeoDataFrame  # Works drawn individually, simplified
+    clusters: pd.DataFrame      # latitude, longitude and count of each cluster
+    precision: int              # Decimal places kept in coordinates
+    estimated_bytes: int        # Estimated GeoJSON payload
+
+def get_cluster_threshold() -> int:
+    """
+    Point works in a view above which they are clustered
+    """
+    return int(get_setting("raw_cluster_threshold", DEFAULT_CLUSTER_THRESHOLD))
+
+def get_raw_map_max_bytes() -> int:
+    """
+    Upper bound for the GeoJSON payload of one view
+    """
+    return int(get_setting("raw_map_max_bytes", DEFAULT_RAW_MAP_MAX_BYTES))
+
+def degrees_per_pixel(zoom: int) -> float:
+    """
+    Longitude span of one screen pixel at a web mercator zoom level
+    """
+    return 360.0 / (TILE_SIZE_PX * 2 ** zoom)
+
+def coordinate_precision(zoom: int) -> int:
+    """
+    Fewest decimal places that keep coordinate rounding under half a pixel
+    """
+    decimals = math.ceil(-math.log10(degrees_per_pixel(zoom) / 2))
+    return max(2, min(DEFAULT_COORDINATE_PRECISION, decimals))
+
+def expand_bounds(bounds: Bounds, margin: float = 0.5) -> Bounds:
+    """
+    Bounds grown on every side by a fraction of their height and width
+    """
+    (south, west), (north, east) = bounds
+    dlat, dlng = (north - south) * margin, (east - west) * margin
+    return (south - dlat, west - dlng), (north + dlat, east + dlng)
+
+def contains_bounds(outer: Bounds, inner: Bounds) -> bool:
+    """
+    Whether the inner bounds lie entirely within the outer bounds
+    """
+    (outer_south, outer_west), (outer_north, outer_east) = outer
+    (south, west), (north, east) = inner
+    return outer_south <= south and outer_west <= west and north <= outer_north and east <= outer_east
+
+def intersects_bounds(geometries: np.ndarray, bounds: Bounds) -> np.ndarray:
+    """
+    Whether each geometry's bounding box overlaps the bounds
+    """
+    (south, west), (north, east) = bounds
+    boxes = shapely.bounds(geometries)
+    return (boxes[:, 0] <= east) & (boxes[:, 2] >= west) & (boxes[:, 1] <= north) & (boxes[:, 3] >= south)
+
+def estimate_geojson_bytes(geometries: np.ndarray, precision: int) -> int:
+    """
+    Approximate GeoJSON size of geometries drawn as individual features
+    """
+    # Each coordinate pair is two numbers of about precision + 4 characters plus brackets
+    coordinate_bytes = 2 * (precision + 4) + 4
+    return int(shapely.get_num_coordinates(geometries).sum()) * coordinate_bytes + len(geometries) * FEATURE_OVERHEAD_BYTES
+
+def cluster_points(x: np.ndarray, y: np.ndarray, cell_degrees: float) -> pd.DataFrame:
+    """
+    Bucket longitude/latitude points into a square grid
+
+    Returns:
+        DataFrame with the mean latitude and longitude and the count of each
+        non-empty grid cell
+    """
+    if len(x) == 0:
+        return pd.DataFrame(columns=['latitude', 'longitude', 'count'])
+    column = np.floor(x / cell_degrees).astype(np.int64)
+    row = np.floor(y / cell_degrees).astype(np.int64)
+    row -= row.min()
+    # One integer key per grid cell, so the grouping is a 1-D unique
+    keys = (column - column.min()) * (row.max() + 1) + row
+    _, cluster, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return pd.DataFrame({
+        'latitude': np.bincount(cluster, weights=y) / counts,
+        'longitude': np.bincount(cluster, weights=x) / counts,
+        'count': counts,
+    })
+
+def prepare_raw_layers(geodf: gpd.GeoDataFrame, bounds: Bounds, zoom: int, cluster_threshold: Optional[int] = None, max_bytes: Optional[int] = None) -> RawMapLayers:
+    """
+    Reduce the works in a view to a payload the browser can draw
+
+    Works outside the bounds are dropped, lines are simplified with a
+    tolerance of one screen pixel and coordinates are rounded to match. Point
+    works are clustered when there are more than cluster_threshold of them.
+    If the payload is still over max_bytes, lines are clustered too and the
+    clusters are coarsened until it fits. Zooming in shrinks both the
+    tolerance and the clusters, so clusters expand into their works.
+
+    Args:
+        geodf: Works in EPSG:4326
+        bounds: Area to draw, usually the viewport with a margin
+        zoom: Web mercator zoom level of the view
+        cluster_threshold: Defaults to the raw_cluster_threshold setting
+        max_bytes: Defaults to the raw_map_max_bytes setting
+    """
+    cluster_threshold = cluster_threshold or get_cluster_threshold()
+    max_bytes = max_bytes or get_raw_map_max_bytes()
+
+    geometries = np.asarray(geodf.geometry.values)
+    valid = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    valid[valid] = intersects_bounds(geometries[valid], bounds)
+    frame, geometries = geodf[valid], geometries[valid]
+
+    tolerance = degrees_per_pixel(zoom)
+    precision = coordinate_precision(zoom)
+    is_point = np.isin(shapely.get_type_id(geometries), [shapely.GeometryType.POINT, shapely.GeometryType.MULTIPOINT])
+    geometries[~is_point] = shapely.simplify(geometries[~is_point], tolerance)
+
+    # Works are clustered by their centroid
+    centroids = shapely.centroid(geometries)
+    x, y = shapely.get_x(centroids), shapely.get_y(centroids)
+    clustered = is_point if is_point.sum() > cluster_threshold else np.zeros(len(geometries), dtype=bool)
+    cell_degrees = CLUSTER_CELL_PX * tolerance
+
+    while True:
+        clusters = cluster_points(x[clustered], y[clustered], cell_degrees)
+        estimated_bytes = estimate_geojson_bytes(geometries[~clustered], precision) + len(clusters) * CLUSTER_FEATURE_BYTES
+        if estimated_bytes <= max_bytes or (clustered.all() and len(clusters) == 1):
+            break
+        if not clustered.all():
+            # Lines are clustered only when points alone do not bring the payload down
+            clustered = np.ones(len(geometries), dtype=bool)
+        else:
+            cell_degrees *= 2
+
+    features = frame[~clustered].set_geometry(gpd.GeoSeries(geometries[~clustered], index=frame.index[~clustered], crs=geodf.crs))
+    logger.info(f"Raw map at zoom {zoom}: {len(features)} works and {len(clusters)} clusters, about {estimated_bytes / 1024:.0f}KB")
+    return RawMapLayers(features, clusters, precision, estimated_bytes)
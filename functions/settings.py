@@ -0,0 +1,40 @@
+import os
+import streamlit as st
+from typing import Any, Optional
+
+def get_setting(name: str, default: Optional[Any] = None) -> Any:
+    """
+    Look up a configuration value
+
+    An environment variable named NWG_<NAME> takes precedence over st.secrets,
+    so settings can be supplied without a secrets file
+    """
+    env_value = os.environ.get(f"NWG_{name.upper()}")
+    if env_value is not None:
+        return env_value
+
+    try:
+        return st.secrets[name]
+    except (KeyError, FileNotFoundError):
+        return default
+
+def get_bool_setting(name: str, default: bool) -> bool:
+    """
+    Look up a boolean configuration value, accepting true/false style strings
+    """
+    value = get_setting(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+def get_required_setting(name: str) -> Any:
+    """
+    Look up a configuration value that must be set
+
+    Raises:
+        KeyError: If the value is neither in the environment nor in st.secrets
+    """
+    value = get_setting(name)
+    if value is None:
+        raise KeyError(name)
+    return value
@@ -0,0 +1,137 @@
+import functools
+import inspect
+import threading
+import pandas as pd
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from loguru import logger
+from .tracing import span
+
+# Arguments whose order does not change the result
+DEFAULT_UNORDERED_ARGUMENTS = ("selected_categories",)
+
+class Flight:
+    """
+    One in-flight call, and its outcome once the leader has finished
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+
+    The first caller for a key computes the result and callers arriving while
+    it runs wait for it instead of repeating the work. Nothing is kept once the
+    call returns, so results are only shared between overlapping calls; caching
+    is left to st.cache_data and the frame cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Compute the value for a key, or wait for the call already computing it
+
+        Waiters get their own copy of a DataFrame result, so one session
+        cannot change the frame another is using. An error raised by the
+        leader is raised in every waiter too.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            with span("single_flight.wait", cache="coalesced"):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.copy() if isinstance(flight.result, pd.DataFrame) else flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            if flight.waiters:
+                logger.info(f"Shared {key[0]} with {flight.waiters} concurrent callers")
+            flight.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Calls computed, calls that waited on another, and calls in flight
+        """
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+_flights = SingleFlight()
+
+def normalise_argument(value: Any, unordered: bool = False) -> Hashable:
+    """
+    Hashable form of an argument, so equal selections give equal keys
+
+    Lists become tuples, and unordered arguments become frozensets, with None
+    and an empty list both meaning no selection.
+    """
+    if unordered:
+        return frozenset(value or ())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalise_argument(item) for item in value)
+    return value
+
+def call_key(func: Callable, signature: inspect.Signature, args: tuple, kwargs: dict, unordered: Iterable[str]) -> Hashable:
+    """
+    Key identifying a call regardless of how its arguments were passed
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return (func.__qualname__,) + tuple(
+        (name, normalise_argument(value, name in unordered)) for name, value in bound.arguments.items()
+    )
+
+def single_flight(func: Optional[Callable] = None, *, unordered: Iterable[str] = DEFAULT_UNORDERED_ARGUMENTS) -> Callable:
+    """
+    Decorator coalescing concurrent calls with the same arguments into one
+
+    Place it under @st.cache_data, so concurrent cache misses for the same
+    selection compute once and every caller gets the result.
+
+    Args:
+        unordered: Names of list arguments compared as sets, such as category selections
+    """
+    unordered = frozenset(unordered)
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = call_key(func, signature, args, kwargs, unordered)
+            return _flights.do(key, lambda: func(*args, **kwargs))
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
+def get_single_flight_stats() -> Dict[str, int]:
+    """
+    Process-wide counts of computed and coalesced calls
+    """
+    return _flights.stats()
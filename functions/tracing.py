@@ -0,0 +1,146 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+import pandas as pd
+import streamlit as st
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+from .settings import get_setting
+
+# Spans recorded for the current request, and the stack of open spans
+_trace: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("trace", default=None)
+_open_spans: ContextVar[tuple] = ContextVar("open_spans", default=())
+
+@contextmanager
+def span(name: str, cache_check: bool = False, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time one pipeline stage and emit it as a structured log record
+
+    The yielded dict can be filled in with rows, bytes or cache ("hit"/"miss")
+    while the stage runs. Spans opened inside the stage are nested under it.
+
+    Args:
+        name: Stage name, e.g. "fetch.arrow"
+        cache_check: Mark the span as a cache hit when no nested span ran, for
+            wrapping calls to cached functions that are themselves instrumented
+        fields: Initial values for the record
+    """
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"span": name, "depth": len(_open_spans.get()), "children": 0, "started_at": start, **fields}
+    token = _open_spans.set(_open_spans.get() + (record,))
+    try:
+        yield record
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _open_spans.reset(token)
+        parents = _open_spans.get()
+        if parents:
+            parents[-1]["children"] += 1
+        if cache_check and "cache" not in record:
+            record["cache"] = "miss" if record["children"] else "hit"
+
+        details = " ".join(f"{key}={record[key]}" for key in ("rows", "bytes", "cache") if record.get(key) is not None)
+        logger.bind(**record).info(f"{name} took {record['duration_ms']:.1f}ms {details}".rstrip())
+
+        trace = _trace.get()
+        if trace is not None:
+            trace.append(record)
+
+def traced(name: str) -> Callable:
+    """
+    Decorator running a function inside a span and recording the length of its result as rows
+
+    Under st.cache_data the span only runs on a cache miss.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    record["rows"] = len(result)
+                return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def trace_request() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collect every span recorded while handling one request
+
+    Yields the list the span records are appended to, in completion order.
+    """
+    records: List[Dict[str, Any]] = []
+    token = _trace.set(records)
+    try:
+        yield records
+    finally:
+        _trace.reset(token)
+
+def timing_breakdown(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Span records as a table in start order, with stage names indented by nesting depth
+    """
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame(records).sort_values('started_at', kind='stable')
+    df['stage'] = ['  ' * depth + name for depth, name in zip(df['depth'], df['span'])]
+    columns = ['stage', 'duration_ms'] + [c for c in ('rows', 'bytes', 'cache') if c in df.columns]
+    return df[columns].reset_index(drop=True)
+
+def show_timing_breakdown(records: List[Dict[str, Any]]) -> None:
+    """
+    Display the spans of a request in a collapsible section
+    """
+    with st.expander("Timing breakdown"):
+        st.dataframe(timing_breakdown(records), use_container_width=True)
+
+@contextmanager
+def profile_request(profiler: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """
+    Profile one request with cProfile or pyinstrument
+
+    Args:
+        profiler: "cprofile" or "pyinstrument", defaults to the profiler setting;
+            profiling is off when neither is set
+
+    Yields:
+        Dict whose "report" entry holds the text report once the block exits
+    """
+    profiler = profiler or get_setting("profiler")
+    result: Dict[str, str] = {}
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed, profiling with cProfile instead")
+            profiler = "cprofile"
+        else:
+            sampler = Profiler()
+            sampler.start()
+            try:
+                yield result
+            finally:
+                sampler.stop()
+                result["report"] = sampler.output_text(unicode=True)
+            return
+
+    if profiler == "cprofile":
+        tracer = cProfile.Profile()
+        tracer.enable()
+        try:
+            yield result
+        finally:
+            tracer.disable()
+            stream = io.StringIO()
+            pstats.Stats(tracer, stream=stream).sort_stats("cumulative").print_stats(40)
+            result["report"] = stream.getvalue()
+        return
+
+    yield result
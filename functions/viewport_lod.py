@@ -0,0 +1,208 @@
+import math
+import geopandas as gpd
+import pandas as pd
+import streamlit as st
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from .duckdb_engine import local_cursor
+from .fetch_data import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+from .h3_processing import (
+    PYRAMID_COARSEST_RESOLUTION,
+    PYRAMID_FINEST_RESOLUTION,
+    create_h3_pyramid_batch,
+    h3_grid_from_pyramid,
+)
+from .settings import get_setting
+from .single_flight import single_flight
+
+# Average H3 hexagon area in km² per resolution
+H3_HEX_AREA_KM2 = {
+    6: 36.129,
+    7: 5.161,
+    8: 0.737,
+    9: 0.105,
+    10: 0.0150,
+    11: 0.00215,
+}
+
+DEFAULT_HEX_BUDGET = 5000
+
+# Tile grids kept per process; a viewport covers a few tiles, so this holds
+# the tiles of several recent views across sessions
+TILE_CACHE_MAX_ENTRIES = 128
+
+# Bounds are ((south, west), (north, east)) in EPSG:4326
+Bounds = Tuple[Tuple[float, float], Tuple[float, float]]
+
+def get_hex_budget() -> int:
+    """
+    Maximum number of hexagons a viewport should request
+    """
+    return int(get_setting("lod_hex_budget", DEFAULT_HEX_BUDGET))
+
+def bounds_area_km2(bounds: Bounds) -> float:
+    """
+    Approximate area of a lat/lng bounding box in km²
+    """
+    (south, west), (north, east) = bounds
+    mean_lat = math.radians((south + north) / 2)
+    height_km = (north - south) * 111.32
+    width_km = (east - west) * 111.32 * math.cos(mean_lat)
+    return abs(height_km * width_km)
+
+def choose_resolution(bounds: Bounds, hex_budget: int) -> int:
+    """
+    Pick the finest pyramid resolution whose hexagons covering the bounds fit the budget
+    """
+    area = bounds_area_km2(bounds)
+    for resolution in range(PYRAMID_FINEST_RESOLUTION, PYRAMID_COARSEST_RESOLUTION - 1, -1):
+        if area / H3_HEX_AREA_KM2[resolution] <= hex_budget:
+            return resolution
+    return PYRAMID_COARSEST_RESOLUTION
+
+def lng_to_tile_x(lng: float, zoom: int) -> int:
+    """
+    Web mercator tile column containing a longitude
+    """
+    return int((lng + 180.0) / 360.0 * (1 << zoom))
+
+def lat_to_tile_y(lat: float, zoom: int) -> int:
+    """
+    Web mercator tile row containing a latitude
+    """
+    lat_rad = math.radians(max(min(lat, 85.0511), -85.0511))
+    return int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * (1 << zoom))
+
+def tile_bounds(zoom: int, x: int, y: int) -> Bounds:
+    """
+    Bounds of a web mercator (slippy map) tile
+    """
+    n = 1 << zoom
+
+    def tile_lat(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    return (tile_lat(y + 1), west), (tile_lat(y), east)
+
+def viewport_tiles(bounds: Bounds, zoom: int) -> List[Tuple[int, int, int]]:
+    """
+    Web mercator tiles at the map zoom level covering the bounds
+    """
+    (south, west), (north, east) = bounds
+    zoom = max(0, min(int(zoom), 18))
+    x_min, x_max = lng_to_tile_x(west, zoom), lng_to_tile_x(east, zoom)
+    y_min, y_max = lat_to_tile_y(north, zoom), lat_to_tile_y(south, zoom)
+    return [(zoom, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+def zoom_for_bounds(bounds: Bounds, tiles_across: int = 3) -> int:
+    """
+    Web mercator zoom at which the bounds span roughly tiles_across tiles
+    """
+    (_, west), (_, east) = bounds
+    lng_span = max(east - west, 1e-6)
+    return max(0, min(18, int(math.log2(360.0 * tiles_across / lng_span))))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+@single_flight
+def create_h3_level_partials(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]], resolution: int) -> pd.DataFrame:
+    """
+    Pyramid rows at one resolution with the centre of each cell
+
+    Centres are looked up once per selection and resolution, so tiles are cut
+    from these rows without another pass over the pyramid.
+
+    Returns:
+        Pyramid rows at the resolution with cell_lat and cell_lng columns
+    """
+    pyramid = create_h3_pyramid_batch(highway_authorities, table_names, selected_categories)
+    if pyramid.empty:
+        return pd.DataFrame()
+
+    level = pyramid[pyramid['resolution'] == resolution].reset_index(drop=True)
+    if level.empty:
+        return level
+
+    with local_cursor() as con:
+        con.register('level_cells', level[['cell']])
+        centres = con.execute("""
+        SELECT h3_cell_to_lat(cell) as cell_lat, h3_cell_to_lng(cell) as cell_lng
+        FROM level_cells
+        """).fetchnumpy()
+    return level.assign(cell_lat=centres['cell_lat'], cell_lng=centres['cell_lng'])
+
+@st.cache_data(max_entries=TILE_CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+def create_h3_tile_grid(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]], resolution: int, zoom: int, x: int, y: int) -> gpd.GeoDataFrame:
+    """
+    Hexagons at one resolution whose centres fall inside one map tile
+
+    Cells are assigned to the tile containing their centre, so neighbouring
+    tiles never return the same cell.
+    """
+    level = create_h3_level_partials(highway_authorities, table_names, selected_categories, resolution)
+    if level.empty:
+        return gpd.GeoDataFrame()
+
+    (south, west), (north, east) = tile_bounds(zoom, x, y)
+    in_tile = (
+        (level['cell_lat'] >= south) & (level['cell_lat'] < north)
+        & (level['cell_lng'] >= west) & (level['cell_lng'] < east)
+    )
+    tile_partials = level.loc[in_tile.to_numpy()].drop(columns=['cell_lat', 'cell_lng'])
+
+    if tile_partials.empty:
+        return gpd.GeoDataFrame()
+    return h3_grid_from_pyramid(tile_partials, resolution, f"tile {zoom}/{x}/{y}")
+
+def create_h3_viewport_grid(highway_authorities: List[str], table_names: List[str], selected_categories: Optional[List[str]], bounds: Bounds, zoom: int, hex_budget: Optional[int] = None) -> Tuple[gpd.GeoDataFrame, int]:
+    """
+    Hexagons covering a map viewport at a resolution chosen from the hexagon budget
+
+    Only the tiles covering the viewport are cut and given boundaries. They
+    are cut from the selection's pyramid, which is built once per selection
+    (or read from the hex summary) and shared with the other H3 views, rather
+    than aggregated per viewport: the first view costs one pyramid build, and
+    later pans and zooms only look up rows.
+
+    Returns:
+        Tuple of the hexagon grid for the viewport and the resolution used
+    """
+    resolution = choose_resolution(bounds, hex_budget or get_hex_budget())
+    tiles = viewport_tiles(bounds, zoom)
+
+    tile_grids = [
+        create_h3_tile_grid(highway_authorities, table_names, selected_categories, resolution, *tile)
+        for tile in tiles
+    ]
+    tile_grids = [grid for grid in tile_grids if not grid.empty]
+
+    logger.info(f"Viewport at zoom {zoom} covers {len(tiles)} tiles at resolution {resolution}")
+    if not tile_grids:
+        return gpd.GeoDataFrame(), resolution
+
+    grid = pd.concat(tile_grids, ignore_index=True)
+    return gpd.GeoDataFrame(grid, geometry='geometry', crs="EPSG:4326"), resolution # type: ignore
+
+def pyramid_bounds(pyramid: pd.DataFrame) -> Bounds:
+    """
+    Bounds of the finest cell centres in an H3 pyramid
+    """
+    finest = pyramid[pyramid['resolution'] == pyramid['resolution'].max()]
+    lats = finest['lat_sum'] / finest['work_count']
+    lngs = finest['lng_sum'] / finest['work_count']
+    return (lats.min(), lngs.min()), (lats.max(), lngs.max())
+
+def parse_folium_viewport(map_state: Optional[Dict]) -> Optional[Tuple[Bounds, int]]:
+    """
+    Extract bounds and zoom from the state returned by st_folium
+    """
+    if not map_state or not map_state.get("bounds") or map_state.get("zoom") is None:
+        return None
+    south_west = map_state["bounds"].get("_southWest") or {}
+    north_east = map_state["bounds"].get("_northEast") or {}
+    if south_west.get("lat") is None or north_east.get("lat") is None:
+        return None
+    bounds = (south_west["lat"], south_west["lng"]), (north_east["lat"], north_east["lng"])
+    return bounds, int(map_state["zoom"])
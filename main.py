@@ -1,10 +1,25 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-from functions.fetch_data import fetch_data, fetch_all_authorities_data
-from functions.map_prep_england import plot_map_england
-from functions.h3_processing import create_h3_hex_grid, create_h3_hex_grid_all_authorities, get_h3_resolution_info
+from functions.fetch_data import fetch_batch_data, fetch_missing_frames, month_table_sort_key, prepare_table_sources
+from functions.connection_pool import get_connection_pool
+from functions.frame_cache import get_frame_cache
+from functions.hex_boundaries import get_boundary_store
+from functions.map_prep_england import plot_map_england, RAW_VIEWPORT_STATE_KEY
+from functions.h3_processing import create_h3_pyramid_batch, create_h3_hex_grid_batch, create_h3_line_grid_batch, create_h3_cell_values_batch, create_h3_hex_grid_remote, get_h3_resolution_info
 from functions.map_prep_h3 import plot_h3_map
+from functions.hotspots import add_hotspot_scores
+from functions.map_prep_deck import plot_h3_deck
+from functions.map_prep_viewport import plot_h3_viewport_map, VIEWPORT_STATE_KEY
+from functions.hex_summary import month_display_name, summary_covers, summary_month_tables, summary_record_counts
+from functions.viewport_lod import pyramid_bounds
+from functions.tracing import span, trace_request, profile_request, show_timing_breakdown
+from functions.settings import get_bool_setting
+
+# Session state key holding the selection shown by the viewport map
+LOD_SELECTION_KEY = "lod_selection"
+
+# Session state key holding the selection shown by the Points/Lines map
+RAW_SELECTION_KEY = "raw_selection"
 
 # Set page config as wide by default
 st.set_page_config(layout="wide")
@@ -33,8 +48,8 @@ def main():
         "NORTH TYNESIDE COUNCIL"
     ]
     
-    # Month options
-    months = {
+    # Month options: the built-in months plus any ingested into the hex summary
+    default_months = {
         "January 2025": "01_2025",
         "February 2025": "02_2025", 
         "March 2025": "03_2025",
@@ -42,6 +57,9 @@ def main():
         "May 2025": "05_2025",
         "June 2025": "06_2025"
     }
+    month_tables = sorted(set(default_months.values()) | set(summary_month_tables()), key=month_table_sort_key)
+    months = {month_display_name(table_name): table_name for table_name in month_tables}
+    latest_month = month_display_name(month_tables[-1])
     
     # Work category options (normalized)
     work_categories = [
@@ -94,7 +112,7 @@ def main():
             selected_months = st.multiselect(
                 "Select Months:",
                 options=list(months.keys()),
-                default=["June 2025"]  # Default selection
+                default=[latest_month]  # Default selection
             )
     
     with col3:
@@ -125,12 +143,21 @@ def main():
         st.write("**Visualization Type**")
         vis_type = st.selectbox(
             "Choose Visualization:",
-            options=["Points/Lines", "H3 Hex Grid"],
+            options=["Points/Lines", "H3 Hex Grid", "H3 Hex Grid (WebGL)"],
             index=1  # Default to H3 Grid
         )
     
+    # Columns fetched for the chosen visualisation
+    if vis_type == "Points/Lines":
+        with col2:
+            st.write("**Raw Data Settings**")
+            all_columns = st.checkbox("Include all columns in the raw data table")
+        view_profile = "table" if all_columns else "map"
+    else:
+        view_profile = "h3"
+    
     # H3 Resolution selection (only show if H3 is selected)
-    if vis_type == "H3 Hex Grid":
+    if vis_type != "Points/Lines":
         with col2:
             st.write("**H3 Grid Settings**")
             resolution_info = get_h3_resolution_info()
@@ -149,6 +176,38 @@ def main():
             options=["work_count", "unique_permits"],
             format_func=lambda x: "Total Works" if x == "work_count" else "Unique Permits"
         )
+        
+        # Where the H3 aggregation runs
+        engine = st.selectbox(
+            "Processing engine:",
+            options=["local", "motherduck"],
+            format_func=lambda x: "Local (Python + DuckDB)" if x == "local" else "MotherDuck (server-side)"
+        )
+        
+        # Let the map view pick the resolution and extent
+        viewport_lod = vis_type == "H3 Hex Grid" and engine == "local" and st.checkbox(
+            "Level of detail follows the map view",
+            help="Loads only the hexagons in view, at a resolution chosen from the zoom level"
+        )
+        
+        # Count lines in every hexagon along their route rather than at their centroid
+        line_coverage = vis_type == "H3 Hex Grid" and engine == "local" and not viewport_lod and st.checkbox(
+            "Count works in every hexagon their line passes through",
+            help="Long works such as road closures show along their whole length instead of in the hexagon at their centre"
+        )
+        if line_coverage and st.checkbox("Weight by length in each hexagon", help="Each work adds the share of its length inside the hexagon"):
+            color_by = "weighted_work_count"
+        
+        # Colour hexagons by how strongly they cluster with their neighbours
+        hotspots = vis_type == "H3 Hex Grid" and not viewport_lod and st.checkbox(
+            "Hotspot analysis (Getis-Ord Gi*)",
+            help="Scores each hexagon's value against its neighbouring hexagons to find statistically significant clusters"
+        )
+        hotspot_rings = st.slider("Neighbourhood rings:", min_value=1, max_value=3, value=1) if hotspots else 1
+    else:
+        viewport_lod = False
+        line_coverage = False
+        hotspots = False
 
     # Validation
     if not selected_authorities:
@@ -169,115 +228,151 @@ def main():
     category_text = "All Categories" if select_all_categories else f"{len(selected_categories)} Categories"
     
     if st.button(f"Load Data for {auth_text} - {month_text} - {category_text}"):
-        with st.spinner("Loading data and generating visualization..."):
-            try:
-                all_geodfs = []
+        # Time each stage of this load, and profile it when the profiler setting is on
+        with trace_request() as spans, profile_request() as profile:
+            with st.spinner("Loading data and generating visualization..."):
+                try:
+                    table_names = [months[month_display] for month_display in selected_months]
+                    month_names = {table_name: month_display for month_display, table_name in months.items()}
                 
-                # Create a progress bar for processing combinations
-                total_combinations = len(selected_authorities) * len(selected_months)
-                progress_bar = st.progress(0)
-                current_combination = 0
+                    # H3 views over ingested months read the precomputed hex summary
+                    precomputed = vis_type != "Points/Lines" and engine == "local" and summary_covers(table_names)
                 
-                # Process each combination of authority and month
-                for authority in selected_authorities:
-                    for month_display in selected_months:
-                        table_name = months[month_display]
-                        
-                        # Update progress
-                        current_combination += 1
-                        progress_text = f"Processing {authority} - {month_display} ({current_combination}/{total_combinations})"
-                        progress_bar.progress(current_combination / total_combinations, text=progress_text)
-                        
-                        if vis_type == "Points/Lines":
-                            with st.spinner(f"Fetching data for {authority} - {month_display}..."):
-                                geodf = fetch_data(authority, table_name, selected_categories)
-                                if not geodf.empty:
-                                    # Add metadata for identification
-                                    geodf['authority'] = authority
-                                    geodf['month'] = month_display
-                                    all_geodfs.append(geodf)
-                        
-                        else:  # H3 Hex Grid
-                            with st.spinner(f"Creating H3 grid for {authority} - {month_display}..."):
-                                geodf = create_h3_hex_grid(authority, table_name, resolution, selected_categories)
-                                if not geodf.empty:
-                                    # Add metadata for identification
-                                    geodf['authority'] = authority
-                                    geodf['month'] = month_display
-                                    all_geodfs.append(geodf)
-                
-                # Clear progress bar
-                progress_bar.empty()
+                    if precomputed:
+                        with span("load.summary", cache_check=True):
+                            record_counts = summary_record_counts(selected_authorities, table_names, selected_categories)
+                    else:
+                        # Prepare the month tables concurrently, updating progress as each one is ready
+                        progress = st.progress(0.0, text="Preparing month tables...")
+                        for done, task in enumerate(prepare_table_sources(table_names), start=1):
+                            if task.error is not None:
+                                st.warning(f"Could not prepare {month_names.get(task.key, task.key)}, it will be read remotely: {task.error}")
+                            progress.progress(done / len(table_names), text=f"Prepared {done} of {len(table_names)} months")
+                    
+                        # Fetch the months missing from the frame cache concurrently,
+                        # with only the columns the chosen view needs
+                        progress.progress(0.0, text="Fetching month tables...")
+                        with span("load.fetch_months"):
+                            for fetched, task in enumerate(fetch_missing_frames(selected_authorities, table_names, view_profile), start=1):
+                                if task.error is not None:
+                                    st.warning(f"Could not fetch {month_names.get(task.key, task.key)}, retrying: {task.error}")
+                                progress.progress(fetched / len(table_names), text=f"Fetched {fetched} of {len(table_names)} months")
+                        progress.empty()
+                    
+                        # Combine the cached months into the selection
+                        with st.spinner(f"Fetching data for {auth_text} - {month_text}..."), span("load.fetch", cache_check=True):
+                            points_geodf = fetch_batch_data(selected_authorities, table_names, selected_categories, view_profile)
+                        record_counts = (
+                            points_geodf.groupby(['highway_authority', 'month_table', 'normalized_work_category'], observed=True).size()
+                            .reset_index().rename(columns={0: 'record_count'})
+                            if not points_geodf.empty else pd.DataFrame()
+                        )
                 
-                if all_geodfs:
-                    with st.spinner("Combining and processing data..."):
-                        # Combine all data - use pd.concat first, then convert to GeoDataFrame
-                        combined_df = pd.concat(all_geodfs, ignore_index=True)
-                        combined_geodf = gpd.GeoDataFrame(combined_df, geometry='geometry', crs="EPSG:4326") # type: ignore
+                    if not record_counts.empty:
+                        record_counts['authority'] = record_counts['highway_authority']
+                        record_counts['month'] = record_counts['month_table'].map(month_names)
                 
-                    # Display the visualization
-                    if vis_type == "Points/Lines":
-                        with st.spinner("Generating map visualization..."):
-                            plot_map_england(combined_geodf)
-                    else:  # H3 Hex Grid
-                        # For H3, we need to re-aggregate the combined data
-                        # since we might have overlapping hexagons from different authorities/months
-                        if len(selected_authorities) > 1 or len(selected_months) > 1:
-                            with st.spinner("Re-aggregating overlapping hexagons..."):
-                                # Re-aggregate overlapping hexagons
-                                aggregated_df = combined_geodf.groupby('h3_cell').agg({
-                                    'work_count': 'sum',
-                                    'unique_permits': 'sum',
-                                    'activity_types': lambda x: list(set([item for sublist in x for item in sublist])),  # Flatten and deduplicate
-                                    'geometry': 'first'  # Use first geometry (they should be identical for same h3_cell)
-                                }).reset_index()
-                                
-                                # Recreate GeoDataFrame with explicit type conversion
-                                final_geodf = gpd.GeoDataFrame(
-                                    aggregated_df, 
-                                    geometry='geometry', 
-                                    crs="EPSG:4326"
-                                ) # type: ignore
-                                
+                        # Display the visualization
+                        if vis_type == "Points/Lines":
+                            # The raw map is drawn below and follows the map view across reruns
+                            st.session_state[RAW_SELECTION_KEY] = (selected_authorities, table_names, selected_categories, view_profile)
+                            st.session_state.pop(RAW_VIEWPORT_STATE_KEY, None)
+                        elif viewport_lod:
+                            # The viewport map is drawn below and follows the map view across reruns
+                            st.session_state[LOD_SELECTION_KEY] = (selected_authorities, table_names, selected_categories)
+                            st.session_state.pop(VIEWPORT_STATE_KEY, None)
+                        else:  # H3 Hex Grid or H3 Hex Grid (WebGL)
+                            # Permits are deduplicated across months before aggregation,
+                            # so the grid needs no re-aggregation of overlapping hexagons
+                            with st.spinner("Creating H3 grid..."), span("load.h3_grid", cache_check=True):
+                                if engine == "motherduck":
+                                    final_geodf = create_h3_hex_grid_remote(selected_authorities, table_names, resolution, selected_categories)
+                                elif vis_type == "H3 Hex Grid (WebGL)":
+                                    # Hexagons are drawn from their ids, so skip the boundaries
+                                    final_geodf = create_h3_cell_values_batch(selected_authorities, table_names, resolution, selected_categories)
+                                elif line_coverage:
+                                    final_geodf = create_h3_line_grid_batch(selected_authorities, table_names, resolution, selected_categories)
+                                else:
+                                    final_geodf = create_h3_hex_grid_batch(selected_authorities, table_names, resolution, selected_categories)
+                        
+                            if final_geodf.empty:
+                                st.warning("No H3 data generated for the selected authorities, months, and work categories.")
+                            else:
                                 # Convert to float first, then int with proper type handling
                                 total_works_value = final_geodf['work_count'].sum()
                                 total_works = int(float(total_works_value)) if pd.notna(total_works_value) else 0 # type: ignore
-                                st.success(f"Generated {len(final_geodf)} unique hexagons with {total_works} total works")
-                            
-                            with st.spinner("Generating H3 hexagon map..."):
-                                plot_h3_map(final_geodf, color_by)
-                        else:
-                            # Single authority and month, no need to re-aggregate
-                            total_works_value = combined_geodf['work_count'].sum()
-                            total_works = int(float(total_works_value)) if pd.notna(total_works_value) else 0 # type: ignore
-                            st.success(f"Generated {len(combined_geodf)} hexagons with {total_works} total works")
-                            
-                            with st.spinner("Generating H3 hexagon map..."):
-                                plot_h3_map(combined_geodf, color_by)
+                                st.success(f"Generated {len(final_geodf)} hexagons with {total_works} total works")
+                        
+                                if hotspots:
+                                    with st.spinner("Finding hotspots..."):
+                                        final_geodf = add_hotspot_scores(final_geodf, resolution, color_by, hotspot_rings)
+                        
+                                with st.spinner("Generating H3 hexagon map..."):
+                                    if vis_type == "H3 Hex Grid (WebGL)":
+                                        plot_h3_deck(final_geodf, color_by)
+                                    else:
+                                        plot_h3_map(final_geodf, 'gi_zscore' if hotspots else color_by)
                     
-                    with st.spinner("Generating summary tables..."):
-                        # Show summary by authority, month, and category
-                        st.subheader("Data Summary")
-                        col1, col2 = st.columns(2)
+                        with st.spinner("Generating summary tables..."):
+                            # Show summary by authority, month, and category
+                            st.subheader("Data Summary")
+                            col1, col2 = st.columns(2)
                         
-                        with col1:
-                            if 'authority' in combined_geodf.columns and 'month' in combined_geodf.columns:
-                                summary = combined_geodf.groupby(['authority', 'month']).size().reset_index().rename(columns={0: 'record_count'})
+                            with col1:
+                                summary = record_counts.groupby(['authority', 'month'], observed=True)['record_count'].sum().reset_index()
                                 st.write("**Records by Authority and Month:**")
                                 st.dataframe(summary, use_container_width=True)
                         
-                        with col2:
-                            if 'normalized_work_category' in combined_geodf.columns:
-                                category_summary = combined_geodf.groupby('normalized_work_category').size().reset_index().rename(columns={0: 'record_count'})
+                            with col2:
+                                category_summary = record_counts.groupby('normalized_work_category', observed=True)['record_count'].sum().reset_index()
                                 st.write("**Records by Work Category:**")
                                 st.dataframe(category_summary, use_container_width=True)
                     
-                else:
-                    st.warning("No data found for the selected authorities, months, and work categories.")
+                    else:
+                        st.warning("No data found for the selected authorities, months, and work categories.")
             
-            except Exception as e:
-                st.error(f"Error processing data: {e}")
-                st.exception(e)
+                except Exception as e:
+                    st.error(f"Error processing data: {e}")
+                    st.exception(e)
+        
+        if get_bool_setting("timing_breakdown", True):
+            show_timing_breakdown(spans)
+            frame_cache = get_frame_cache()
+            stats = frame_cache.stats()
+            with st.expander(f"Frame cache: {stats['entries']} frames, {stats['bytes'] / 1024 ** 2:.1f}MB of {stats['max_bytes'] / 1024 ** 2:.0f}MB"):
+                st.caption(f"{stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+                st.dataframe(frame_cache.frame_sizes().astype({"key": str}), use_container_width=True)
+            pool_stats = get_connection_pool().stats()
+            mean_wait = pool_stats['mean_wait_seconds'] or 0.0
+            st.caption(
+                f"Database connections: {pool_stats['in_use']} in use, {pool_stats['idle']} idle of {pool_stats['size']}, "
+                f"mean wait {mean_wait * 1000:.0f}ms, max wait {pool_stats['max_wait_seconds'] * 1000:.0f}ms, "
+                f"{pool_stats['retries']} retries"
+            )
+            boundary_stats = get_boundary_store().stats()
+            st.caption(f"Hex boundaries: {boundary_stats['cells']} of {boundary_stats['max_cells']} cells stored, {boundary_stats['hits']} hits, {boundary_stats['misses']} misses")
+        if profile.get("report"):
+            with st.expander("Profile"):
+                st.text(profile["report"])
+    
+    if vis_type == "Points/Lines" and RAW_SELECTION_KEY in st.session_state:
+        raw_authorities, raw_tables, raw_categories, raw_profile = st.session_state[RAW_SELECTION_KEY]
+        try:
+            # Served from the frame cache after the first load
+            with st.spinner("Generating map visualization..."):
+                plot_map_england(fetch_batch_data(raw_authorities, raw_tables, raw_categories, raw_profile))
+        except Exception as e:
+            st.error(f"Error processing data: {e}")
+            st.exception(e)
+    
+    if viewport_lod and LOD_SELECTION_KEY in st.session_state:
+        lod_authorities, lod_tables, lod_categories = st.session_state[LOD_SELECTION_KEY]
+        try:
+            initial_bounds = pyramid_bounds(create_h3_pyramid_batch(lod_authorities, lod_tables, lod_categories))
+            plot_h3_viewport_map(lod_authorities, lod_tables, lod_categories, color_by, initial_bounds)
+        except Exception as e:
+            st.error(f"Error processing data: {e}")
+            st.exception(e)
 
 if __name__ == "__main__":
     main()
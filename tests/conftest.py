@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.synthetic import DEFAULT_SCHEMA, write_database
+
+@pytest.fixture(scope="session")
+def synthetic_database(tmp_path_factory):
+    """
+    Small synthetic street works database, and the month tables it holds
+    """
+    database = str(tmp_path_factory.mktemp("synthetic") / "street_works.duckdb")
+    return database, write_database(database, rows=2000, months=3, schema=DEFAULT_SCHEMA)
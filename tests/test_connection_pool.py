@@ -0,0 +1,69 @@
+import duckdb
+import pytest
+
+from functions.connection_pool import ConnectionPool, PoolTimeout, is_transient
+
+def make_pool(size: int = 2, timeout: float = 1.0) -> ConnectionPool:
+    return ConnectionPool(lambda: duckdb.connect(":memory:"), size, timeout)
+
+def test_acquire_times_out_when_every_connection_is_in_use():
+    pool = make_pool(size=1, timeout=0.05)
+    con = pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    pool.release(con)
+    assert pool.acquire() is con
+
+def test_connections_failing_with_transient_errors_are_discarded():
+    pool = make_pool()
+
+    with pytest.raises(duckdb.ConnectionException):
+        with pool.connection():
+            raise duckdb.ConnectionException("Connection was closed")
+
+    stats = pool.stats()
+    assert (stats["open"], stats["idle"], stats["discarded"]) == (0, 0, 1)
+
+def test_query_errors_keep_the_connection():
+    pool = make_pool()
+
+    with pytest.raises(duckdb.CatalogException):
+        with pool.connection() as con:
+            con.execute("SELECT * FROM missing_table")
+
+    assert pool.stats()["idle"] == 1
+
+def test_transient_errors_are_retried_on_a_fresh_connection():
+    pool = make_pool()
+    connections = []
+
+    def operation(con):
+        connections.append(con)
+        if len(connections) == 1:
+            raise duckdb.IOException("HTTP 503: connection reset by peer")
+        return con.execute("SELECT 42").fetchone()[0]
+
+    assert pool.run(operation, retries=3, backoff_seconds=0) == 42
+    assert connections[0] is not connections[1]
+    assert pool.stats()["retries"] == 1
+
+@pytest.mark.parametrize("retries", [0, 1])
+def test_a_single_attempt_is_not_retried(retries):
+    pool = make_pool()
+    attempts = []
+
+    def operation(con):
+        attempts.append(con)
+        raise duckdb.ConnectionException("Connection was closed")
+
+    with pytest.raises(duckdb.ConnectionException):
+        pool.run(operation, retries=retries, backoff_seconds=0)
+    assert len(attempts) == 1
+
+def test_only_connection_and_network_failures_are_transient():
+    assert is_transient(duckdb.ConnectionException("Connection was closed"))
+    assert is_transient(duckdb.IOException("Could not resolve hostname"))
+    assert not is_transient(duckdb.IOException("No files found that match the pattern"))
+    assert not is_transient(duckdb.CatalogException("Table does not exist"))
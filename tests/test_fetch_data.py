@@ -0,0 +1,58 @@
+import duckdb
+import pytest
+
+from benchmarks.synthetic import DEFAULT_SCHEMA
+from functions import fetch_data
+from functions.connection_pool import ConnectionPool
+from functions.fetch_data import ALL_HIGHWAY_AUTHORITIES, build_batch_query, fetch_batch_data
+from functions.frame_cache import get_frame_cache
+
+AUTHORITIES = ALL_HIGHWAY_AUTHORITIES[:3]
+
+def core_source(con: duckdb.DuckDBPyConnection, schema: str, table_name: str) -> str:
+    """
+    Month table with a WKB column cast by core DuckDB, standing in for the spatial extension
+    """
+    return f'(SELECT *, ST_AsWKB(works_location_coordinates::GEOMETRY) as geometry_wkb FROM {schema}."{table_name}")'
+
+@pytest.fixture
+def local_pool(synthetic_database, monkeypatch):
+    database, tables = synthetic_database
+    monkeypatch.setenv("NWG_SCHEMA", DEFAULT_SCHEMA)
+    pool = ConnectionPool(lambda: duckdb.connect(database, read_only=True), size=2)
+    monkeypatch.setattr(fetch_data, "get_connection_pool", lambda: pool)
+    monkeypatch.setattr(fetch_data, "get_table_source", core_source)
+    get_frame_cache().clear()
+    yield pool, tables
+    get_frame_cache().clear()
+    pool.close()
+
+def batch_query_permits(pool: ConnectionPool, tables: list, categories: list) -> list:
+    """
+    (permit, month) pairs selected by one batched query
+    """
+    table_sources = {table_name: core_source(None, DEFAULT_SCHEMA, table_name) for table_name in tables}
+    query, params = build_batch_query(DEFAULT_SCHEMA, AUTHORITIES, tables, categories, table_sources, view_profile="h3")
+    with pool.connection() as con:
+        rows = con.execute(f"SELECT permit_reference_number, month_table FROM ({query})", params).fetchall()
+    return sorted(rows)
+
+@pytest.mark.parametrize("categories", [[], ["Minor"], ["Major", "Emergency"]])
+def test_select_works_matches_the_batched_query(local_pool, categories):
+    pool, tables = local_pool
+
+    df = fetch_batch_data(AUTHORITIES, tables, categories, "h3")
+
+    selected = sorted(zip(df['permit_reference_number'], df['month_table'].astype(str)))
+    assert selected == batch_query_permits(pool, tables, categories)
+    assert df['permit_reference_number'].is_unique
+
+def test_category_changes_are_answered_from_the_frame_cache(local_pool):
+    _, tables = local_pool
+    fetch_batch_data(AUTHORITIES, tables, ["Minor"], "h3")
+    misses = get_frame_cache().stats()["misses"]
+
+    df = fetch_batch_data(AUTHORITIES, tables, ["Standard"], "h3")
+
+    assert get_frame_cache().stats()["misses"] == misses
+    assert set(df['normalized_work_category']) == {"Standard"}
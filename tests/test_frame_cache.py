@@ -0,0 +1,43 @@
+import pandas as pd
+
+from functions.frame_cache import FrameCache, frame_nbytes
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'work_count': range(rows)})
+
+def test_least_recently_used_frames_are_evicted_by_bytes():
+    frame_bytes = frame_nbytes(make_frame(100))
+    cache = FrameCache(max_bytes=2 * frame_bytes)
+    cache.put("a", make_frame(100))
+    cache.put("b", make_frame(100))
+    # Reading a makes b the least recently used
+    assert cache.get("a") is not None
+
+    cache.put("c", make_frame(100))
+
+    assert cache.missing(["a", "b", "c"]) == ["b"]
+    assert cache.bytes == 2 * frame_bytes
+    assert cache.stats()["evictions"] == 1
+
+def test_frames_over_budget_are_not_cached():
+    cache = FrameCache(max_bytes=frame_nbytes(make_frame(10)))
+
+    cache.put("big", make_frame(1000))
+
+    assert cache.get("big") is None
+    assert cache.bytes == 0
+
+def test_replacing_a_frame_updates_the_byte_count():
+    cache = FrameCache(max_bytes=10 ** 6)
+    cache.put("a", make_frame(100))
+
+    cache.put("a", make_frame(10))
+
+    assert cache.bytes == frame_nbytes(make_frame(10))
+
+def test_missing_does_not_count_lookups():
+    cache = FrameCache(max_bytes=10 ** 6)
+    cache.put("a", make_frame(10))
+
+    assert cache.missing(["a", "b"]) == ["b"]
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
@@ -0,0 +1,36 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from functions.duckdb_engine import get_local_engine, local_cursor
+from functions.h3_processing import PYRAMID_COARSEST_RESOLUTION, PYRAMID_FINEST_RESOLUTION, build_h3_pyramid
+
+@pytest.fixture(scope="module")
+def local_engine():
+    try:
+        return get_local_engine()
+    except duckdb.Error as e:
+        pytest.skip(f"h3 extension unavailable: {e}")
+
+def test_build_h3_pyramid_covers_every_resolution(local_engine):
+    coords_df = pd.DataFrame({
+        'permit_reference_number': ['P1', 'P2', 'P3'],
+        'highway_authority': ['NEWCASTLE CITY COUNCIL'] * 3,
+        'month_table': ['06_2025'] * 3,
+        'activity_type': ['Remedial works', 'New service connection', 'Remedial works'],
+        'work_category': ['Major', 'Minor', 'Major'],
+        'latitude': [54.9783, 54.9790, 54.9069],
+        'longitude': [-1.6178, -1.6200, -1.3838],
+    })
+
+    pyramid = build_h3_pyramid(coords_df)
+
+    resolutions = list(range(PYRAMID_COARSEST_RESOLUTION, PYRAMID_FINEST_RESOLUTION + 1))
+    assert sorted(pyramid['resolution'].unique()) == resolutions
+    assert (pyramid.groupby('resolution')['work_count'].sum() == len(coords_df)).all()
+
+    # Every cell sits at the resolution of its row
+    with local_cursor() as con:
+        con.register('pyramid', pyramid[['resolution', 'cell']])
+        mismatched = con.execute("SELECT COUNT(*) FROM pyramid WHERE h3_get_resolution(cell) != resolution").fetchone()[0]
+    assert mismatched == 0
@@ -0,0 +1,25 @@
+import hashlib
+
+import duckdb
+import pandas as pd
+
+from functions.h3_state import MAX_ACTIVITY_CODES, PERMIT_ID_SQL, remap_activity_masks
+
+def test_activity_masks_are_remapped_by_name():
+    from_names = ["Remedial works", "New service connection", "Diversionary works"]
+    to_bits = {"Diversionary works": 1 << 0, "Remedial works": 1 << 5}
+    masks = pd.Series([0b101, 0b001, 0b010, 0])
+
+    remapped = remap_activity_masks(masks, from_names, to_bits)
+
+    overflow_bit = 1 << MAX_ACTIVITY_CODES
+    assert remapped.tolist() == [(1 << 5) | 1, 1 << 5, overflow_bit, 0]
+
+def test_permit_ids_are_the_first_64_bits_of_the_md5():
+    permits = ["SYN000000001", "NE12345-PERMIT"]
+    con = duckdb.connect()
+    con.register('permits', pd.DataFrame({'permit_reference_number': permits}))
+
+    ids = [row[0] for row in con.execute(f"SELECT {PERMIT_ID_SQL} FROM permits").fetchall()]
+
+    assert ids == [int(hashlib.md5(permit.encode()).hexdigest()[:16], 16) for permit in permits]
@@ -0,0 +1,36 @@
+import numpy as np
+import shapely
+
+from functions.hex_boundaries import BoundaryStore, polygons_by_cell
+
+def ring(centre_lng: float, centre_lat: float, sides: int) -> np.ndarray:
+    """
+    Vertices of a regular polygon around a centre
+    """
+    angles = np.linspace(0, 2 * np.pi, sides, endpoint=False)
+    return np.column_stack([centre_lng + 0.01 * np.cos(angles), centre_lat + 0.01 * np.sin(angles)])
+
+def test_polygons_are_matched_to_cells_by_id():
+    cells = np.array([10, 20, 30, 40], dtype=np.uint64)
+    # Cell 20 returned no vertices and cell 30 is a pentagon with a null vertex dropped
+    rings = {10: ring(0, 0, 6), 30: ring(2, 0, 4), 40: ring(3, 0, 5)}
+    vertex_cells = np.concatenate([np.full(len(coordinates), cell, dtype=np.uint64) for cell, coordinates in rings.items()])
+    coordinates = np.concatenate(list(rings.values()))
+
+    polygons = polygons_by_cell(cells, vertex_cells, coordinates)
+
+    assert shapely.is_missing(polygons).tolist() == [False, True, True, False]
+    assert np.allclose(shapely.get_coordinates(shapely.centroid(polygons[[0, 3]])), [[0, 0], [3, 0]], atol=1e-9)
+    assert shapely.get_num_coordinates(polygons[3]) == 6
+
+def test_boundary_store_evicts_least_recently_used_cells():
+    store = BoundaryStore(max_cells=2)
+    polygons = shapely.polygons([ring(i, 0, 6) for i in range(3)])
+    store.add(np.array([1, 2], dtype=np.uint64), polygons[:2])
+    store.boundaries(np.array([1], dtype=np.uint64))
+
+    store.add(np.array([3], dtype=np.uint64), polygons[2:])
+
+    assert store.stats()["cells"] == 2
+    assert store.evictions == 1
+    assert np.array_equal(store._cells, np.array([1, 3], dtype=np.uint64))
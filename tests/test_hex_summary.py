@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from functions import hex_summary
+from functions.hex_summary import connect_summary, ingested_months, read_summary_pyramid, write_month_summary
+
+def month_pyramid(table_name: str, rows: list) -> pd.DataFrame:
+    """
+    Pyramid rows for one month from (resolution, cell, permit ids) tuples
+    """
+    return pd.DataFrame([
+        {
+            'resolution': resolution,
+            'cell': cell,
+            'highway_authority': 'NEWCASTLE CITY COUNCIL',
+            'month_table': table_name,
+            'work_category': 'Minor',
+            'work_count': len(permit_ids),
+            'permit_ids': permit_ids,
+            'activity_mask': 0,
+            'category_mask': 8,
+            'lat_sum': 55.0 * len(permit_ids),
+            'lng_sum': -1.6 * len(permit_ids),
+        }
+        for resolution, cell, permit_ids in rows
+    ])
+
+@pytest.fixture
+def summary(tmp_path, monkeypatch):
+    monkeypatch.setenv("NWG_HEX_SUMMARY_DATABASE", str(tmp_path / "summary.duckdb"))
+    con = connect_summary()
+    # Permit 1 appears in both months, in a different cell each time
+    write_month_summary(con, "01_2025", month_pyramid("01_2025", [(10, 100, [1, 2]), (11, 1000, [1, 2])]), 2)
+    write_month_summary(con, "02_2025", month_pyramid("02_2025", [(10, 200, [1, 3]), (11, 2000, [1, 3])]), 2)
+    assert ingested_months(con) == {"01_2025": 2, "02_2025": 2}
+    # The app reads the summary read-only
+    con.close()
+    hex_summary.summary_month_tables.clear()
+    yield
+    hex_summary.summary_month_tables.clear()
+
+def test_multi_month_selection_counts_each_permit_for_its_latest_month(summary):
+    pyramid = read_summary_pyramid(['NEWCASTLE CITY COUNCIL'], ['02_2025', '01_2025'])
+
+    rows = pyramid.set_index(['resolution', 'cell'])
+    assert rows.loc[(11, 1000), 'permit_ids'].tolist() == [2]
+    assert rows.loc[(11, 1000), 'work_count'] == 1
+    assert rows.loc[(11, 1000), 'lat_sum'] == pytest.approx(55.0)
+    assert rows.loc[(11, 2000), 'permit_ids'].tolist() == [1, 3]
+    assert pyramid.groupby('resolution')['work_count'].sum().tolist() == [3, 3]
+
+def test_single_month_selection_reads_stored_rows(summary):
+    pyramid = read_summary_pyramid(['NEWCASTLE CITY COUNCIL'], ['01_2025'])
+
+    assert sorted(pyramid['cell'].tolist()) == [100, 1000]
+    assert pyramid['work_count'].tolist() == [2, 2]
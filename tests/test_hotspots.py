@@ -0,0 +1,51 @@
+import numpy as np
+from scipy import sparse
+
+from functions.hotspots import NOT_SIGNIFICANT, classify_hotspots, getis_ord_gi_star
+
+def dense_gi_star(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Gi* of each cell computed term by term from the textbook formula
+    """
+    n = len(values)
+    mean = values.mean()
+    std = np.sqrt((values ** 2).sum() / n - mean ** 2)
+    z_scores = np.zeros(n)
+    for i in range(n):
+        weight_sum = weights[i].sum()
+        numerator = sum(weights[i, j] * values[j] for j in range(n)) - mean * weight_sum
+        denominator = std * np.sqrt((n * (weights[i] ** 2).sum() - weight_sum ** 2) / (n - 1))
+        z_scores[i] = numerator / denominator
+    return z_scores
+
+def random_neighbourhoods(n: int, seed: int = 0) -> np.ndarray:
+    """
+    Symmetric binary weights including the diagonal, as neighbourhood_matrix builds
+    """
+    rng = np.random.default_rng(seed)
+    weights = (rng.random((n, n)) < 0.2).astype(float)
+    weights = np.maximum(weights, weights.T)
+    np.fill_diagonal(weights, 1.0)
+    return weights
+
+def test_gi_star_matches_dense_reference():
+    rng = np.random.default_rng(1)
+    values = rng.poisson(5, 40).astype(float)
+    weights = random_neighbourhoods(40)
+
+    z_scores = getis_ord_gi_star(values, sparse.csr_matrix(weights))
+
+    np.testing.assert_allclose(z_scores, dense_gi_star(values, weights))
+
+def test_gi_star_is_zero_without_spread():
+    weights = sparse.csr_matrix(random_neighbourhoods(10))
+
+    assert (getis_ord_gi_star(np.full(10, 3.0), weights) == 0).all()
+    assert (getis_ord_gi_star(np.array([4.0]), sparse.identity(1, format="csr")) == 0).all()
+
+def test_hotspots_are_labelled_at_their_highest_confidence():
+    labels = classify_hotspots(np.array([3.0, 2.0, 1.7, 0.5, -2.0, -3.0]))
+
+    assert labels.tolist() == [
+        "Hot spot (99%)", "Hot spot (95%)", "Hot spot (90%)", NOT_SIGNIFICANT, "Cold spot (95%)", "Cold spot (99%)",
+    ]
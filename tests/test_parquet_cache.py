@@ -0,0 +1,81 @@
+import duckdb
+import pytest
+
+from benchmarks.synthetic import DEFAULT_SCHEMA, write_database
+from functions import parquet_cache
+from functions.parquet_cache import get_table_source, mirror_dir, read_manifest
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    Empty mirror in a fresh process, over a writable synthetic database
+    """
+    monkeypatch.setenv("NWG_PARQUET_CACHE", "true")
+    monkeypatch.setenv("NWG_PARQUET_CACHE_DIR", str(tmp_path / "parquet"))
+    # Core DuckDB cast standing in for the spatial extension's transform
+    monkeypatch.setattr(parquet_cache, "GEOMETRY_SQL", "works_location_coordinates::GEOMETRY")
+    monkeypatch.setattr(parquet_cache, "_verified_tables", {})
+    monkeypatch.setattr(parquet_cache, "_pruned", False)
+    tables = write_database(str(tmp_path / "street_works.duckdb"), rows=500, months=3)
+    con = duckdb.connect(str(tmp_path / "street_works.duckdb"))
+    yield con, tables
+    con.close()
+
+def mirrored_rows(con: duckdb.DuckDBPyConnection, source: str) -> int:
+    return con.execute(f"SELECT COUNT(*) FROM {source} WHERE geometry_wkb IS NOT NULL").fetchone()[0]
+
+def completed_rows(con: duckdb.DuckDBPyConnection, table_name: str) -> int:
+    return con.execute(f"""
+    SELECT COUNT(*) FROM {DEFAULT_SCHEMA}."{table_name}"
+    WHERE work_status_ref = 'completed' AND event_type = 'WORK_STOP'
+    """).fetchone()[0]
+
+def test_miss_mirrors_the_table_and_hit_reuses_it(cache, monkeypatch):
+    con, tables = cache
+
+    source = get_table_source(con, DEFAULT_SCHEMA, tables[0])
+
+    entry = read_manifest()[f"{DEFAULT_SCHEMA}.{tables[0]}"]
+    assert mirror_dir(entry).exists()
+    assert mirrored_rows(con, source) == completed_rows(con, tables[0])
+
+    # Within the verify window a hit does not touch the remote table
+    monkeypatch.setattr(parquet_cache, "remote_row_count", lambda *args: pytest.fail("remote table checked"))
+    assert get_table_source(con, DEFAULT_SCHEMA, tables[0]) == source
+
+def test_changed_tables_are_mirrored_again_after_the_verify_window(cache, monkeypatch):
+    con, tables = cache
+    monkeypatch.setenv("NWG_PARQUET_CACHE_VERIFY_SECONDS", "0")
+    source = get_table_source(con, DEFAULT_SCHEMA, tables[0])
+    assert get_table_source(con, DEFAULT_SCHEMA, tables[0]) == source
+
+    con.execute(f'INSERT INTO {DEFAULT_SCHEMA}."{tables[0]}" SELECT * FROM {DEFAULT_SCHEMA}."{tables[1]}"')
+
+    refreshed = get_table_source(con, DEFAULT_SCHEMA, tables[0])
+    assert refreshed != source
+    assert mirrored_rows(con, refreshed) == completed_rows(con, tables[0])
+
+def test_tables_over_budget_are_evicted_at_the_next_start(cache, monkeypatch):
+    con, tables = cache
+    get_table_source(con, DEFAULT_SCHEMA, tables[0])
+    get_table_source(con, DEFAULT_SCHEMA, tables[1])
+    manifest = read_manifest()
+    oldest, newest = (manifest[f"{DEFAULT_SCHEMA}.{table_name}"] for table_name in tables[:2])
+
+    # A new process with room for only the most recently used table
+    monkeypatch.setenv("NWG_PARQUET_CACHE_MAX_BYTES", str(newest["bytes"]))
+    monkeypatch.setattr(parquet_cache, "_verified_tables", {})
+    monkeypatch.setattr(parquet_cache, "_pruned", False)
+    with parquet_cache._lock:
+        parquet_cache.prune_cache()
+
+    assert set(read_manifest()) == {f"{DEFAULT_SCHEMA}.{tables[1]}"}
+    assert not mirror_dir(oldest).exists()
+    assert mirror_dir(newest).exists()
+
+def test_unreachable_tables_are_read_remotely(cache):
+    con, _ = cache
+
+    source = get_table_source(con, DEFAULT_SCHEMA, "12_2030")
+
+    assert source == parquet_cache.remote_source(DEFAULT_SCHEMA, "12_2030")
@@ -0,0 +1,34 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from functions.raw_lod import prepare_raw_layers
+
+BOUNDS = ((54.0, -2.5), (55.5, -0.5))
+
+def make_works(points: int, lines: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Point works at one site and long line works around Newcastle
+    """
+    rng = np.random.default_rng(seed)
+    point_geometries = shapely.points(np.full(points, -1.6), np.full(points, 54.97))
+    starts = np.column_stack([-1.9 + rng.uniform(0, 0.6, lines), 54.8 + rng.uniform(0, 0.3, lines)])
+    line_geometries = [shapely.LineString(start + rng.normal(0, 0.01, (40, 2)).cumsum(axis=0)) for start in starts]
+    geometries = np.concatenate([point_geometries, np.array(line_geometries, dtype=object)])
+    return gpd.GeoDataFrame({'permit_reference_number': [f"P{i}" for i in range(len(geometries))]}, geometry=geometries, crs="EPSG:4326")
+
+def test_payload_is_capped_when_points_collapse_to_one_cluster():
+    geodf = make_works(points=20, lines=200)
+
+    layers = prepare_raw_layers(geodf, BOUNDS, zoom=14, cluster_threshold=5, max_bytes=50_000)
+
+    assert layers.estimated_bytes <= 50_000
+    assert layers.clusters['count'].sum() + len(layers.features) == len(geodf)
+
+def test_works_are_drawn_individually_within_budget():
+    geodf = make_works(points=3, lines=5)
+
+    layers = prepare_raw_layers(geodf, BOUNDS, zoom=14, cluster_threshold=5, max_bytes=5 * 1024 ** 2)
+
+    assert len(layers.features) == len(geodf)
+    assert layers.clusters.empty
@@ -0,0 +1,89 @@
+import inspect
+import threading
+import time
+
+import pandas as pd
+
+from functions.single_flight import SingleFlight, call_key
+
+def wait_for_waiters(flights: SingleFlight, key, waiters: int) -> None:
+    """
+    Block until the given number of callers wait on the flight for a key
+    """
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with flights._lock:
+            flight = flights._flights.get(key)
+            if flight is not None and flight.waiters >= waiters:
+                return
+        time.sleep(0.001)
+    raise TimeoutError(f"No {waiters} waiters on {key}")
+
+def run_overlapping(flights: SingleFlight, key, compute) -> list:
+    """
+    Start a leader and a waiter for the same key, releasing the leader once the waiter is queued
+    """
+    release = threading.Event()
+    results = [None, None]
+
+    def blocked():
+        release.wait(5)
+        return compute()
+
+    def call(index, func):
+        try:
+            results[index] = flights.do(key, func)
+        except Exception as e:
+            results[index] = e
+
+    leader = threading.Thread(target=call, args=(0, blocked))
+    leader.start()
+    while key not in flights._flights:
+        time.sleep(0.001)
+    waiter = threading.Thread(target=call, args=(1, compute))
+    waiter.start()
+    wait_for_waiters(flights, key, 1)
+    release.set()
+    leader.join()
+    waiter.join()
+    return results
+
+def test_overlapping_calls_compute_once_and_waiters_get_a_copy():
+    flights = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({'work_count': [1, 2]})
+
+    leader_result, waiter_result = run_overlapping(flights, ("fetch",), compute)
+
+    assert len(calls) == 1
+    assert waiter_result is not leader_result
+    pd.testing.assert_frame_equal(waiter_result, leader_result)
+    assert flights.stats() == {"leaders": 1, "coalesced": 1, "in_flight": 0}
+
+def test_leader_errors_are_raised_in_waiters():
+    flights = SingleFlight()
+
+    def compute():
+        raise ValueError("query failed")
+
+    leader_result, waiter_result = run_overlapping(flights, ("fetch",), compute)
+
+    assert isinstance(leader_result, ValueError)
+    assert waiter_result is leader_result
+
+def test_call_keys_ignore_argument_form_and_category_order():
+    def fetch(authorities, selected_categories=None):
+        pass
+
+    signature = inspect.signature(fetch)
+    unordered = {"selected_categories"}
+
+    def key(*args, **kwargs):
+        return call_key(fetch, signature, args, kwargs, unordered)
+
+    assert key(["A"], ["Major", "Minor"]) == key(authorities=("A",), selected_categories=["Minor", "Major"])
+    assert key(["A"]) == key(["A"], [])
+    assert key(["A", "B"]) != key(["B", "A"])